@@ -0,0 +1,189 @@
+package main
+
+import (
+	"container/list"
+	"fmt"
+	"hash/fnv"
+	"log"
+	"net/http"
+	"sort"
+	"strings"
+	"sync"
+)
+
+// a rendered JSON response, along with its gzipped body and ETag
+type cachedResponse struct {
+	body    []byte
+	gzipped []byte // nil if the body is too small to be worth compressing
+	etag    string
+}
+
+func newCachedResponse(body []byte) *cachedResponse {
+	h := fnv.New64a()
+	h.Write(body)
+	resp := &cachedResponse{
+		body: body,
+		// weak, since the same ETag is used for the gzipped and plain bodies
+		etag: fmt.Sprintf(`W/"%x"`, h.Sum64()),
+	}
+	if len(body) >= minCompressSize {
+		gz, err := gzipBytes(body)
+		if err != nil {
+			log.Printf("Error compressing response: %s\n", err)
+		} else {
+			resp.gzipped = gz
+		}
+	}
+	return resp
+}
+
+type cacheEntry struct {
+	key      string
+	response *cachedResponse
+}
+
+type cacheStats struct {
+	Generation uint64  `json:"generation"`
+	Entries    int     `json:"entries"`
+	Capacity   int     `json:"capacity"`
+	Hits       uint64  `json:"hits"`
+	Misses     uint64  `json:"misses"`
+	Evictions  uint64  `json:"evictions"`
+	HitRate    float64 `json:"hit_rate"`
+}
+
+// a bounded LRU cache of rendered responses, keyed by the normalized query params
+//
+// the generation is bumped whenever the database is updated (by /check or /recheck),
+// which drops every entry. responses rendered while an update was running are
+// not stored, since they may have been read from the old data
+type responseCache struct {
+	mu         sync.Mutex
+	capacity   int
+	generation uint64
+	entries    map[string]*list.Element
+	order      *list.List // front is the most recently used entry
+	hits       uint64
+	misses     uint64
+	evictions  uint64
+}
+
+func newResponseCache(capacity int) *responseCache {
+	return &responseCache{
+		capacity: capacity,
+		entries:  make(map[string]*list.Element),
+		order:    list.New(),
+	}
+}
+
+// returns the cached response for this key, else calls render and caches the result
+func (c *responseCache) get(key string, render func() ([]byte, error)) (*cachedResponse, error) {
+	c.mu.Lock()
+	if el, ok := c.entries[key]; ok {
+		c.order.MoveToFront(el)
+		c.hits++
+		resp := el.Value.(*cacheEntry).response
+		c.mu.Unlock()
+		return resp, nil
+	}
+	c.misses++
+	generation := c.generation
+	c.mu.Unlock()
+
+	body, err := render()
+	if err != nil {
+		return nil, err
+	}
+	resp := newCachedResponse(body)
+
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	if c.capacity <= 0 || generation != c.generation {
+		return resp, nil
+	}
+	if el, ok := c.entries[key]; ok {
+		// another request rendered this at the same time
+		c.order.MoveToFront(el)
+		el.Value.(*cacheEntry).response = resp
+		return resp, nil
+	}
+	c.entries[key] = c.order.PushFront(&cacheEntry{key: key, response: resp})
+	for c.order.Len() > c.capacity {
+		oldest := c.order.Back()
+		c.order.Remove(oldest)
+		delete(c.entries, oldest.Value.(*cacheEntry).key)
+		c.evictions++
+	}
+	return resp, nil
+}
+
+// drops every cached response, called after the database is updated
+func (c *responseCache) invalidate() {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	c.generation++
+	c.entries = make(map[string]*list.Element)
+	c.order.Init()
+}
+
+func (c *responseCache) stats() cacheStats {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	s := cacheStats{
+		Generation: c.generation,
+		Entries:    c.order.Len(),
+		Capacity:   c.capacity,
+		Hits:       c.hits,
+		Misses:     c.misses,
+		Evictions:  c.evictions,
+	}
+	if total := c.hits + c.misses; total > 0 {
+		s.HitRate = float64(c.hits) / float64(total)
+	}
+	return s
+}
+
+// the cache key for a /data/ request
+func dataCacheKey(query string, filterFtypes []string, orderBy OrderBy, sortOrder Sort, limit int, offset int) string {
+	// ftype order doesn't change the results
+	ftypes := append([]string{}, filterFtypes...)
+	sort.Strings(ftypes)
+	return fmt.Sprintf("data?offset=%d&limit=%d&order_by=%s&sort=%s&ftype=%s&query=%s", offset, limit, orderBy, sortOrder, strings.Join(ftypes, ","), query)
+}
+
+// checks if any of the ETags in the If-None-Match header match this response
+func etagMatches(r *http.Request, etag string) bool {
+	header := r.Header.Get("If-None-Match")
+	if header == "" {
+		return false
+	}
+	// weak comparison, ignore the W/ prefix on either side
+	etag = strings.TrimPrefix(etag, "W/")
+	for _, tag := range strings.Split(header, ",") {
+		tag = strings.TrimPrefix(strings.TrimSpace(tag), "W/")
+		if tag == etag || tag == "*" {
+			return true
+		}
+	}
+	return false
+}
+
+// writes a JSON response, replying 304 Not Modified if the client already has
+// this version, and sending the gzipped body if the client supports it
+func writeResponse(w http.ResponseWriter, r *http.Request, resp *cachedResponse) {
+	w.Header().Set("ETag", resp.etag)
+	// clients may store responses, but have to revalidate them before use
+	w.Header().Set("Cache-Control", "no-cache")
+	w.Header().Add("Vary", "Accept-Encoding")
+	if etagMatches(r, resp.etag) {
+		w.WriteHeader(http.StatusNotModified)
+		return
+	}
+	w.Header().Set("Content-Type", "application/json")
+	if resp.gzipped != nil && acceptsGzip(r) {
+		w.Header().Set("Content-Encoding", "gzip")
+		w.Write(resp.gzipped)
+		return
+	}
+	w.Write(resp.body)
+}
@@ -0,0 +1,100 @@
+package main
+
+import (
+	"bytes"
+	"compress/gzip"
+	"io"
+	"net/http"
+	"net/http/httptest"
+	"testing"
+)
+
+func TestResponseCache(t *testing.T) {
+	cache := newResponseCache(2)
+	renders := 0
+	render := func() ([]byte, error) {
+		renders++
+		return []byte(`[]`), nil
+	}
+
+	cache.get("a", render)
+	cache.get("a", render)
+	if renders != 1 {
+		t.Fatalf("expected 1 render, got %d", renders)
+	}
+
+	// 'a' is the least recently used entry, so gets evicted by 'c',
+	// and adding it back evicts 'b'
+	cache.get("b", render)
+	cache.get("c", render)
+	cache.get("a", render)
+	if renders != 4 {
+		t.Fatalf("expected 4 renders, got %d", renders)
+	}
+
+	cache.invalidate()
+	cache.get("a", render)
+	if renders != 5 {
+		t.Fatalf("expected render after invalidating, got %d renders", renders)
+	}
+
+	stats := cache.stats()
+	if stats.Hits != 1 || stats.Misses != 5 || stats.Evictions != 2 || stats.Generation != 1 {
+		t.Fatalf("unexpected stats %+v", stats)
+	}
+}
+
+func TestResponseCacheSkipsStaleRenders(t *testing.T) {
+	cache := newResponseCache(2)
+	cache.get("a", func() ([]byte, error) {
+		// database was updated while this was rendering
+		cache.invalidate()
+		return []byte(`[]`), nil
+	})
+	if cache.stats().Entries != 0 {
+		t.Fatal("response rendered before invalidating was cached")
+	}
+}
+
+func TestDataCacheKey(t *testing.T) {
+	a := dataCacheKey("", []string{"listen", "album"}, When, Descending, 100, 0)
+	b := dataCacheKey("", []string{"album", "listen"}, When, Descending, 100, 0)
+	if a != b {
+		t.Fatalf("ftype order changed key: %s != %s", a, b)
+	}
+}
+
+func TestWriteResponse(t *testing.T) {
+	body := bytes.Repeat([]byte(`{"id":"listen_1"},`), 500)
+	resp := newCachedResponse(body)
+
+	r := httptest.NewRequest("GET", "/data/", nil)
+	r.Header.Set("Accept-Encoding", "gzip")
+	w := httptest.NewRecorder()
+	writeResponse(w, r, resp)
+	if w.Header().Get("Content-Encoding") != "gzip" {
+		t.Fatal("expected gzip response")
+	}
+	gz, err := gzip.NewReader(w.Body)
+	if err != nil {
+		t.Fatal(err)
+	}
+	decoded, err := io.ReadAll(gz)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if !bytes.Equal(decoded, body) {
+		t.Fatal("decompressed body doesn't match")
+	}
+
+	r = httptest.NewRequest("GET", "/data/", nil)
+	r.Header.Set("If-None-Match", w.Header().Get("ETag"))
+	w = httptest.NewRecorder()
+	writeResponse(w, r, resp)
+	if w.Code != http.StatusNotModified {
+		t.Fatalf("expected 304, got %d", w.Code)
+	}
+	if w.Body.Len() != 0 {
+		t.Fatal("expected empty body for 304")
+	}
+}
@@ -0,0 +1,23 @@
+package main
+
+import (
+	"net/http/httptest"
+	"testing"
+)
+
+func TestAcceptsGzip(t *testing.T) {
+	for header, expected := range map[string]bool{
+		"":                  false,
+		"gzip":              true,
+		"br, gzip, deflate": true,
+		"gzip;q=0.5":        true,
+		"gzip;q=0":          false,
+		"deflate":           false,
+	} {
+		r := httptest.NewRequest("GET", "/data/", nil)
+		r.Header.Set("Accept-Encoding", header)
+		if acceptsGzip(r) != expected {
+			t.Errorf("%q: expected %t", header, expected)
+		}
+	}
+}
@@ -39,6 +39,7 @@ type Config struct {
 	SQLEcho      bool
 	Port         int
 	LogRequests  bool
+	CacheSize    int
 }
 
 func ParseConfig() *Config {
@@ -59,6 +60,7 @@ func ParseConfig() *Config {
 	var port int
 	var logrequests bool
 	var datadir string
+	var cachesize int
 
 	flag.StringVar(&root, "root-dir", RootDir, "Root dir for backend (same dir as 'build' script)")
 	flag.StringVar(&datadir, "data-dir", path.Join(RootDir, "data"), "Data directory for JSON files")
@@ -68,6 +70,7 @@ func ParseConfig() *Config {
 	flag.StringVar(&ftypesFile, "ftypes-file", path.Join(RootDir, ftypesFile), "Path to feedtypes.json file")
 	flag.BoolVar(&echo, "echo", false, "Echo SQL queries")
 	flag.IntVar(&port, "port", 5100, "Port to listen on")
+	flag.IntVar(&cachesize, "cache-size", 256, "Number of rendered responses to keep in memory (0 to disable)")
 
 	flag.Parse()
 
@@ -98,5 +101,6 @@ func ParseConfig() *Config {
 		LogRequests:  logrequests,
 		Port:         port,
 		DataDir:      datadir,
+		CacheSize:    cachesize,
 	}
 }
@@ -51,45 +51,40 @@ func (f *FeedItem) validate() error {
 	return nil
 }
 
-type ModelSet map[string]bool
-
-func (s ModelSet) add(modelId string) {
-	s[modelId] = true
-}
-
-func (s ModelSet) remove(modelId string) {
-	delete(s, modelId)
-}
-
-func (s ModelSet) has(modelId string) bool {
-	_, ok := s[modelId]
-	return ok
-}
-
-func (s ModelSet) missing(modelId string) bool {
-	return !s.has(modelId)
-}
-
-func modelSet(db *sql.DB) ModelSet {
-	s := make(ModelSet)
-	for _, modelId := range modelIds(db) {
-		s.add(modelId)
-	}
-	return s
+// renders the JSON sent to the client for this item
+//
+// this is done once when the item is added to the database and saved
+// in the 'rendered' column, so requests can concatenate the stored
+// JSON instead of decoding/re-encoding each row
+func (f *FeedItem) render() ([]byte, error) {
+	item := *f
+	// set to empty map/array so frontend doesn't have to check for nil
+	if item.Data == nil {
+		item.Data = make(map[string]interface{})
+	}
+	if item.Flags == nil {
+		item.Flags = []string{}
+	}
+	var buf bytes.Buffer
+	enc := json.NewEncoder(&buf)
+	// the chess SVGs are full of angle brackets, which would
+	// otherwise each be escaped to \u003c/\u003e
+	enc.SetEscapeHTML(false)
+	if err := enc.Encode(item); err != nil {
+		return nil, err
+	}
+	return bytes.TrimRight(buf.Bytes(), "\n"), nil
 }
 
 func initDb(db *sql.DB) {
 	// check if table exists
-	// if it does, return
+	// if it doesn't, create it. indexes are created by the migrations below
 	if _, err := db.Exec("SELECT id FROM feedmodel LIMIT 1"); err == nil {
 		log.Println("Database already initialized")
-		return
-	}
-
-	log.Println("Initializing database")
+	} else {
+		log.Println("Initializing database")
 
-	// otherwise, create table
-	_, err := db.Exec(`CREATE TABLE feedmodel (
+		_, err := db.Exec(`CREATE TABLE feedmodel (
 	id VARCHAR NOT NULL,
 	ftype VARCHAR NOT NULL, 
 	title VARCHAR NOT NULL, 
@@ -106,16 +101,120 @@ func initDb(db *sql.DB) {
 	data VARCHAR, 
 	flags VARCHAR, 
 	PRIMARY KEY (id));
-	CREATE INDEX ix_feedmodel_id ON feedmodel (id);
-	CREATE INDEX ix_feedmodel_when ON feedmodel ("when");
-	CREATE INDEX ix_feedmodel_ftype ON feedmodel (ftype);
-	CREATE INDEX ix_feedmodel_score ON feedmodel (score);
 	`)
+		if err != nil {
+			log.Fatal(err)
+		}
+	}
+
+	err := migrateDb(db)
 	if err != nil {
 		log.Fatal(err)
 	}
 }
 
+// schema migrations, applied in order
+//
+// 'PRAGMA user_version' stores how many of these have been applied
+// to the database, so new migrations should only ever be appended
+var migrations = []func(tx *sql.Tx) error{
+	// composite indexes matched to the queries queryData builds:
+	//
+	// ftype IN (...) ORDER BY when
+	// ORDER BY score, when (optionally filtered by ftype)
+	// release_date IS NOT NULL ORDER BY release_date (optionally filtered by ftype)
+	//
+	// the single-column ftype/score indexes are prefixes of the new
+	// ones, and the id index duplicates the primary key
+	func(tx *sql.Tx) error {
+		_, err := tx.Exec(`
+	DROP INDEX IF EXISTS ix_feedmodel_id;
+	DROP INDEX IF EXISTS ix_feedmodel_ftype;
+	DROP INDEX IF EXISTS ix_feedmodel_score;
+	CREATE INDEX IF NOT EXISTS ix_feedmodel_when ON feedmodel ("when");
+	CREATE INDEX IF NOT EXISTS ix_feedmodel_ftype_when ON feedmodel (ftype, "when");
+	CREATE INDEX IF NOT EXISTS ix_feedmodel_score_when ON feedmodel (score, "when");
+	CREATE INDEX IF NOT EXISTS ix_feedmodel_ftype_score_when ON feedmodel (ftype, score, "when");
+	CREATE INDEX IF NOT EXISTS ix_feedmodel_release_date_when ON feedmodel (release_date, "when");
+	CREATE INDEX IF NOT EXISTS ix_feedmodel_ftype_release_date ON feedmodel (ftype, release_date);
+	`)
+		return err
+	},
+	// pre-rendered JSON for each row, see FeedItem.render
+	func(tx *sql.Tx) error {
+		if _, err := tx.Exec("ALTER TABLE feedmodel ADD COLUMN rendered VARCHAR"); err != nil {
+			return err
+		}
+		return renderExistingRows(tx)
+	},
+	// the source each row was loaded from, for shards which replace a source's rows
+	// NULL for rows from top-level JSON files which don't include it
+	func(tx *sql.Tx) error {
+		_, err := tx.Exec(`
+	ALTER TABLE feedmodel ADD COLUMN source VARCHAR;
+	CREATE INDEX ix_feedmodel_source ON feedmodel (source);
+	`)
+		return err
+	},
+	// order_by=score&sort=asc is ORDER BY score ASC, when DESC, which the
+	// (score, when) indexes only cover the left part of
+	func(tx *sql.Tx) error {
+		_, err := tx.Exec(`
+	CREATE INDEX IF NOT EXISTS ix_feedmodel_score_when_desc ON feedmodel (score, "when" DESC);
+	CREATE INDEX IF NOT EXISTS ix_feedmodel_ftype_score_when_desc ON feedmodel (ftype, score, "when" DESC);
+	`)
+		return err
+	},
+	// shard directories which have already been loaded, by the sha256 of
+	// their manifest, so /check doesn't load the newest one again each time
+	func(tx *sql.Tx) error {
+		_, err := tx.Exec(`
+	CREATE TABLE applied_shards (
+	sha256 VARCHAR NOT NULL,
+	dir VARCHAR NOT NULL,
+	applied INTEGER NOT NULL,
+	PRIMARY KEY (sha256));
+	`)
+		return err
+	},
+}
+
+func schemaVersion(db *sql.DB) (int, error) {
+	var version int
+	err := db.QueryRow("PRAGMA user_version").Scan(&version)
+	return version, err
+}
+
+// applies any migrations which haven't been run on this database yet,
+// each in its own transaction along with the version bump
+func migrateDb(db *sql.DB) error {
+	version, err := schemaVersion(db)
+	if err != nil {
+		return err
+	}
+	for version < len(migrations) {
+		log.Printf("Migrating database to schema version %d\n", version+1)
+		tx, err := db.Begin()
+		if err != nil {
+			return err
+		}
+		if err = migrations[version](tx); err != nil {
+			tx.Rollback()
+			return fmt.Errorf("migration %d failed: %w", version+1, err)
+		}
+		// pragma statements can't use placeholders
+		if _, err = tx.Exec(fmt.Sprintf("PRAGMA user_version = %d", version+1)); err != nil {
+			tx.Rollback()
+			return err
+		}
+		if err = tx.Commit(); err != nil {
+			return err
+		}
+		version += 1
+	}
+	return nil
+}
+
 func rowCount(db *sql.DB) int {
 	rows, err := db.Query("SELECT COUNT(*) FROM feedmodel")
 	if err != nil {
@@ -172,6 +271,10 @@ func clearDatabase(db *sql.DB) (int, error) {
 	if err != nil {
 		return 0, err
 	}
+	// so the shards are loaded again
+	if _, err := db.Exec("DELETE FROM applied_shards"); err != nil {
+		return 0, err
+	}
 	affected, err := resp.RowsAffected()
 	if err != nil {
 		return 0, err
@@ -208,6 +311,12 @@ func clearDataDir(config *Config) error {
 			}
 		}
 	}
+	for _, dir := range listShardDirs(config) {
+		log.Printf("removing %s\n", dir)
+		if err := os.RemoveAll(dir); err != nil {
+			return err
+		}
+	}
 	return nil
 }
 
@@ -222,13 +331,12 @@ func updateDatabaseFromJsonFiles(db *sql.DB, config *Config) (int, error) {
 	// load all json files
 	jsonFiles := listJsonFiles(config)
 
-	modelSet := modelSet(db)
 	var funcErr error
 
 	totalAdded := 0
 	for len(jsonFiles) > 0 {
 		log.Printf("loading data from %s\n", jsonFiles[0])
-		added, err := loadFeedItemsFromFile(db, jsonFiles[0], &modelSet)
+		added, err := loadFeedItemsFromFile(db, jsonFiles[0])
 		if err != nil {
 			funcErr = err
 			// unlink file, since we couldn't load it
@@ -251,6 +359,40 @@ func updateDatabaseFromJsonFiles(db *sql.DB, config *Config) (int, error) {
 			os.Remove(jsonFile)
 		}
 	}
+
+	// same for directories of per-source shards
+	// the newest one is kept, but only loaded once
+	shardDirs := listShardDirs(config)
+	for _, dir := range shardDirs {
+		hash, applied, err := shardDirApplied(db, dir)
+		if err != nil {
+			funcErr = err
+			log.Printf("error checking %s: %s\n", dir, err.Error())
+			continue
+		}
+		if applied {
+			continue
+		}
+		log.Printf("loading shards from %s\n", dir)
+		added, err := loadShardDir(db, dir)
+		if err != nil {
+			funcErr = err
+			log.Printf("error loading %s: %s\n", dir, err.Error())
+			os.RemoveAll(dir)
+		} else if err := markShardDirApplied(db, dir, hash); err != nil {
+			funcErr = err
+			log.Printf("error marking %s as loaded: %s\n", dir, err.Error())
+		}
+		totalAdded += added
+	}
+
+	shardDirs = listShardDirs(config)
+	if len(shardDirs) > 1 {
+		for _, dir := range shardDirs[:len(shardDirs)-1] {
+			log.Printf("Pruning old shards %s\n", dir)
+			os.RemoveAll(dir)
+		}
+	}
 	return totalAdded, funcErr
 }
 
@@ -272,7 +414,93 @@ func serializeData(data map[string]interface{}) (*string, error) {
 	return &s, nil
 }
 
-func loadFeedItemsFromFile(db *sql.DB, filename string, modelSet *ModelSet) (int, error) {
+// a line from a top-level JSON file, which also has the name of the source
+// which produced it. not part of FeedItem, so it isn't sent to the client
+type sourcedFeedItem struct {
+	FeedItem
+	Source *string `json:"source"`
+}
+
+// a line from a JSON file, decoded and serialized into the values to insert
+type ingestRow struct {
+	item        FeedItem
+	releaseDate *time.Time
+	data        *string
+	flags       *string
+	rendered    []byte
+}
+
+type decodedLine struct {
+	item sourcedFeedItem
+	err  error
+}
+
+func newIngestRow(item FeedItem) (*ingestRow, error) {
+	if err := item.validate(); err != nil {
+		return nil, err
+	}
+	row := ingestRow{item: item}
+	var err error
+	if row.flags, err = serializeFlags(item.Flags); err != nil {
+		return nil, err
+	}
+	if row.data, err = serializeData(item.Data); err != nil {
+		return nil, err
+	}
+	// parse the release date into a time.Time (currently they are like 2023-01-01)
+	if item.ReleaseDate != nil {
+		rd, err := time.Parse(time.DateOnly, *item.ReleaseDate)
+		if err != nil {
+			return nil, err
+		}
+		row.releaseDate = &rd
+	}
+	if row.rendered, err = item.render(); err != nil {
+		return nil, err
+	}
+	return &row, nil
+}
+
+// decodes and validates each line in the file and sends it to out, stopping at the first error
+//
+// runs on its own goroutine so decoding overlaps with the database writes.
+// closing done stops this early if the writer has returned
+func decodeFeedItems(r io.Reader, out chan<- decodedLine, done <-chan struct{}) {
+	defer close(out)
+	dc := json.NewDecoder(r)
+	for {
+		var res decodedLine
+		// decodes a single JSON value (object, array, string, number, etc)
+		// so stops at the end of the line when the object ends
+		err := dc.Decode(&res.item)
+		if err == io.EOF {
+			return
+		}
+		if err != nil {
+			res.err = err
+		} else {
+			res.err = res.item.validate()
+		}
+		select {
+		case out <- res:
+		case <-done:
+			return
+		}
+		if res.err != nil {
+			return
+		}
+	}
+}
+
+// most lines in a file are usually already in the database, so each id is
+// looked up before the row is serialized/rendered, instead of loading every
+// id in the table into memory first
+const feedItemExists = "SELECT 1 FROM feedmodel WHERE id = ?;"
+
+// 'source' is NULL for files written before my_feed included it
+const insertFeedItem = "INSERT INTO feedmodel (id, ftype, title, score, subtitle, creator, part, subpart, collection, `when`, release_date, image_url, url, data, flags, rendered, source) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?) ON CONFLICT (id) DO NOTHING;"
+
+func loadFeedItemsFromFile(db *sql.DB, filename string) (int, error) {
 	added := 0
 
 	// open file
@@ -289,72 +517,151 @@ func loadFeedItemsFromFile(db *sql.DB, filename string, modelSet *ModelSet) (int
 	}
 	defer tx.Rollback() // The rollback will be ignored if the tx has been committed later in the function.
 
-	dc := json.NewDecoder(file)
-	for {
-		var item FeedItem
-		// decodes a single JSON value (object, array, string, number, etc)
-		// so stops at the end of the line when the object ends
-		if err := dc.Decode(&item); err == io.EOF {
-			break
-		} else if err != nil {
-			return 0, err
-		}
-		lines += 1
+	exists, err := tx.Prepare(feedItemExists)
+	if err != nil {
+		return 0, err
+	}
+	defer exists.Close()
+	stmt, err := tx.Prepare(insertFeedItem)
+	if err != nil {
+		return 0, err
+	}
+	defer stmt.Close()
 
-		if err = item.validate(); err != nil {
-			return 0, err
-		}
+	start := time.Now()
+	results := make(chan decodedLine, 512)
+	done := make(chan struct{})
+	defer close(done)
+	go decodeFeedItems(file, results, done)
 
-		// this modelId is already in the db, so skip it
-		if modelSet.has(item.Id) {
+	var found int
+	for res := range results {
+		if res.err != nil {
+			return 0, res.err
+		}
+		lines += 1
+		err := exists.QueryRow(res.item.Id).Scan(&found)
+		if err == nil {
 			continue
+		} else if err != sql.ErrNoRows {
+			return 0, err
 		}
-
-		flag, err := serializeFlags(item.Flags)
+		row, err := newIngestRow(res.item.FeedItem)
 		if err != nil {
 			return 0, err
 		}
-		data, err := serializeData(item.Data)
+		item := row.item
+		// the id may still be repeated later in the same file
+		result, err := stmt.Exec(item.Id, item.FeedType, item.Title, item.Score, item.Subtitle, item.Creator, item.Part, item.Subpart, item.Collection, item.When, row.releaseDate, item.ImageUrl, item.Url, row.data, row.flags, row.rendered, res.item.Source)
 		if err != nil {
 			return 0, err
 		}
-		// parse the release date into a time.Time (currently they are like 2023-01-01)
-		var releaseDate *time.Time
-		if item.ReleaseDate != nil {
-			rd, err := time.Parse(time.DateOnly, *item.ReleaseDate)
-			if err != nil {
-				return 0, err
-			}
-			releaseDate = &rd
-		}
-
-		_, err = tx.Exec("INSERT INTO feedmodel (id, ftype, title, score, subtitle, creator, part, subpart, collection, `when`, release_date, image_url, url, data, flags) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?);", item.Id, item.FeedType, item.Title, item.Score, item.Subtitle, item.Creator, item.Part, item.Subpart, item.Collection, item.When, releaseDate, item.ImageUrl, item.Url, data, flag)
+		affected, err := result.RowsAffected()
 		if err != nil {
 			return 0, err
 		}
-		added += 1
-		modelSet.add(item.Id)
+		added += int(affected)
 	}
 	err = tx.Commit()
 	if err != nil {
 		return 0, err
 	}
-	log.Printf("Checked %d lines from %s\n", lines, filename)
+	took := time.Since(start)
+	log.Printf("Checked %d lines from %s in %s (%.0f lines/sec)\n", lines, filename, took.Round(time.Millisecond), float64(lines)/took.Seconds())
 	return added, nil
 }
 
-func queryData(
-	db *sql.DB,
-	config *Config,
+// scans a row selected with feedItemColumns back into a FeedItem
+func scanFeedItem(rows *sql.Rows) (*FeedItem, error) {
+	var model FeedItem
+	var rawFlags *[]byte
+	var rawData *[]byte
+	var releaseDate *string
+	// id, ftype, title, score, subtitle, creator, part, subpart, collection, when, release_date, image_url, url, data, flags
+	err := rows.Scan(&model.Id, &model.FeedType, &model.Title, &model.Score, &model.Subtitle, &model.Creator, &model.Part, &model.Subpart, &model.Collection, &model.When, &releaseDate, &model.ImageUrl, &model.Url, &rawData, &rawFlags)
+	if err != nil {
+		return nil, err
+	}
+
+	if releaseDate != nil {
+		// only retain the date portion, not the time
+		model.ReleaseDate = &strings.Split(*releaseDate, "T")[0]
+	}
+
+	// data is stored as nil if not present, else a stringified json object
+	// parse it back into a map
+	if rawData != nil {
+		err = json.Unmarshal(*rawData, &model.Data)
+		if err != nil {
+			return nil, fmt.Errorf("Error unmarshalling data field: %w", err)
+		}
+	}
+
+	// flags is stored as nil if not present, else a stringified json array
+	// parse it back into an array
+	if rawFlags != nil {
+		err = json.Unmarshal(*rawFlags, &model.Flags)
+		if err != nil {
+			return nil, fmt.Errorf("Error unmarshalling flags field: %w", err)
+		}
+	}
+	return &model, nil
+}
+
+const feedItemColumns = "id, ftype, title, score, subtitle, creator, part, subpart, collection, `when`, release_date, image_url, url, data, flags"
+
+// fills in the rendered column for rows added before it existed
+func renderExistingRows(tx *sql.Tx) error {
+	rows, err := tx.Query("SELECT " + feedItemColumns + " FROM feedmodel WHERE rendered IS NULL")
+	if err != nil {
+		return err
+	}
+	// read everything before updating, so we're not modifying the table while scanning it
+	rendered := make(map[string][]byte)
+	for rows.Next() {
+		model, err := scanFeedItem(rows)
+		if err != nil {
+			rows.Close()
+			return err
+		}
+		r, err := model.render()
+		if err != nil {
+			rows.Close()
+			return err
+		}
+		rendered[model.Id] = r
+	}
+	rows.Close()
+	if err = rows.Err(); err != nil {
+		return err
+	}
+
+	log.Printf("Rendering JSON for %d existing rows\n", len(rendered))
+	stmt, err := tx.Prepare("UPDATE feedmodel SET rendered = ? WHERE id = ?")
+	if err != nil {
+		return err
+	}
+	defer stmt.Close()
+	for id, r := range rendered {
+		if _, err := stmt.Exec(r, id); err != nil {
+			return err
+		}
+	}
+	return nil
+}
+
+// builds the SQL for a /data/ request. split out of queryData
+// so the query plans can be checked in db_test.go
+func buildDataQuery(
 	query string,
 	filterFtypes []string,
 	orderBy OrderBy,
 	sort Sort,
 	limit int,
 	offset int,
-) ([]FeedItem, error) {
+) (string, []interface{}) {
 	sb := sqlbuilder.NewSelectBuilder()
-	sb.Select("id, ftype, title, score, subtitle, creator, part, subpart, collection, `when`, release_date, image_url, url, data, flags")
+	sb.Select("rendered")
 	sb.From("feedmodel")
 	if len(filterFtypes) > 0 {
 		sb.Where(sb.In("ftype", stringToInterface(filterFtypes)...))
@@ -403,68 +710,93 @@ func queryData(
 
 	sb.Limit(limit).Offset(offset)
 
-	sql, args := sb.Build()
+	return sb.Build()
+}
+
+func queryData(
+	db *sql.DB,
+	config *Config,
+	query string,
+	filterFtypes []string,
+	orderBy OrderBy,
+	sort Sort,
+	limit int,
+	offset int,
+) ([]byte, error) {
+	stmt, args := buildDataQuery(query, filterFtypes, orderBy, sort, limit, offset)
 	if config.SQLEcho {
-		log.Printf("QUERY: %s\n", sql)
+		log.Printf("QUERY: %s\n", stmt)
 		// json stringify args
 		var buf bytes.Buffer
 		json.NewEncoder(&buf).Encode(args)
 		log.Printf("VARS: %s", buf.String())
 	}
 
-	rows, err := db.Query(sql, args...)
+	rows, err := db.Query(stmt, args...)
 	if err != nil {
 		log.Printf("Error querying database: %s\n", err)
 		return nil, errors.New("Error querying database")
 	}
 	defer rows.Close()
 
-	var models []FeedItem = []FeedItem{}
-
-	for rows.Next() {
-		var model FeedItem
-		var rawFlags *[]byte
-		var rawData *[]byte
-		var releaseDate *string
-		// id, ftype, title, score, subtitle, creator, part, subpart, collection, when, release_date, image_url, url, data, flags
-		err := rows.Scan(&model.Id, &model.FeedType, &model.Title, &model.Score, &model.Subtitle, &model.Creator, &model.Part, &model.Subpart, &model.Collection, &model.When, &releaseDate, &model.ImageUrl, &model.Url, &rawData, &rawFlags)
-		if err != nil {
+	var buf bytes.Buffer
+	buf.WriteByte('[')
+	for i := 0; rows.Next(); i++ {
+		var rendered sql.RawBytes
+		if err := rows.Scan(&rendered); err != nil {
 			log.Printf("Error scanning row: %s\n", err)
 			return nil, errors.New("Error scanning row")
 		}
-
-		if releaseDate != nil {
-			// only retain the date portion, not the time
-			model.ReleaseDate = &strings.Split(*releaseDate, "T")[0]
+		if i > 0 {
+			buf.WriteByte(',')
 		}
+		buf.Write(rendered)
+	}
+	if err := rows.Err(); err != nil {
+		log.Printf("Error reading rows: %s\n", err)
+		return nil, errors.New("Error reading rows")
+	}
+	buf.WriteString("]\n")
+	return buf.Bytes(), nil
+}
 
-		// data is stored as nil if not present, else a stringified json object
-		// parse it back into a map
-		if rawData != nil {
-			err = json.Unmarshal(*rawData, &model.Data)
-			if err != nil {
-				log.Printf("Error unmarshalling data: %s\n", err)
-				return nil, errors.New("Error unmarshalling data field")
-			}
-		} else {
-			// set to empty map so frontend doesn't have to check for nil
-			model.Data = make(map[string]interface{})
-		}
+// the id and time of a recent item, for /data/latest
+type latestItem struct {
+	Id   string `json:"id"`
+	When int64  `json:"when"`
+}
 
-		// flags is stored as nil if not present, else a stringified json array
-		// parse it back into an array
-		if rawFlags != nil {
-			err = json.Unmarshal(*rawFlags, &model.Flags)
-			if err != nil {
-				log.Printf("Error unmarshalling flags: %s\n", err)
-				return nil, errors.New("Error unmarshalling flags field")
+const latestQuery = "SELECT id, `when` FROM feedmodel WHERE ftype = ? ORDER BY `when` DESC LIMIT ?"
+
+// the most recent 'limit' items for each ftype, newest first. one query per
+// ftype, each of which only reads 'limit' rows from ix_feedmodel_ftype_when
+func latestByFtype(db *sql.DB, limit int) (map[string][]latestItem, error) {
+	stmt, err := db.Prepare(latestQuery)
+	if err != nil {
+		return nil, err
+	}
+	defer stmt.Close()
+	latest := make(map[string][]latestItem)
+	for _, ftype := range feedTypes(db) {
+		rows, err := stmt.Query(ftype, limit)
+		if err != nil {
+			return nil, err
+		}
+		items := make([]latestItem, 0, limit)
+		for rows.Next() {
+			var item latestItem
+			if err := rows.Scan(&item.Id, &item.When); err != nil {
+				rows.Close()
+				return nil, err
 			}
-		} else {
-			// set to empty array
-			model.Flags = []string{}
+			items = append(items, item)
 		}
-
-		models = append(models, model)
+		err = rows.Err()
+		rows.Close()
+		if err != nil {
+			return nil, err
+		}
+		latest[ftype] = items
 	}
-	return models, nil
+	return latest, nil
 }
@@ -0,0 +1,382 @@
+package main
+
+import (
+	"bufio"
+	"database/sql"
+	"encoding/json"
+	"fmt"
+	"math/rand"
+	"os"
+	"path"
+	"strconv"
+	"strings"
+	"testing"
+)
+
+// number of synthetic rows to seed the benchmark database with
+const seedRows = 50000
+
+var seedFeedTypes = []string{
+	"album",
+	"anime",
+	"anime_episode",
+	"chess",
+	"game",
+	"game_achievement",
+	"listen",
+	"manga",
+	"manga_chapter",
+	"osrs_achievement",
+	"trakt_history_episode",
+	"trakt_history_movie",
+	"trakt_movie",
+	"trakt_show",
+}
+
+// creates an empty database in a temporary directory
+func emptyDatabase(tb testing.TB) *sql.DB {
+	tb.Helper()
+	dbpath := path.Join(tb.TempDir(), "feeddata.sqlite")
+	db, err := sql.Open("sqlite3", "file:"+dbpath+"?mode=rwc&_journal_mode=WAL")
+	if err != nil {
+		tb.Fatal(err)
+	}
+	tb.Cleanup(func() { db.Close() })
+	initDb(db)
+	return db
+}
+
+// creates a new database in a temporary directory, and fills it with synthetic feed items
+func seedDatabase(tb testing.TB, rows int) *sql.DB {
+	tb.Helper()
+	db := emptyDatabase(tb)
+
+	rng := rand.New(rand.NewSource(1))
+	tx, err := db.Begin()
+	if err != nil {
+		tb.Fatal(err)
+	}
+	stmt, err := tx.Prepare("INSERT INTO feedmodel (id, ftype, title, score, creator, `when`, release_date, rendered) VALUES (?,?,?,?,?,?,?,?)")
+	if err != nil {
+		tb.Fatal(err)
+	}
+	for i := 0; i < rows; i++ {
+		ftype := seedFeedTypes[rng.Intn(len(seedFeedTypes))]
+		creator := fmt.Sprintf("Creator %d", rng.Intn(500))
+		item := FeedItem{
+			Id:       fmt.Sprintf("%s_%d", ftype, i),
+			FeedType: ftype,
+			Title:    fmt.Sprintf("Title %d", i),
+			Creator:  &creator,
+			When:     1262304000 + rng.Int63n(400000000),
+		}
+		if rng.Intn(4) == 0 {
+			s := float32(rng.Intn(11))
+			item.Score = &s
+		}
+		if rng.Intn(3) == 0 {
+			rd := fmt.Sprintf("%d-%02d-%02d", 1960+rng.Intn(60), 1+rng.Intn(12), 1+rng.Intn(28))
+			item.ReleaseDate = &rd
+		}
+		rendered, err := item.render()
+		if err != nil {
+			tb.Fatal(err)
+		}
+		_, err = stmt.Exec(item.Id, item.FeedType, item.Title, item.Score, item.Creator, item.When, item.ReleaseDate, rendered)
+		if err != nil {
+			tb.Fatal(err)
+		}
+	}
+	stmt.Close()
+	if err = tx.Commit(); err != nil {
+		tb.Fatal(err)
+	}
+	return db
+}
+
+type dataQueryArgs struct {
+	query        string
+	filterFtypes []string
+	orderBy      OrderBy
+	sort         Sort
+}
+
+func (q dataQueryArgs) String() string {
+	ftypes := strings.Join(q.filterFtypes, ",")
+	if ftypes == "" {
+		ftypes = "all"
+	}
+	return fmt.Sprintf("order_by=%s/sort=%s/ftype=%s/query=%t", q.orderBy, q.sort, ftypes, q.query != "")
+}
+
+// every combination of parameters the /data/ endpoint accepts
+func dataQueryCombinations() []dataQueryArgs {
+	var combinations []dataQueryArgs
+	for _, query := range []string{"", "title"} {
+		for _, filterFtypes := range [][]string{nil, {"listen"}, {"anime", "anime_episode"}} {
+			for _, orderBy := range []OrderBy{When, Score, Release} {
+				for _, sort := range []Sort{Descending, Ascending} {
+					combinations = append(combinations, dataQueryArgs{query, filterFtypes, orderBy, sort})
+				}
+			}
+		}
+	}
+	return combinations
+}
+
+func queryPlan(db *sql.DB, query string, args []interface{}) ([]string, error) {
+	rows, err := db.Query("EXPLAIN QUERY PLAN "+query, args...)
+	if err != nil {
+		return nil, err
+	}
+	defer rows.Close()
+	var plan []string
+	for rows.Next() {
+		var id, parent, notused int
+		var detail string
+		if err := rows.Scan(&id, &parent, &notused, &detail); err != nil {
+			return nil, err
+		}
+		plan = append(plan, detail)
+	}
+	return plan, rows.Err()
+}
+
+// makes sure every query the /data/ endpoint can run uses an index,
+// and that queries which filter on at most one ftype never have to sort
+// the matching rows in a temporary b-tree
+//
+// filtering on multiple ftypes merges several index ranges, so that
+// still sorts, but only the rows for those ftypes
+func TestQueryPlans(t *testing.T) {
+	db := seedDatabase(t, 1000)
+	for _, q := range dataQueryCombinations() {
+		query, args := buildDataQuery(q.query, q.filterFtypes, q.orderBy, q.sort, 100, 0)
+		plan, err := queryPlan(db, query, args)
+		if err != nil {
+			t.Fatalf("%s: %s", q, err)
+		}
+		for _, detail := range plan {
+			if detail == "SCAN feedmodel" {
+				t.Errorf("%s: full table scan: %v", q, plan)
+			}
+			// also catches "USE TEMP B-TREE FOR RIGHT PART OF ORDER BY"
+			if strings.HasPrefix(detail, "USE TEMP B-TREE") && len(q.filterFtypes) <= 1 {
+				t.Errorf("%s: sorts without an index: %v", q, plan)
+			}
+		}
+	}
+}
+
+func TestLatestByFtype(t *testing.T) {
+	db := seedDatabase(t, 1000)
+	latest, err := latestByFtype(db, 5)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if len(latest) != len(feedTypes(db)) {
+		t.Fatalf("expected every ftype, got %d", len(latest))
+	}
+	for ftype, items := range latest {
+		if len(items) != 5 {
+			t.Fatalf("%s: expected 5 items, got %d", ftype, len(items))
+		}
+		var newest int64
+		row := db.QueryRow("SELECT MAX(`when`) FROM feedmodel WHERE ftype = ?", ftype)
+		if err := row.Scan(&newest); err != nil {
+			t.Fatal(err)
+		}
+		if items[0].When != newest {
+			t.Fatalf("%s: expected newest item at %d, got %d", ftype, newest, items[0].When)
+		}
+		for i := 1; i < len(items); i++ {
+			if items[i].When > items[i-1].When {
+				t.Fatalf("%s: items not sorted by when", ftype)
+			}
+		}
+	}
+
+	plan, err := queryPlan(db, latestQuery, []interface{}{"listen", 5})
+	if err != nil {
+		t.Fatal(err)
+	}
+	for _, detail := range plan {
+		if !strings.Contains(detail, "ix_feedmodel_ftype_when") {
+			t.Errorf("latest query doesn't use the ftype/when index: %v", plan)
+		}
+	}
+}
+
+func TestMigrationsIdempotent(t *testing.T) {
+	db := seedDatabase(t, 10)
+	// running again shouldn't re-apply anything
+	initDb(db)
+	version, err := schemaVersion(db)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if version != len(migrations) {
+		t.Fatalf("expected schema version %d, got %d", len(migrations), version)
+	}
+}
+
+func TestRender(t *testing.T) {
+	item := FeedItem{Id: "chess_1", FeedType: "chess", When: 1, Title: "Chess"}
+	rendered, err := item.render()
+	if err != nil {
+		t.Fatal(err)
+	}
+	expected := `{"id":"chess_1","ftype":"chess","when":1,"title":"Chess","score":null,"subtitle":null,"creator":null,"part":null,"subpart":null,"collection":null,"release_date":null,"image_url":null,"url":null,"data":{},"flags":[]}`
+	if string(rendered) != expected {
+		t.Fatalf("expected %s, got %s", expected, rendered)
+	}
+
+	item.Data = map[string]interface{}{"svg": "<svg></svg>"}
+	rendered, err = item.render()
+	if err != nil {
+		t.Fatal(err)
+	}
+	if !strings.Contains(string(rendered), `"data":{"svg":"<svg></svg>"}`) {
+		t.Fatalf("expected unescaped svg, got %s", rendered)
+	}
+}
+
+func TestQueryDataJSON(t *testing.T) {
+	db := seedDatabase(t, 200)
+	config := &Config{FeedTypes: &FeedTypes{All: seedFeedTypes}}
+	body, err := queryData(db, config, "", nil, When, Descending, 50, 0)
+	if err != nil {
+		t.Fatal(err)
+	}
+	var items []FeedItem
+	if err := json.Unmarshal(body, &items); err != nil {
+		t.Fatal(err)
+	}
+	if len(items) != 50 {
+		t.Fatalf("expected 50 items, got %d", len(items))
+	}
+	for i := 1; i < len(items); i++ {
+		if items[i].When > items[i-1].When {
+			t.Fatalf("items not sorted by when: %d > %d", items[i].When, items[i-1].When)
+		}
+	}
+}
+
+func BenchmarkQueryData(b *testing.B) {
+	db := seedDatabase(b, seedRows)
+	config := &Config{FeedTypes: &FeedTypes{All: seedFeedTypes}}
+	for _, q := range dataQueryCombinations() {
+		q := q
+		b.Run(q.String(), func(b *testing.B) {
+			for i := 0; i < b.N; i++ {
+				if _, err := queryData(db, config, q.query, q.filterFtypes, q.orderBy, q.sort, 100, 0); err != nil {
+					b.Fatal(err)
+				}
+			}
+		})
+	}
+}
+
+// writes a JSON file like the ones 'my_feed index' creates, with synthetic feed items
+func writeFeedItemsFile(tb testing.TB, lines int) string {
+	tb.Helper()
+	filename := path.Join(tb.TempDir(), "feed.json")
+	f, err := os.Create(filename)
+	if err != nil {
+		tb.Fatal(err)
+	}
+	defer f.Close()
+	w := bufio.NewWriter(f)
+	rng := rand.New(rand.NewSource(1))
+	for i := 0; i < lines; i++ {
+		ftype := seedFeedTypes[rng.Intn(len(seedFeedTypes))]
+		fmt.Fprintf(w, `{"id":"%s_%d","title":"Title %d","ftype":"%s","when":%d,"creator":"Creator %d","data":{},"release_date":"2001-02-03","part":null,"subpart":null,"collection":null,"subtitle":null,"url":null,"image_url":null,"flags":[],"score":7.5}`+"\n", ftype, i, i, ftype, 1262304000+rng.Int63n(400000000), rng.Intn(500))
+	}
+	if err := w.Flush(); err != nil {
+		tb.Fatal(err)
+	}
+	return filename
+}
+
+func TestLoadFeedItemsFromFile(t *testing.T) {
+	db := emptyDatabase(t)
+	filename := writeFeedItemsFile(t, 100)
+	added, err := loadFeedItemsFromFile(db, filename)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if added != 100 || rowCount(db) != 100 {
+		t.Fatalf("expected 100 rows, added %d, table has %d", added, rowCount(db))
+	}
+	// everything is already in the database, so nothing new is added
+	added, err = loadFeedItemsFromFile(db, filename)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if added != 0 || rowCount(db) != 100 {
+		t.Fatalf("expected no new rows, added %d, table has %d", added, rowCount(db))
+	}
+}
+
+func TestLoadFeedItemsFromFileInvalid(t *testing.T) {
+	db := emptyDatabase(t)
+	filename := path.Join(t.TempDir(), "feed.json")
+	// second line is missing a title
+	contents := `{"id":"listen_1","title":"Song","ftype":"listen","when":1}` + "\n" + `{"id":"listen_2","ftype":"listen","when":2}` + "\n"
+	if err := os.WriteFile(filename, []byte(contents), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	if _, err := loadFeedItemsFromFile(db, filename); err == nil {
+		t.Fatal("expected validation error")
+	}
+	// the whole file is rolled back
+	if rowCount(db) != 0 {
+		t.Fatalf("expected no rows, table has %d", rowCount(db))
+	}
+}
+
+// lines in the file used by BenchmarkLoadFeedItemsFromFile
+// e.g. FEED_BENCH_LINES=1000000 go test -run '^$' -bench LoadFeedItems
+func benchLines(b *testing.B) int {
+	if env := os.Getenv("FEED_BENCH_LINES"); env != "" {
+		lines, err := strconv.Atoi(env)
+		if err != nil {
+			b.Fatal(err)
+		}
+		return lines
+	}
+	return 100000
+}
+
+func BenchmarkLoadFeedItemsFromFile(b *testing.B) {
+	lines := benchLines(b)
+	filename := writeFeedItemsFile(b, lines)
+
+	// every line is new
+	b.Run("empty", func(b *testing.B) {
+		for i := 0; i < b.N; i++ {
+			b.StopTimer()
+			db := emptyDatabase(b)
+			b.StartTimer()
+			if _, err := loadFeedItemsFromFile(db, filename); err != nil {
+				b.Fatal(err)
+			}
+		}
+		b.ReportMetric(float64(lines*b.N)/b.Elapsed().Seconds(), "rows/s")
+	})
+
+	// every line is already in the database, like a /check after a re-index
+	b.Run("existing", func(b *testing.B) {
+		db := emptyDatabase(b)
+		if _, err := loadFeedItemsFromFile(db, filename); err != nil {
+			b.Fatal(err)
+		}
+		b.ResetTimer()
+		for i := 0; i < b.N; i++ {
+			if _, err := loadFeedItemsFromFile(db, filename); err != nil {
+				b.Fatal(err)
+			}
+		}
+		b.ReportMetric(float64(lines*b.N)/b.Elapsed().Seconds(), "rows/s")
+	})
+}
@@ -3,6 +3,7 @@ package main
 import (
 	"database/sql"
 	"encoding/json"
+	"errors"
 	"fmt"
 	_ "github.com/mattn/go-sqlite3"
 	"log"
@@ -105,6 +106,8 @@ func main() {
 	count := rowCount(db)
 	log.Printf("feedmodel table contains %d rows\n", count)
 
+	cache := newResponseCache(config.CacheSize)
+
 	// Start the web server
 	http.HandleFunc("/check", func(w http.ResponseWriter, r *http.Request) {
 		if !auth(&w, r, config.BearerSecret) {
@@ -115,6 +118,7 @@ func main() {
 		}
 
 		added, err := updateDatabaseFromJsonFiles(db, config)
+		cache.invalidate()
 		log.Printf("Added %d new items\n", added)
 		checkResponse := checkResponse{Count: added}
 		if err != nil {
@@ -143,6 +147,7 @@ func main() {
 		count := rowCount(db)
 		log.Printf("feedmodel table contains %d rows\n", count)
 		added, err := updateDatabaseFromJsonFiles(db, config)
+		cache.invalidate()
 		log.Printf("Added %d new items\n", added)
 		checkResponse := checkResponse{Count: added}
 		if err != nil {
@@ -175,19 +180,62 @@ func main() {
 		}
 	})
 
-	http.HandleFunc("/data/ids", func(w http.ResponseWriter, r *http.Request) {
-		ids := modelIds(db)
-		if config.LogRequests {
-			log.Printf("Found %d ids\n", len(ids))
+	http.HandleFunc("/cache-stats", func(w http.ResponseWriter, r *http.Request) {
+		if !auth(&w, r, config.BearerSecret) {
+			return
 		}
 		w.Header().Set("Content-Type", "application/json")
-		json.NewEncoder(w).Encode(ids)
+		json.NewEncoder(w).Encode(cache.stats())
+	})
+
+	http.HandleFunc("/data/ids", func(w http.ResponseWriter, r *http.Request) {
+		resp, err := cache.get("ids", func() ([]byte, error) {
+			ids := modelIds(db)
+			if config.LogRequests {
+				log.Printf("Found %d ids\n", len(ids))
+			}
+			return encodeJSON(ids)
+		})
+		if err != nil {
+			http.Error(w, err.Error(), http.StatusInternalServerError)
+			return
+		}
+		writeResponse(w, r, resp)
 	})
 
 	http.HandleFunc("/data/types", func(w http.ResponseWriter, r *http.Request) {
-		types := feedTypes(db)
-		w.Header().Set("Content-Type", "application/json")
-		json.NewEncoder(w).Encode(types)
+		resp, err := cache.get("types", func() ([]byte, error) {
+			return encodeJSON(feedTypes(db))
+		})
+		if err != nil {
+			http.Error(w, err.Error(), http.StatusInternalServerError)
+			return
+		}
+		writeResponse(w, r, resp)
+	})
+
+	// the most recent ids for every ftype in one request, so that
+	// scripts/feed_check doesn't have to page through /data/ for each one
+	http.HandleFunc("/data/latest", func(w http.ResponseWriter, r *http.Request) {
+		qrParams := r.URL.Query()
+		limit, err := parseIntegerQueryParam("limit", &qrParams, 1, 1, &maxLimit)
+		if err != nil {
+			http.Error(w, err.Error(), http.StatusBadRequest)
+			return
+		}
+		resp, err := cache.get(fmt.Sprintf("latest?limit=%d", limit), func() ([]byte, error) {
+			latest, err := latestByFtype(db, limit)
+			if err != nil {
+				log.Printf("Error querying latest items: %s\n", err)
+				return nil, errors.New("Error querying database")
+			}
+			return encodeJSON(latest)
+		})
+		if err != nil {
+			http.Error(w, err.Error(), http.StatusInternalServerError)
+			return
+		}
+		writeResponse(w, r, resp)
 	})
 
 	http.HandleFunc("/data/", func(w http.ResponseWriter, r *http.Request) {
@@ -246,14 +294,16 @@ func main() {
 			log.Printf("Running data/ with offset '%d', limit '%d', orderBy '%s', sort '%s', ftype filter %+v, query '%s'\n", offset, limit, orderBy, sort, filterFtypes, query)
 		}
 
-		models, err := queryData(db, config, query, filterFtypes, orderBy, sort, limit, offset)
+		key := dataCacheKey(query, filterFtypes, orderBy, sort, limit, offset)
+		resp, err := cache.get(key, func() ([]byte, error) {
+			return queryData(db, config, query, filterFtypes, orderBy, sort, limit, offset)
+		})
 		if err != nil {
 			http.Error(w, err.Error(), http.StatusInternalServerError)
 			return
 		}
 
-		w.Header().Set("Content-Type", "application/json")
-		json.NewEncoder(w).Encode(models)
+		writeResponse(w, r, resp)
 	})
 
 	log.Printf("Starting server on port %d\n", config.Port)
@@ -0,0 +1,278 @@
+package main
+
+import (
+	"crypto/sha256"
+	"database/sql"
+	"encoding/hex"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"io"
+	"log"
+	"os"
+	"path"
+	"runtime"
+	"sort"
+	"time"
+)
+
+// per-source output from 'my_feed index --shards'
+//
+// the data directory can contain directories with a manifest.json, which
+// describes a JSON file ('shard') for each source in that directory
+
+const manifestFile = "manifest.json"
+
+type shardSource struct {
+	Name   string `json:"name"`
+	File   string `json:"file"`
+	Count  int    `json:"count"`
+	Sha256 string `json:"sha256"`
+}
+
+type shardManifest struct {
+	Created int64 `json:"created"`
+	// if true, every row from each source is replaced by the items in its shard
+	// otherwise, only new ids are added, like the top-level JSON files
+	Replace bool          `json:"replace"`
+	Sources []shardSource `json:"sources"`
+}
+
+func readShardManifest(dir string) (*shardManifest, error) {
+	f, err := os.Open(path.Join(dir, manifestFile))
+	if err != nil {
+		return nil, err
+	}
+	defer f.Close()
+	var manifest shardManifest
+	if err := json.NewDecoder(f).Decode(&manifest); err != nil {
+		return nil, fmt.Errorf("Error parsing %s: %w", path.Join(dir, manifestFile), err)
+	}
+	return &manifest, nil
+}
+
+// whether the shard directory has already been loaded into the database,
+// along with the sha256 of its manifest, which identifies it
+func shardDirApplied(db *sql.DB, dir string) (string, bool, error) {
+	manifest, err := os.ReadFile(path.Join(dir, manifestFile))
+	if err != nil {
+		return "", false, err
+	}
+	sum := sha256.Sum256(manifest)
+	hash := hex.EncodeToString(sum[:])
+	var applied int
+	err = db.QueryRow("SELECT COUNT(*) FROM applied_shards WHERE sha256 = ?", hash).Scan(&applied)
+	return hash, applied > 0, err
+}
+
+func markShardDirApplied(db *sql.DB, dir string, hash string) error {
+	_, err := db.Exec("INSERT OR REPLACE INTO applied_shards (sha256, dir, applied) VALUES (?,?,?)", hash, path.Base(dir), time.Now().Unix())
+	return err
+}
+
+// lists directories in the data dir which contain a manifest, sorted by name
+func listShardDirs(config *Config) []string {
+	files, err := os.ReadDir(config.DataDir)
+	if err != nil {
+		log.Fatal(err)
+	}
+	var dirs []string
+	for _, f := range files {
+		if !f.IsDir() {
+			continue
+		}
+		dir := path.Join(config.DataDir, f.Name())
+		if _, err := os.Stat(path.Join(dir, manifestFile)); err == nil {
+			dirs = append(dirs, dir)
+		}
+	}
+	sort.Strings(dirs)
+	return dirs
+}
+
+type decodedShard struct {
+	source shardSource
+	rows   []*ingestRow
+	err    error
+}
+
+// decodes every line in a shard, making sure it matches the count/hash in the manifest
+func decodeShard(dir string, source shardSource) decodedShard {
+	shard := decodedShard{source: source}
+	file, err := os.Open(path.Join(dir, path.Base(source.File)))
+	if err != nil {
+		shard.err = err
+		return shard
+	}
+	defer file.Close()
+
+	hash := sha256.New()
+	dc := json.NewDecoder(io.TeeReader(file, hash))
+	for {
+		var item FeedItem
+		err := dc.Decode(&item)
+		if err == io.EOF {
+			break
+		} else if err != nil {
+			shard.err = err
+			return shard
+		}
+		row, err := newIngestRow(item)
+		if err != nil {
+			shard.err = err
+			return shard
+		}
+		shard.rows = append(shard.rows, row)
+	}
+
+	if len(shard.rows) != source.Count {
+		shard.err = fmt.Errorf("%s: manifest has %d items, shard has %d", source.Name, source.Count, len(shard.rows))
+	} else if sum := hex.EncodeToString(hash.Sum(nil)); sum != source.Sha256 {
+		shard.err = fmt.Errorf("%s: sha256 mismatch, manifest has %s, shard is %s", source.Name, source.Sha256, sum)
+	}
+	return shard
+}
+
+const upsertFeedItem = "INSERT INTO feedmodel (id, ftype, title, score, subtitle, creator, part, subpart, collection, `when`, release_date, image_url, url, data, flags, rendered, source) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?) ON CONFLICT (id) DO UPDATE SET ftype=excluded.ftype, title=excluded.title, score=excluded.score, subtitle=excluded.subtitle, creator=excluded.creator, part=excluded.part, subpart=excluded.subpart, collection=excluded.collection, `when`=excluded.`when`, release_date=excluded.release_date, image_url=excluded.image_url, url=excluded.url, data=excluded.data, flags=excluded.flags, rendered=excluded.rendered, source=excluded.source;"
+
+const insertSourceFeedItem = "INSERT INTO feedmodel (id, ftype, title, score, subtitle, creator, part, subpart, collection, `when`, release_date, image_url, url, data, flags, rendered, source) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?) ON CONFLICT (id) DO NOTHING;"
+
+// how the rows for a source changed when its shard was written
+type shardCounts struct {
+	// ids which weren't in the database before
+	added int
+	// ids which were already in the database, from this source or another
+	updated int
+	// rows from this source which aren't in the new shard (replace only)
+	removed int
+}
+
+// writes a decoded shard in a single transaction
+//
+// if replace is set, rows previously loaded from this source are deleted first,
+// and rows with the same id (e.g. from a top-level JSON file) are overwritten
+func writeShard(db *sql.DB, shard decodedShard, replace bool) (shardCounts, error) {
+	var counts shardCounts
+	tx, err := db.Begin()
+	if err != nil {
+		return counts, err
+	}
+	defer tx.Rollback() // The rollback will be ignored if the tx has been committed later in the function.
+
+	query := insertSourceFeedItem
+	// the ids which were loaded from this source before, and are deleted
+	previous := make(map[string]bool)
+	if replace {
+		rows, err := tx.Query("SELECT id FROM feedmodel WHERE source = ?", shard.source.Name)
+		if err != nil {
+			return counts, err
+		}
+		for rows.Next() {
+			var id string
+			if err := rows.Scan(&id); err != nil {
+				rows.Close()
+				return counts, err
+			}
+			previous[id] = true
+		}
+		rows.Close()
+		if err := rows.Err(); err != nil {
+			return counts, err
+		}
+		if _, err := tx.Exec("DELETE FROM feedmodel WHERE source = ?", shard.source.Name); err != nil {
+			return counts, err
+		}
+		counts.removed = len(previous)
+		query = upsertFeedItem
+	}
+
+	stmt, err := tx.Prepare(query)
+	if err != nil {
+		return counts, err
+	}
+	defer stmt.Close()
+	exists, err := tx.Prepare("SELECT COUNT(*) FROM feedmodel WHERE id = ?")
+	if err != nil {
+		return counts, err
+	}
+	defer exists.Close()
+
+	for _, row := range shard.rows {
+		item := row.item
+		if previous[item.Id] {
+			counts.updated++
+			counts.removed--
+		} else if replace {
+			// the upsert overwrites rows from other sources/top-level JSON files
+			var n int
+			if err := exists.QueryRow(item.Id).Scan(&n); err != nil {
+				return counts, err
+			}
+			if n > 0 {
+				counts.updated++
+			} else {
+				counts.added++
+			}
+		}
+		result, err := stmt.Exec(item.Id, item.FeedType, item.Title, item.Score, item.Subtitle, item.Creator, item.Part, item.Subpart, item.Collection, item.When, row.releaseDate, item.ImageUrl, item.Url, row.data, row.flags, row.rendered, shard.source.Name)
+		if err != nil {
+			return counts, err
+		}
+		if !replace {
+			// 0 if the id was already in the database
+			affected, err := result.RowsAffected()
+			if err != nil {
+				return counts, err
+			}
+			counts.added += int(affected)
+		}
+	}
+	if err = tx.Commit(); err != nil {
+		return shardCounts{}, err
+	}
+	return counts, nil
+}
+
+// loads every shard in a directory
+//
+// shards are decoded and verified in parallel, and then written one
+// at a time (sqlite only has one writer), each in its own transaction
+func loadShardDir(db *sql.DB, dir string) (int, error) {
+	manifest, err := readShardManifest(dir)
+	if err != nil {
+		return 0, err
+	}
+
+	start := time.Now()
+	sem := make(chan struct{}, runtime.NumCPU())
+	decoded := make([]chan decodedShard, len(manifest.Sources))
+	for i, source := range manifest.Sources {
+		decoded[i] = make(chan decodedShard, 1)
+		go func(out chan<- decodedShard, source shardSource) {
+			sem <- struct{}{}
+			defer func() { <-sem }()
+			out <- decodeShard(dir, source)
+		}(decoded[i], source)
+	}
+
+	total := 0
+	var errs []error
+	for _, out := range decoded {
+		shard := <-out
+		if shard.err != nil {
+			log.Printf("error loading shard %s: %s\n", shard.source.Name, shard.err.Error())
+			errs = append(errs, shard.err)
+			continue
+		}
+		counts, err := writeShard(db, shard, manifest.Replace)
+		if err != nil {
+			log.Printf("error writing shard %s: %s\n", shard.source.Name, err.Error())
+			errs = append(errs, fmt.Errorf("%s: %w", shard.source.Name, err))
+			continue
+		}
+		log.Printf("Wrote %d new items from %s (%d updated, %d removed)\n", counts.added, shard.source.Name, counts.updated, counts.removed)
+		total += counts.added
+	}
+	log.Printf("Loaded %d sources from %s in %s\n", len(manifest.Sources), dir, time.Since(start).Round(time.Millisecond))
+	return total, errors.Join(errs...)
+}
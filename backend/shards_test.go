@@ -0,0 +1,165 @@
+package main
+
+import (
+	"crypto/sha256"
+	"encoding/hex"
+	"encoding/json"
+	"fmt"
+	"os"
+	"path"
+	"strings"
+	"testing"
+)
+
+// writes a shard directory with a single source, like 'my_feed index --shards' would
+func writeShardDir(t *testing.T, dir string, source string, replace bool, ids []string) {
+	t.Helper()
+	if err := os.MkdirAll(dir, 0o755); err != nil {
+		t.Fatal(err)
+	}
+	var contents []byte
+	for i, id := range ids {
+		contents = append(contents, []byte(fmt.Sprintf(`{"id":"%s","title":"OSRS - %d","ftype":"osrs_achievement","when":%d}`+"\n", id, i, i+1))...)
+	}
+	file := source + ".json"
+	if err := os.WriteFile(path.Join(dir, file), contents, 0o644); err != nil {
+		t.Fatal(err)
+	}
+	sum := sha256.Sum256(contents)
+	manifest := shardManifest{
+		Created: 1,
+		Replace: replace,
+		Sources: []shardSource{{Name: source, File: file, Count: len(ids), Sha256: hex.EncodeToString(sum[:])}},
+	}
+	encoded, err := json.Marshal(manifest)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if err := os.WriteFile(path.Join(dir, manifestFile), encoded, 0o644); err != nil {
+		t.Fatal(err)
+	}
+}
+
+func TestLoadShardDirReplace(t *testing.T) {
+	db := emptyDatabase(t)
+	// an item from a top-level JSON file, which isn't part of any source
+	other := path.Join(t.TempDir(), "other.json")
+	if err := os.WriteFile(other, []byte(`{"id":"listen_1","title":"Song","ftype":"listen","when":1}`+"\n"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	if _, err := loadFeedItemsFromFile(db, other); err != nil {
+		t.Fatal(err)
+	}
+
+	source := "my_feed.sources.games.osrs"
+	first := path.Join(t.TempDir(), "1")
+	writeShardDir(t, first, source, true, []string{"osrs_1", "osrs_2", "osrs_3"})
+	if added, err := loadShardDir(db, first); err != nil || added != 3 {
+		t.Fatalf("expected 3 items added, got %d (%v)", added, err)
+	}
+
+	// osrs_3 is no longer produced by the source, so should be removed
+	second := path.Join(t.TempDir(), "2")
+	writeShardDir(t, second, source, true, []string{"osrs_1", "osrs_2"})
+	if _, err := loadShardDir(db, second); err != nil {
+		t.Fatal(err)
+	}
+	ids := modelIds(db)
+	if len(ids) != 3 || contains(ids, "osrs_3") || !contains(ids, "listen_1") {
+		t.Fatalf("unexpected ids after replacing source: %v", ids)
+	}
+}
+
+func TestLoadShardDirHashMismatch(t *testing.T) {
+	db := emptyDatabase(t)
+	dir := t.TempDir()
+	source := "my_feed.sources.games.osrs"
+	writeShardDir(t, dir, source, false, []string{"osrs_1"})
+	// modify the shard after the manifest was written
+	if err := os.WriteFile(path.Join(dir, source+".json"), []byte(`{"id":"osrs_2","title":"OSRS","ftype":"osrs_achievement","when":1}`+"\n"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	if _, err := loadShardDir(db, dir); err == nil {
+		t.Fatal("expected sha256 mismatch error")
+	}
+	if rowCount(db) != 0 {
+		t.Fatalf("expected no rows, table has %d", rowCount(db))
+	}
+}
+
+func TestLoadShardDirCounts(t *testing.T) {
+	db := emptyDatabase(t)
+	source := "my_feed.sources.games.osrs"
+	first := path.Join(t.TempDir(), "1")
+	writeShardDir(t, first, source, true, []string{"osrs_1", "osrs_2"})
+	if added, err := loadShardDir(db, first); err != nil || added != 2 {
+		t.Fatalf("expected 2 items added, got %d (%v)", added, err)
+	}
+	// osrs_1 and osrs_2 are updated, not new
+	second := path.Join(t.TempDir(), "2")
+	writeShardDir(t, second, source, true, []string{"osrs_1", "osrs_2", "osrs_3"})
+	if added, err := loadShardDir(db, second); err != nil || added != 1 {
+		t.Fatalf("expected 1 item added, got %d (%v)", added, err)
+	}
+}
+
+func TestReplaceTopLevelRows(t *testing.T) {
+	db := emptyDatabase(t)
+	source := "my_feed.sources.games.osrs"
+	// written by 'my_feed index', with the source of each item
+	top := path.Join(t.TempDir(), "1.json")
+	contents := `{"id":"osrs_1","title":"OSRS","ftype":"osrs_achievement","when":1,"source":"my_feed.sources.games.osrs"}
+{"id":"osrs_old","title":"OSRS","ftype":"osrs_achievement","when":2,"source":"my_feed.sources.games.osrs"}
+{"id":"listen_1","title":"Song","ftype":"listen","when":1,"source":"my_feed.sources.listens.history"}
+`
+	if err := os.WriteFile(top, []byte(contents), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	if added, err := loadFeedItemsFromFile(db, top); err != nil || added != 3 {
+		t.Fatalf("expected 3 items added, got %d (%v)", added, err)
+	}
+	dir := path.Join(t.TempDir(), "2")
+	writeShardDir(t, dir, source, true, []string{"osrs_1"})
+	if added, err := loadShardDir(db, dir); err != nil || added != 0 {
+		t.Fatalf("expected no new items, got %d (%v)", added, err)
+	}
+	ids := modelIds(db)
+	if len(ids) != 2 || contains(ids, "osrs_old") {
+		t.Fatalf("expected osrs_old to be replaced, got %v", ids)
+	}
+	// the rendered JSON sent to the client doesn't include the source
+	var rendered string
+	if err := db.QueryRow("SELECT rendered FROM feedmodel WHERE id = 'listen_1'").Scan(&rendered); err != nil {
+		t.Fatal(err)
+	}
+	if strings.Contains(rendered, "source") {
+		t.Fatalf("source in rendered item: %s", rendered)
+	}
+}
+
+func TestShardDirLoadedOnce(t *testing.T) {
+	db := emptyDatabase(t)
+	config := &Config{DataDir: t.TempDir()}
+	dir := path.Join(config.DataDir, "1")
+	writeShardDir(t, dir, "my_feed.sources.games.osrs", true, []string{"osrs_1", "osrs_2"})
+	if added, err := updateDatabaseFromJsonFiles(db, config); err != nil || added != 2 {
+		t.Fatalf("expected 2 items added, got %d (%v)", added, err)
+	}
+	// e.g. a newer update to this row, which the old shard shouldn't overwrite
+	if _, err := db.Exec("DELETE FROM feedmodel WHERE id = 'osrs_1'"); err != nil {
+		t.Fatal(err)
+	}
+	if added, err := updateDatabaseFromJsonFiles(db, config); err != nil || added != 0 {
+		t.Fatalf("expected the shard to be skipped, got %d (%v)", added, err)
+	}
+	if ids := modelIds(db); len(ids) != 1 {
+		t.Fatalf("expected the shard to be skipped, got %v", ids)
+	}
+	// /recheck loads it again
+	if _, err := clearDatabase(db); err != nil {
+		t.Fatal(err)
+	}
+	if added, err := updateDatabaseFromJsonFiles(db, config); err != nil || added != 2 {
+		t.Fatalf("expected 2 items added after clearing, got %d (%v)", added, err)
+	}
+}
@@ -0,0 +1,99 @@
+"""
+Measures the peak RSS of building a large synthetic feed, with and without
+interning the repeated FeedItem fields, and the size of the spill format
+compared to the JSON lines 'my_feed index' writes
+
+python3 benchmarks/bench_interning.py --items 1000000
+"""
+
+import os
+import sys
+import time
+import random
+import resource
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from typing import Iterator, List
+
+import click
+
+from my_feed.sources import model
+from my_feed.sources.model import FeedItem
+from my_feed.spill import SpillWriter
+
+
+def _items(n: int) -> Iterator[FeedItem]:
+    rng = random.Random(0)
+    for i in range(n):
+        when = datetime.fromtimestamp(1_500_000_000 + i * 60, tz=timezone.utc)
+        # strings are built for each item, like sources do when parsing their data
+        if i % 2 == 0:
+            show = f"Show {rng.randrange(500)}"
+            slug = show.lower().replace(" ", "-")
+            yield FeedItem(
+                id=f"trakt_episode_{i}",
+                title=f"Episode {i % 20}",
+                ftype="episode",
+                when=when,
+                subtitle=show,
+                collection=show.title(),
+                url=f"https://trakt.tv/shows/{slug}",
+                image_url=f"https://image.tmdb.org/t/p/w342/{slug}.jpg",
+                part=1,
+                subpart=i % 20,
+            )
+        else:
+            artist = f"Artist {rng.randrange(2000)}"
+            yield FeedItem(
+                id=f"mpv_{i}",
+                title=f"Song {i % 12}",
+                ftype="listen",
+                when=when,
+                creator=artist,
+                subtitle=f"{artist} - Album {i % 3}",
+            )
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on linux
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+@click.command()
+@click.option("--items", "n", type=int, default=1_000_000, show_default=True)
+@click.option("--mode", type=click.Choice(["intern", "no-intern"]), hidden=True)
+def main(n: int, mode: str) -> None:
+    if mode is not None:
+        # runs in a subprocess, so each measures its own peak RSS
+        if mode == "no-intern":
+            model.INTERNED_FIELDS = ()  # type: ignore[assignment]
+        start = _max_rss_mb()
+        start_time = time.perf_counter()
+        items: List[FeedItem] = list(_items(n))
+        took = time.perf_counter() - start_time
+        print(f"{mode}: {len(items)} items, {_max_rss_mb() - start:.1f}MB, {took:.2f}s")
+        return
+
+    for m in ("no-intern", "intern"):
+        subprocess.run(
+            [sys.executable, __file__, "--items", str(n), "--mode", m], check=True
+        )
+
+    with tempfile.TemporaryDirectory() as d:
+        spill_path = os.path.join(d, "items.spill")
+        json_path = os.path.join(d, "items.json")
+        with open(spill_path, "w") as sf, open(json_path, "w") as jf:
+            writer = SpillWriter(sf)
+            for item in _items(n):
+                writer.write("my_feed.sources.synthetic", item)
+                jf.write(item.to_json())
+                jf.write("\n")
+        spill_mb = os.path.getsize(spill_path) / 1024 / 1024
+        json_mb = os.path.getsize(json_path) / 1024 / 1024
+    print(f"spill file: {spill_mb:.1f}MB, json lines: {json_mb:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Times the MAL source on a large synthetic list, against the previous
+approach of recomputing the image for every history entry and building a
+reversed copy of the history to find when the entry was completed
+
+MAL_USERNAME=user python3 benchmarks/bench_mal.py --entries 5000 --history 200
+"""
+
+import os
+import time
+import random
+from types import SimpleNamespace
+from datetime import datetime, timezone, timedelta
+from typing import Any, Iterator, List
+
+import click
+
+from my_feed.sources.model import FeedItem
+from my_feed.sources.mal import ANIME, _items, _image_url
+
+
+def _entries(n: int, history: int) -> List[Any]:
+    rng = random.Random(0)
+    start = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    entries = []
+    for i in range(n):
+        episodes = rng.randint(1, history)
+        hist = [
+            SimpleNamespace(
+                number=episodes - j, at=start + timedelta(days=i, minutes=episodes - j)
+            )
+            for j in range(episodes)
+        ]
+        entries.append(
+            SimpleNamespace(
+                id=i,
+                username=os.environ["MAL_USERNAME"],
+                history=hist,
+                APIList=SimpleNamespace(
+                    title=f"Anime {i}",
+                    start_date=None,
+                    main_picture={
+                        "large": f"https://cdn.myanimelist.net/images/anime/{i}l.jpg",
+                        "medium": f"https://cdn.myanimelist.net/images/anime/{i}.jpg",
+                    },
+                ),
+                XMLData=SimpleNamespace(
+                    id=i,
+                    title=f"Anime {i}",
+                    score=rng.randint(0, 10),
+                    status="Completed",
+                    episodes=episodes,
+                    watched_episodes=episodes,
+                    finish_date=None,
+                ),
+            )
+        )
+    return entries
+
+
+def _baseline(entries: List[Any]) -> Iterator[FeedItem]:
+    # how each entry was handled before the extractor was unified
+    for an in entries:
+        url = f"https://myanimelist.net/anime/{an.id}"
+        score = float(an.XMLData.score) if an.XMLData.score is not None else None
+        for hist in an.history:
+            yield FeedItem(
+                id=f"anime_episode_{an.id}_{hist.number}_{int(hist.at.timestamp())}",
+                ftype="anime_episode",
+                when=hist.at,
+                url=url,
+                image_url=_image_url(an),
+                subtitle=f"Episode {hist.number}",
+                collection=str(an.id),
+                part=hist.number,
+                release_date=an.APIList.start_date,
+                title=an.APIList.title,
+            )
+        completed = [
+            ep for ep in reversed(an.history) if ep.number == an.XMLData.episodes
+        ]
+        yield FeedItem(
+            id=f"anime_entry_{an.id}",
+            ftype="anime",
+            when=completed[0].at,
+            url=url,
+            image_url=_image_url(an),
+            title=an.APIList.title,
+            release_date=an.APIList.start_date,
+            score=score,
+        )
+
+
+@click.command()
+@click.option("--entries", type=int, default=5000, show_default=True)
+@click.option(
+    "--history", type=int, default=200, show_default=True, help="Max history per entry"
+)
+def main(entries: int, history: int) -> None:
+    data = _entries(entries, history)
+    results = {}
+    for name, func in (
+        ("before", lambda: list(_baseline(data))),
+        ("unified", lambda: list(_items(data, ANIME))),
+    ):
+        start = time.perf_counter()
+        results[name] = func()
+        took = time.perf_counter() - start
+        click.echo(f"{name}: {len(results[name])} items in {took:.2f}s")
+    if results["before"] != results["unified"]:
+        raise click.ClickException("items differ")
+
+
+if __name__ == "__main__":
+    main()
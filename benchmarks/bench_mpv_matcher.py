@@ -0,0 +1,113 @@
+"""
+Compares the mpv source's PathMatcher against mpv_history_daemon's MediaAllowed,
+on synthetic history entries, making sure they make the same decisions
+
+python3 benchmarks/bench_mpv_matcher.py --entries 1000000 --prefixes 200
+"""
+
+import time
+import random
+from datetime import datetime, timezone
+from typing import Any, Callable, List
+
+import click
+from mpv_history_daemon.events import Media
+from mpv_history_daemon.utils import MediaAllowed
+
+from my_feed.sources.mpv import PathMatcher, _matcher_kwargs
+
+DIRS = ["Music", "Videos", "Downloads", "Movies", "Documents", "Music2", "Mus"]
+EXTS = [".mp3", ".flac", ".MP3", ".opus", ".mkv", ".jpg", ".mp3?token=1", "", ".xyz"]
+
+
+def _random_path(rng: random.Random) -> str:
+    parts = ["", rng.choice(["home", "tmp", "mnt", "dev"])]
+    parts.extend(
+        f"{rng.choice(DIRS)}{rng.randint(0, 20)}" for _ in range(rng.randint(1, 5))
+    )
+    return "/".join(parts) + f"/song{rng.randint(0, 100)}" + rng.choice(EXTS)
+
+
+def _prefixes(rng: random.Random, n: int) -> List[str]:
+    prefixes = []
+    for _ in range(n):
+        path = _random_path(rng)
+        # cut somewhere in the path, so some prefixes end in a partial component
+        prefixes.append(path[: rng.randint(1, len(path))])
+    return prefixes
+
+
+def _time(
+    name: str, is_allowed: Callable[[Any], bool], entries: List[Media]
+) -> List[bool]:
+    start = time.perf_counter()
+    results = [is_allowed(m) for m in entries]
+    took = time.perf_counter() - start
+    click.echo(f"{name}: {took:.3f}s ({len(entries) / took:,.0f} entries/s)")
+    return results
+
+
+@click.command()
+@click.option(
+    "--entries", default=200_000, show_default=True, help="Number of history entries"
+)
+@click.option(
+    "--unique", default=20_000, show_default=True, help="Number of unique paths"
+)
+@click.option(
+    "--prefixes",
+    default=100,
+    show_default=True,
+    help="Number of extra allow/ignore prefixes",
+)
+@click.option("--seed", default=1, show_default=True)
+def main(entries: int, unique: int, prefixes: int, seed: int) -> None:
+    rng = random.Random(seed)
+    kwargs = _matcher_kwargs()
+    kwargs["allow_prefixes"] = kwargs["allow_prefixes"] + _prefixes(rng, prefixes)
+    kwargs["ignore_prefixes"] = kwargs["ignore_prefixes"] + _prefixes(rng, prefixes)
+
+    now = datetime.now(tz=timezone.utc)
+    paths = [_random_path(rng) for _ in range(unique)]
+    history = [
+        Media(
+            path=rng.choice(paths),
+            is_stream=rng.random() < 0.01,
+            start_time=now,
+            end_time=now,
+            pause_duration=0.0,
+            media_duration=None,
+            media_title=None,
+            actions=[],
+            metadata={},
+        )
+        for _ in range(entries)
+    ]
+    click.echo(
+        f"{entries} entries, {unique} unique paths, {len(kwargs['allow_prefixes'])} allow/{len(kwargs['ignore_prefixes'])} ignore prefixes"
+    )
+
+    # MediaAllowed extends the list of ignore prefixes it's given, so pass copies
+    media_allowed = MediaAllowed(
+        **{k: list(v) if isinstance(v, list) else v for k, v in kwargs.items()}
+    )
+    expected = _time("MediaAllowed", media_allowed.is_allowed, history)
+    got = _time("PathMatcher", PathMatcher(**kwargs).is_allowed, history)
+    # just the tries, without remembering each path
+    trie = PathMatcher(**kwargs)
+    _time(
+        "PathMatcher (no memo)",
+        lambda m: not m.is_stream and trie.is_allowed_path(m.path),
+        history,
+    )
+
+    mismatches = [m.path for m, a, b in zip(history, expected, got) if a != b]
+    if mismatches:
+        raise click.ClickException(
+            f"{len(mismatches)} different decisions, e.g. {mismatches[:5]}"
+        )
+    click.echo(f"Same decision for every entry ({sum(expected)} allowed)")
+
+
+if __name__ == "__main__":
+    main()
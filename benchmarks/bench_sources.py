@@ -0,0 +1,176 @@
+"""
+Times each source end-to-end on synthetic data, using the stand-in HPI
+modules in tests/fixtures/hpi instead of personal exports
+
+The data is generated before anything is timed. Each source runs --runs
+times in the same process, so the later runs show how much the sources'
+own caches (e.g. mpv's processed files, the TMDB/GiantBomb caches) save
+
+trakt and grouvee request from tests/fixtures/api_stub.py, which is
+started with the --latency/--not-found/--rate-limited options. The
+GiantBomb rate limit makes cold grouvee runs take minutes, so use
+--no-rate-limit to measure everything except waiting on the limits
+
+python3 benchmarks/bench_sources.py --scale 10 --runs 2
+python3 benchmarks/bench_sources.py -i mpv --profile
+python3 benchmarks/bench_sources.py -i trakt,grouvee --runs 2 --latency 0.1 --no-rate-limit
+"""
+
+import os
+import sys
+import time
+import cProfile
+import pstats
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+import click
+
+FIXTURES = Path(__file__).absolute().parent.parent / "tests" / "fixtures"
+
+
+def _setup(scale: float, directory: Path, api_url: str) -> None:
+    # has to happen before anything imports 'my'
+    sys.path.insert(0, str(FIXTURES / "hpi"))
+    music = directory / "Music"
+    data = directory / "data"
+    for d in (music, data):
+        d.mkdir(parents=True, exist_ok=True)
+    os.environ.update(
+        {
+            "MY_FEED_FIXTURE_SCALE": str(scale),
+            "MY_FEED_FIXTURE_DIR": str(directory / "fixtures"),
+            "MY_FEED_CACHE_DIR": str(directory / "cache"),
+            "HPIDATA": str(data),
+            "XDG_MUSIC_DIR": str(music),
+            "MAL_USERNAME": "user",
+            "TMDB_BASE_URL": f"{api_url}/3",
+            "TMDB_API_KEY": "key",
+            "TMDB_CACHE_DIR": str(directory / "tmdb"),
+            "GIANTBOMB_BASE_URL": f"{api_url}/api",
+            "GIANTBOMB_API_KEY": "key",
+            "GIANTBOMB_CACHE_DIR": str(directory / "giantbomb"),
+            "USER": os.environ.get("USER", "user"),
+            # nothing should prompt
+            "MY_FEED_BG": "1",
+        }
+    )
+
+
+def _parse_sources(
+    ctx: click.Context, param: click.Parameter, value: Optional[str]
+) -> List[str]:
+    if value is not None:
+        return [p.strip() for p in value.strip().split(",")]
+    return []
+
+
+@click.command()
+@click.option(
+    "--scale",
+    type=float,
+    default=1,
+    show_default=True,
+    help="Multiplier for the amount of synthetic data",
+)
+@click.option("--runs", type=int, default=1, show_default=True)
+@click.option("-i", "--include-sources", "allow", default=None, callback=_parse_sources)
+@click.option("-e", "--exclude-sources", "deny", default=None, callback=_parse_sources)
+@click.option(
+    "--profile", is_flag=True, default=False, help="Print the slowest functions"
+)
+@click.option(
+    "--latency",
+    type=float,
+    default=0.05,
+    show_default=True,
+    help="Seconds the API stub takes to respond",
+)
+@click.option(
+    "--not-found",
+    type=float,
+    default=0.05,
+    show_default=True,
+    help="Rate of 404s from the API stub",
+)
+@click.option(
+    "--rate-limited",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Rate of 429s from the API stub",
+)
+@click.option(
+    "--rate-limit/--no-rate-limit",
+    default=True,
+    show_default=True,
+    help="Use the API clients' rate limits",
+)
+def main(
+    scale: float,
+    runs: int,
+    allow: List[str],
+    deny: List[str],
+    profile: bool,
+    latency: float,
+    not_found: float,
+    rate_limited: float,
+    rate_limit: bool,
+) -> None:
+    sys.path.insert(0, str(FIXTURES))
+    from api_stub import StubServer  # type: ignore[import]
+
+    stub = StubServer(latency=latency, not_found=not_found, rate_limited=rate_limited)
+    with tempfile.TemporaryDirectory() as d, stub:
+        _setup(scale, Path(d), stub.url)
+
+        from my_feed import http
+
+        if not rate_limit:
+            for name, limit in http.LIMITS.items():
+                http.LIMITS[name] = limit._replace(rate=1000, burst=1000)
+            # as much as the hourly quota allows
+            os.environ.setdefault(
+                "GIANTBOMB_PREFETCH_LIMIT", str(http.LIMITS["giantbomb"].per_hour)
+            )
+
+        from my import _synthetic  # type: ignore[attr-defined]
+        from my_feed.registry import select_sources
+
+        start = time.perf_counter()
+        _synthetic.generate_all()
+        click.echo(
+            f"generated data (scale {scale}) in {time.perf_counter() - start:.2f}s"
+        )
+
+        total = 0.0
+        for source in select_sources(allow=allow, deny=deny):
+            producer = source.load()
+            for run in range(1, runs + 1):
+                prof = cProfile.Profile() if profile else None
+                start = time.perf_counter()
+                if prof is not None:
+                    prof.enable()
+                count = 0
+                for item in producer():
+                    item.check()
+                    count += 1
+                if prof is not None:
+                    prof.disable()
+                took = time.perf_counter() - start
+                total += took
+                click.echo(
+                    f"{source.name} (run {run}): {count} items in {took:.2f}s ({count / max(took, 1e-9):,.0f} items/s)"
+                )
+                if prof is not None:
+                    pstats.Stats(prof).sort_stats("cumulative").print_stats(15)
+        click.echo(f"total: {total:.2f}s")
+        for line in http.summary():
+            click.echo(line)
+        if stub.statuses:
+            click.echo(f"API stub responses: {dict(stub.statuses)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,27 @@
+import os
+import sys
 import time
 import json
+import functools
+import itertools
 from pathlib import Path
-from typing import Iterator, Callable, Optional, List, TypeGuard, Any, Set
+from typing import Callable, Container, Dict, Iterator, Optional, List, Set, Tuple
 
 import click
 
 from .log import logger
 from .sources.model import FeedItem
 from .blur import Blurred
+from .dedupe import IdSet
+from .shards import ShardWriter
+from .spill import ItemBuffer
+from .checkpoint import RunDir
+from .report import RunReport, SourceResult
+from .watchdog import Watchdog, source_timeouts, timeout_for
+from .registry import Producer, Source, select_sources
+from .merge import Started, Finished, events
+from .sources.common import FeedError
+from .daemon import Daemon, default_socket_path, watched_paths, send_trigger
 
 
 @click.group()
@@ -18,61 +32,121 @@ def main():
 BLUE = (83, 158, 206)
 
 
-def _check_source(source: Any) -> TypeGuard[Callable[[], Iterator[FeedItem]]]:
-    if not callable(source):
-        click.echo(f"{source} is not callable, ignoring source", err=True)
-        return False
-    return True
+def sourced_data(
+    *,
+    allow: List[str],
+    deny: List[str],
+    blurred: Blurred | None,
+    echo: bool = False,
+    skip: Container[str] = (),
+    emitted: Optional[IdSet] = None,
+    on_done: Optional[Callable[[SourceResult], None]] = None,
+    concurrency: int = 1,
+) -> Iterator[Tuple[str, FeedItem]]:
+    """
+    Yields each item along with the name of the source which produced it
 
+    Sources in 'skip' aren't run, and 'on_done' is called with how each
+    source did, once it finishes. With a 'concurrency' above 1, that many
+    sources run at once (see merge.py), and their items are interleaved
+    """
+    # every id emitted this run, to catch duplicates across sources
+    if emitted is None:
+        emitted = IdSet()
+    timeouts = source_timeouts()
+    watchdogs: Dict[str, Watchdog] = {}
 
-def _sources() -> Iterator[Callable[[], Iterator[FeedItem]]]:
-    try:
-        from my.config.feed import sources  # type: ignore[import]
-    except Exception:
-        click.echo(
-            "Could not import sources from my.config.feed, see docs or https://github.com/seanbreckenridge/dotfiles/blob/master/.config/my/my/config/feed.py as an example",
-            err=True,
-        )
-        return
-
-    assert callable(sources), "sources imported from my.config.feed is not a function"
-    for src in iter(sources()):
-        if _check_source(src):
-            yield src
+    def _load(source: Source) -> Producer:
+        producer = source.load()
+        if (timeout := timeout_for(source.name, timeouts)) is not None:
+            watchdogs[source.name] = Watchdog(source.name, producer, timeout)
+            return watchdogs[source.name].__iter__
+        return producer
 
-
-def data(
-    *, allow: List[str], deny: List[str], blurred: Blurred | None, echo: bool = False
-) -> Iterator[FeedItem]:
-    for producer in _sources():
-        func = f"{producer.__module__}.{producer.__qualname__}"
-        if len(allow) > 0 and not any(substr in func for substr in allow):
+    selected = [
+        (source.name, functools.partial(_load, source))
+        for source in select_sources(allow=allow, deny=deny)
+        if source.name not in skip
+    ]
+    counts: Dict[str, int] = {}
+    start_times: Dict[str, float] = {}
+    for event in events(selected, concurrency):
+        func = event.name
+        ext = f"Extracting {click.style(func, fg='green')}"
+        if isinstance(event, Started):
+            counts[func] = 0
+            start_times[func] = time.time()
+            click.echo(f"{ext}...")
             continue
-        if len(deny) > 0 and any(substr in func for substr in deny):
+        if isinstance(event, Finished):
+            count = counts[func]
+            took = time.time() - start_times[func]
+            result = SourceResult(name=func, status="complete", items=count, took=took)
+            if (watchdog := watchdogs.get(func)) is not None:
+                result = result._replace(
+                    status=watchdog.status,
+                    timeout=watchdog.timeout,
+                    from_snapshot=watchdog.from_snapshot,
+                )
+            timed_out = ""
+            if not result.complete:
+                timed_out = click.style(
+                    f", timed out, {result.from_snapshot} from the last snapshot",
+                    fg="red",
+                )
+            click.echo(
+                f"{ext}: {click.style(str(count), fg=BLUE)} items (took {click.style(round(took, 2), fg=BLUE)} seconds{timed_out})",
+                err=True,
+            )
+            if on_done is not None:
+                on_done(result)
             continue
-        emitted: set[str] = set()
-        start_time = time.time()
-        func = f"{producer.__module__}.{producer.__qualname__}"
-        ext = f"Extracting {click.style(func, fg='green')}"
-        click.echo(f"{ext}...")
-        for item in producer():
+        for item in event.items:
             assert isinstance(item, FeedItem)
             item.check()
-            if item.id in emitted:
-                logger.warning(f"Duplicate id: {item.id} {item}")
+            if (first := emitted.add(item.id, func)) is not None:
+                if first == func:
+                    logger.warning(f"Duplicate id: {item.id} {item}")
+                else:
+                    logger.warning(
+                        f"Duplicate id: {item.id} from {func}, already emitted by {first}"
+                    )
                 continue
-            emitted.add(item.id)
+            counts[func] += 1
             if echo:
                 print(item)
             if blurred and blurred.should_be_blurred(feed_item=item):
                 item.blur()
                 click.echo(f"Blurred image: {item.id=} {item.title=} {item.image_url=}")
-            yield item
-        took = time.time() - start_time
+            yield func, item
+    if emitted.collisions:
         click.echo(
-            f"{ext}: {click.style(str(len(emitted)), fg=BLUE)} items (took {click.style(round(took, 2), fg=BLUE)} seconds)",
+            f"{click.style(len(emitted.collisions), fg='red')} ids were emitted by more than one source:",
             err=True,
         )
+        for c in emitted.collisions:
+            click.echo(f"{c.id}: {c.first}, {c.second}", err=True)
+
+
+def data(
+    *,
+    allow: List[str],
+    deny: List[str],
+    blurred: Blurred | None,
+    echo: bool = False,
+    concurrency: int = 1,
+) -> Iterator[FeedItem]:
+    for _, item in sourced_data(
+        allow=allow, deny=deny, blurred=blurred, echo=echo, concurrency=concurrency
+    ):
+        yield item
+
+
+def _echo_http_metrics() -> None:
+    # only imported by sources which make requests
+    if (http := sys.modules.get("my_feed.http")) is not None:
+        for line in http.summary():
+            click.echo(line, err=True)
 
 
 # TODO: this could allow either passing the ID or the URL
@@ -138,6 +212,63 @@ def _parse_sources(
     type=click.Path(exists=True, path_type=Path),
     callback=_parse_blur_file,
 )
+@click.option(
+    "-S",
+    "--shards",
+    default=False,
+    is_flag=True,
+    help="Write OUTPUT as a directory, with one file per source and a manifest.json",
+)
+@click.option(
+    "--replace-sources",
+    default=False,
+    is_flag=True,
+    help="With --shards, have the backend replace every item from each included source, instead of only adding new ones",
+)
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(["json", "parquet"]),
+    default="json",
+    show_default=True,
+    help="Write OUTPUT as JSON lines, or as a Parquet file (requires pyarrow)",
+)
+@click.option(
+    "--spill-threshold",
+    type=int,
+    default=200_000,
+    show_default=True,
+    envvar="MY_FEED_SPILL_THRESHOLD",
+    help="Once there are more than this many items, keep them in a temporary file instead of in memory",
+)
+@click.option(
+    "--run-dir",
+    type=click.Path(file_okay=False, writable=True, path_type=Path),
+    default=None,
+    envvar="MY_FEED_RUN_DIR",
+    help="Checkpoint each source to this directory as it completes, so the run can be resumed with --resume",
+)
+@click.option(
+    "--resume",
+    default=False,
+    is_flag=True,
+    help="Continue the run in --run-dir, only running the sources which didn't complete",
+)
+@click.option(
+    "--write-report-to",
+    type=click.Path(writable=True, path_type=Path),
+    default=None,
+    help="Write a JSON report of how each source did (items, time taken, whether it timed out) to this file",
+)
+@click.option(
+    "-j",
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    envvar="MY_FEED_CONCURRENCY",
+    help="Run this many sources at once",
+)
 @click.argument(
     "OUTPUT", type=click.Path(writable=True, path_type=Path), required=False
 )
@@ -149,7 +280,34 @@ def index(
     output: Optional[Path],
     blurred: Optional[Blurred],
     exclude_id_file: Optional[Path],
+    shards: bool,
+    replace_sources: bool,
+    fmt: str,
+    spill_threshold: int,
+    run_dir: Optional[Path],
+    resume: bool,
+    write_report_to: Optional[Path],
+    concurrency: int,
 ) -> None:
+    if resume and run_dir is None:
+        raise click.UsageError("--resume requires --run-dir")
+    if replace_sources and not shards:
+        raise click.UsageError("--replace-sources can only be used with --shards")
+    if fmt == "parquet":
+        if shards:
+            raise click.UsageError("--format parquet can't be used with --shards")
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise click.ClickException(
+                "pyarrow is required for --format parquet, run pip install 'my_feed[parquet]'"
+            )
+    if replace_sources and exclude_id_file is not None:
+        # the shards would be missing the excluded items, which would then be deleted
+        raise click.UsageError(
+            "--replace-sources needs every item, can't be used with --exclude-id-file"
+        )
+
     if blurred:
         click.echo("Blurred matchers:")
         click.echo("\n".join(map(str, blurred.items)))
@@ -158,22 +316,105 @@ def index(
     if exclude_id_file is not None:
         click.echo(f"Reading exclude IDs from '{exclude_id_file}'")
         exclude_ids = set(json.loads(exclude_id_file.read_text()))
-    all_items = list(
-        data(allow=include_sources, deny=exclude_sources, blurred=blurred, echo=echo)
-    )
-    items = [i for i in all_items if i.id not in exclude_ids]
-
-    if exclude_ids:
-        click.echo(f"Excluded {click.style(len(all_items) - len(items), BLUE)} items")
-    click.echo(f"Total: {click.style(len(items), BLUE)} items")
-    if output is not None:
-        click.echo(f"Writing to '{output}'")
-        with output.open("w") as f:
-            for item in items:
-                f.write(item.to_json())
-                f.write("\n")
-        if write_count_to:
-            write_count_to.write_text(str(len(items)))
+    emitted = IdSet()
+    report = RunReport()
+    produced: Iterator[Tuple[str, FeedItem]]
+    if run_dir is None:
+        produced = sourced_data(
+            allow=include_sources,
+            deny=exclude_sources,
+            blurred=blurred,
+            echo=echo,
+            emitted=emitted,
+            on_done=report.add,
+            concurrency=concurrency,
+        )
+    else:
+        key = {
+            "include_sources": include_sources,
+            "exclude_sources": exclude_sources,
+            "blurred": sorted(map(str, blurred.items)) if blurred else [],
+        }
+        try:
+            run = RunDir(run_dir, key=key, resume=resume)
+        except FeedError as e:
+            raise click.ClickException(str(e))
+        if run.completed:
+            click.echo(
+                f"Resuming from '{run_dir}', {len(run.completed)} sources already completed"
+            )
+        for c in run.completed.values():
+            report.add(
+                SourceResult(name=c.name, status="checkpoint", items=c.count, took=0.0)
+            )
+
+        def _done(result: SourceResult) -> None:
+            report.add(result)
+            # a source which timed out is run again on --resume
+            if result.complete:
+                run.complete(result.name, result.items)
+            else:
+                run.abandon(result.name)
+
+        # the completed sources, and then the rest of them as they're checkpointed
+        produced = itertools.chain(
+            run.replay(emitted),
+            run.record(
+                sourced_data(
+                    allow=include_sources,
+                    deny=exclude_sources,
+                    blurred=blurred,
+                    echo=echo,
+                    skip=run.completed.keys(),
+                    emitted=emitted,
+                    on_done=_done,
+                    concurrency=concurrency,
+                )
+            ),
+        )
+    with ItemBuffer(spill_threshold) as items:
+        total = 0
+        for src, item in produced:
+            total += 1
+            if item.id not in exclude_ids:
+                items.append(src, item)
+        _echo_http_metrics()
+        if items.spilled:
+            click.echo(f"Kept items in '{items.path}' while indexing")
+
+        if exclude_ids:
+            click.echo(f"Excluded {click.style(total - len(items), BLUE)} items")
+        click.echo(f"Total: {click.style(len(items), BLUE)} items")
+        if output is not None:
+            click.echo(f"Writing to '{output}'")
+            if shards:
+                with ShardWriter(output, replace=replace_sources) as writer:
+                    for src, item in items:
+                        writer.write(src, item)
+                assert writer.manifest is not None
+                for shard in writer.manifest.sources:
+                    click.echo(f"Wrote {shard.count} items to '{output / shard.file}'")
+            elif fmt == "parquet":
+                from .parquet import ParquetWriter
+
+                with ParquetWriter(output) as pwriter:
+                    for src, item in items:
+                        pwriter.write(src, item)
+            else:
+                with output.open("w") as f:
+                    for src, item in items:
+                        f.write(item.to_json(source=src))
+                        f.write("\n")
+            if write_count_to:
+                write_count_to.write_text(str(len(items)))
+    if not report.complete:
+        timed_out = [s.name for s in report.sources if not s.complete]
+        click.secho(
+            f"Incomplete, timed out: {', '.join(timed_out)}", fg="red", err=True
+        )
+    if write_report_to is not None:
+        click.echo(f"Writing report to '{write_report_to}'")
+        report.write(write_report_to)
 
     # hm: consume the rest of the generator so that cachew db closes...?
     #
@@ -191,5 +432,210 @@ def index(
     #     logger.exception(e)
 
 
+@main.command(name="sources", short_help="list configured sources")
+@click.option(
+    "-i",
+    "--include-sources",
+    default=None,
+    help="A comma delimited list of substrings of sources to include. e.g. 'mpv,trakt,listens'",
+    callback=_parse_sources,
+    envvar="MY_FEED_INCLUDE_SOURCES",
+)
+@click.option(
+    "-e",
+    "--exclude-sources",
+    default=None,
+    envvar="MY_FEED_EXCLUDE_SOURCES",
+    help="A comma delimited list of substrings of sources to exclude. e.g. 'mpv,trakt,listens'",
+    callback=_parse_sources,
+)
+@click.option(
+    "--list",
+    "action",
+    flag_value="list",
+    default=True,
+    help="Print the name of each source, without importing them",
+)
+@click.option(
+    "--check",
+    "action",
+    flag_value="check",
+    help="Import each source, printing how long it took",
+)
+def list_sources(
+    include_sources: List[str], exclude_sources: List[str], action: str
+) -> None:
+    """
+    Lists the sources from my.config.feed which 'my_feed index' would run
+    with the same --include-sources/--exclude-sources
+    """
+    for source in select_sources(allow=include_sources, deny=exclude_sources):
+        if action == "list":
+            click.echo(source.name)
+            continue
+        start_time = time.perf_counter()
+        source.load()
+        took = time.perf_counter() - start_time
+        click.echo(
+            f"{click.style(source.name, fg='green')}: imported in {click.style(round(took, 3), fg=BLUE)} seconds"
+        )
+
+
+_socket_option = click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=default_socket_path,
+    envvar="MY_FEED_SOCKET",
+    show_default="$XDG_RUNTIME_DIR/my_feed-<uid>.sock",
+    help="Unix socket the daemon listens on",
+)
+
+
+@main.command(name="daemon", short_help="re-run sources when their data changes")
+@click.option(
+    "-e",
+    "--exclude-sources",
+    default=None,
+    envvar="MY_FEED_EXCLUDE_SOURCES",
+    help="A comma delimited list of substrings of sources to exclude. e.g. 'mpv,trakt,listens'",
+    callback=_parse_sources,
+)
+@click.option(
+    "-B",
+    "--blur-images-file",
+    "blurred",
+    default=None,
+    help="A file containing a list of image URLs to blur, one per line",
+    type=click.Path(exists=True, path_type=Path),
+    callback=_parse_blur_file,
+)
+@click.option(
+    "--interval",
+    type=float,
+    default=60,
+    show_default=True,
+    help="Seconds between checking watched files for changes",
+)
+@click.option(
+    "--on-update",
+    default=None,
+    help="Command to run after each shard directory is written, with the directory as the last argument",
+)
+@_socket_option
+@click.argument(
+    "OUTPUT_DIR", type=click.Path(file_okay=False, writable=True, path_type=Path)
+)
+def run_daemon(
+    exclude_sources: List[str],
+    blurred: Optional[Blurred],
+    interval: float,
+    on_update: Optional[str],
+    socket_path: Path,
+    output_dir: Path,
+) -> None:
+    """
+    Keeps sources imported and re-runs them when their input files change,
+    or when asked to by 'my_feed trigger'. Each run is written to a new
+    directory in OUTPUT_DIR, as shards which replace that source on the server
+    """
+    # nothing can prompt while running in the background
+    os.environ.setdefault("MY_FEED_BG", "1")
+
+    def produce(
+        allow: List[str], on_done: Callable[[SourceResult], None]
+    ) -> Iterator[Tuple[str, FeedItem]]:
+        return sourced_data(
+            allow=allow, deny=exclude_sources, blurred=blurred, on_done=on_done
+        )
+
+    Daemon(
+        produce,
+        output_dir=output_dir,
+        watch=watched_paths(),
+        on_update=on_update,
+        interval=interval,
+    ).serve(socket_path)
+
+
+@main.command(name="trigger", short_help="run sources in a running daemon")
+@_socket_option
+@click.argument("SOURCES", nargs=-1)
+def trigger(socket_path: Path, sources: Tuple[str, ...]) -> None:
+    """
+    Asks a running 'my_feed daemon' to run SOURCES (substrings of source names),
+    or every source if none are given, and waits for it to finish
+    """
+    result = send_trigger(socket_path, list(sources))
+    for src in result.sources:
+        click.echo(f"Ran {click.style(src, fg='green')}")
+    click.echo(f"Total: {click.style(result.items, BLUE)} items")
+    if result.output is not None:
+        click.echo(f"Wrote to '{result.output}'")
+    if result.error is not None:
+        raise click.ClickException(result.error)
+
+
+@main.command(name="thumbnails", short_help="create thumbnails for osrs screenshots")
+@click.option(
+    "-s",
+    "--size",
+    type=int,
+    default=480,
+    show_default=True,
+    help="Max width/height of thumbnails",
+)
+@click.option(
+    "-f",
+    "--format",
+    "fmt",
+    type=click.Choice(["webp", "jpeg"]),
+    default="webp",
+    show_default=True,
+)
+@click.option("-q", "--quality", type=int, default=80, show_default=True)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of processes to use, defaults to the number of CPUs",
+)
+@click.argument(
+    "IMAGES", nargs=-1, type=click.Path(exists=True, dir_okay=False, path_type=Path)
+)
+def thumbnails(
+    size: int, fmt: str, quality: int, workers: Optional[int], images: Tuple[Path, ...]
+) -> None:
+    """
+    Creates thumbnails for IMAGES, or every OSRS screenshot if none are
+    given, in MY_FEED_THUMBNAIL_DIR. Set RUNELITE_THUMBNAIL_PREFIX to the
+    URL that directory is synced to, and the osrs source links to them
+    """
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise click.ClickException(
+            "Pillow is required to create thumbnails, run pip install 'my_feed[thumbnails]'"
+        )
+    from .thumbnails import generate, thumbnail_dir
+
+    paths: List[Path] = list(images)
+    if not paths:
+        from my.runelite.screenshots import screenshots  # type: ignore[import]
+
+        paths = [sc.path for sc in screenshots()]
+    out_dir = thumbnail_dir()
+    start_time = time.perf_counter()
+    stats = generate(
+        paths, out_dir=out_dir, size=size, fmt=fmt, quality=quality, workers=workers
+    )
+    took = time.perf_counter() - start_time
+    click.echo(
+        f"{stats.created} created, {stats.existing + stats.unchanged} up to date, {stats.failed} failed in '{out_dir}' (took {round(took, 2)} seconds)",
+        err=True,
+    )
+
+
 if __name__ == "__main__":
     main(prog_name="my_feed")
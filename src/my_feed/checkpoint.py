@@ -0,0 +1,128 @@
+"""
+Checkpoints for 'my_feed index --run-dir', so that a run which fails
+partway through can be continued with --resume, instead of starting over
+
+DIR/run.json: the options the run was started with, and which sources have completed
+DIR/<source>.spill: the items from a completed source, in the spill format
+DIR/<source>.partial: items from the sources which are currently running
+
+On --resume, completed sources are read back from their checkpoints
+instead of being run again, and the output is assembled from them. A
+source which was interrupted is run again from the start -- a producer
+can't be restarted from the middle, but the slow parts of the long
+sources (TMDB/GiantBomb requests, parsing mpv history) are saved in their
+own caches, so running it again mostly reads from those
+"""
+
+import os
+import re
+import json
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, NamedTuple, Tuple
+
+from .log import logger
+from .dedupe import IdSet
+from .spill import SpillWriter, read_spill
+from .sources.model import FeedItem
+from .sources.common import FeedError
+
+STATE = "run.json"
+
+
+class Completed(NamedTuple):
+    name: str
+    file: str
+    count: int
+
+
+def checkpoint_filename(source: str) -> str:
+    return re.sub(r"[^\w.-]", "_", source) + ".spill"
+
+
+class RunDir:
+    def __init__(self, directory: Path, *, key: Dict[str, Any], resume: bool) -> None:
+        self.directory = directory
+        self.key = key
+        self.completed: Dict[str, Completed] = {}
+        # the sources which are running, there can be more than one with --concurrency
+        self._running: Dict[str, Tuple[IO[str], SpillWriter]] = {}
+        directory.mkdir(parents=True, exist_ok=True)
+        state_file = directory / STATE
+        if resume:
+            if not state_file.exists():
+                raise FeedError(f"No run to resume in '{directory}'")
+            state = json.loads(state_file.read_text())
+            if state["key"] != key:
+                raise FeedError(
+                    f"The run in '{directory}' was started with different options ({state['key']}), can't resume it"
+                )
+            for c in state["completed"]:
+                completed = Completed(*c)
+                if not (directory / completed.file).exists():
+                    raise FeedError(f"Checkpoint '{completed.file}' is missing")
+                self.completed[completed.name] = completed
+        else:
+            self._clear()
+            self._write_state()
+
+    def _clear(self) -> None:
+        for pattern in (STATE, "*.spill", "*.partial"):
+            for path in self.directory.glob(pattern):
+                path.unlink()
+
+    def _write_state(self) -> None:
+        tmp = self.directory / f"{STATE}.tmp"
+        tmp.write_text(
+            json.dumps({"key": self.key, "completed": list(self.completed.values())})
+        )
+        os.replace(tmp, self.directory / STATE)
+
+    def replay(self, emitted: IdSet) -> Iterator[Tuple[str, FeedItem]]:
+        """
+        Items from the sources which have already completed, adding their
+        IDs to 'emitted' so duplicates in the remaining sources are still caught
+        """
+        for c in self.completed.values():
+            logger.info(f"Using {c.count} items from the checkpoint for {c.name}")
+            with (self.directory / c.file).open() as f:
+                for src, item in read_spill(f):
+                    emitted.add(item.id, src)
+                    yield src, item
+
+    def _writer(self, source: str) -> SpillWriter:
+        if source not in self._running:
+            path = self.directory / checkpoint_filename(source)
+            f = path.with_suffix(".partial").open("w")
+            self._running[source] = (f, SpillWriter(f))
+        return self._running[source][1]
+
+    def record(
+        self, items: Iterable[Tuple[str, FeedItem]]
+    ) -> Iterator[Tuple[str, FeedItem]]:
+        """
+        Writes each item to the checkpoint for its source, as it passes through
+        """
+        for src, item in items:
+            self._writer(src).write(src, item)
+            yield src, item
+
+    def complete(self, source: str, count: int) -> None:
+        # sources which produced nothing still get an (empty) checkpoint
+        self._writer(source)
+        f, _ = self._running.pop(source)
+        f.close()
+        path = self.directory / checkpoint_filename(source)
+        os.replace(path.with_suffix(".partial"), path)
+        self.completed[source] = Completed(name=source, file=path.name, count=count)
+        self._write_state()
+
+    def abandon(self, source: str) -> None:
+        """
+        Drops the partial checkpoint for a source which didn't finish (e.g.
+        it timed out), so that --resume runs it again
+        """
+        if source not in self._running:
+            return
+        f, _ = self._running.pop(source)
+        f.close()
+        (self.directory / checkpoint_filename(source)).with_suffix(".partial").unlink()
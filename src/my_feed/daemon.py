@@ -0,0 +1,298 @@
+"""
+Runs sources in a long-lived process, so HPI modules stay imported and any
+in-memory caches (e.g. the mpv music directory scan) are kept between runs
+
+Sources are re-run when the files they read from change, or when asked to
+over a unix socket (my_feed trigger). Each run writes a replace-mode shard
+directory (see shards.py), which can then be synced to the server with
+the --on-update command. A source which timed out (see watchdog.py) is left
+out of it, since replacing it with a partial run would delete the newer
+items it didn't get to
+
+Which files to watch is configured with a 'watch' dict in my.config.feed,
+mapping substrings of source names to paths, globs, or a function that
+returns paths:
+
+watch = {
+    "trakt": ["~/data/trakt/*.json"],
+    "listens": lambda: my.listenbrainz.export.inputs(),
+}
+"""
+
+from __future__ import annotations
+import os
+import glob
+import json
+import time
+import queue
+import shlex
+import shutil
+import socket
+import threading
+import subprocess
+import socketserver
+from pathlib import Path
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Dict,
+    List,
+    Tuple,
+    Optional,
+    FrozenSet,
+    Union,
+)
+
+from .log import logger
+from .sources.model import FeedItem
+from .sources.common import FeedError
+from .shards import ShardWriter
+from .report import SourceResult
+
+# given a list of source substrings to allow, and a function to call with how
+# each source did once it finishes, yields (source name, item)
+Producer = Callable[
+    [List[str], Callable[[SourceResult], None]], Iterator[Tuple[str, FeedItem]]
+]
+WatchPaths = Union[
+    Callable[[], Iterable[Union[str, Path]]], Iterable[Union[str, Path]]
+]
+Fingerprint = FrozenSet[Tuple[str, int, int]]
+
+
+def default_socket_path() -> Path:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR", "/tmp")
+    return Path(runtime_dir) / f"my_feed-{os.getuid()}.sock"
+
+
+def _mpv_inputs() -> Iterable[Path]:
+    from my.mpv.history_daemon import inputs  # type: ignore[import]
+
+    return inputs()
+
+
+def watched_paths() -> Dict[str, WatchPaths]:
+    watch: Dict[str, WatchPaths] = {"mpv": _mpv_inputs}
+    try:
+        from my.config.feed import watch as configured  # type: ignore[import]
+
+        watch.update(configured)
+    except ImportError:
+        logger.debug("No 'watch' in my.config.feed, only watching mpv files")
+    return watch
+
+
+def _expand(paths: WatchPaths) -> Iterator[str]:
+    for p in paths() if callable(paths) else paths:
+        # strings may be globs, and are re-expanded every time so new files are noticed
+        if isinstance(p, str):
+            yield from glob.iglob(os.path.expanduser(p))
+        else:
+            yield str(p)
+
+
+def fingerprint(paths: WatchPaths) -> Fingerprint:
+    prints = set()
+    for p in _expand(paths):
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        prints.add((p, st.st_mtime_ns, st.st_size))
+    return frozenset(prints)
+
+
+class RunResult(NamedTuple):
+    sources: List[str]
+    items: int
+    output: Optional[Path]
+    error: Optional[str] = None
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "sources": self.sources,
+                "items": self.items,
+                "output": str(self.output) if self.output is not None else None,
+                "error": self.error,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, data: str | bytes) -> RunResult:
+        d = json.loads(data)
+        return cls(
+            sources=d["sources"],
+            items=d["items"],
+            output=Path(d["output"]) if d["output"] is not None else None,
+            error=d["error"],
+        )
+
+
+Request = Tuple[List[str], "queue.Queue[RunResult]"]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: _Server
+
+    def handle(self) -> None:
+        try:
+            allow = [str(s) for s in json.loads(self.rfile.readline())["sources"]]
+        except (ValueError, KeyError, TypeError) as e:
+            result = RunResult([], 0, None, f"Invalid request: {e}")
+        else:
+            reply: queue.Queue[RunResult] = queue.Queue(maxsize=1)
+            self.server.requests.put((allow, reply))
+            result = reply.get()
+        self.wfile.write(result.to_json().encode() + b"\n")
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, requests: queue.Queue[Request]) -> None:
+        self.requests = requests
+        super().__init__(str(path), _Handler)
+
+
+def _remove_stale_socket(path: Path) -> None:
+    if not path.exists():
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(path))
+        except OSError:
+            # nothing listening, left behind by a daemon that was killed
+            path.unlink()
+            return
+    raise FeedError(f"A daemon is already listening on {path}")
+
+
+class Daemon:
+    def __init__(
+        self,
+        produce: Producer,
+        *,
+        output_dir: Path,
+        watch: Dict[str, WatchPaths],
+        on_update: Optional[str] = None,
+        interval: float = 60,
+    ) -> None:
+        self.produce = produce
+        self.output_dir = output_dir
+        self.watch = dict(watch)
+        self.on_update = on_update
+        self.interval = interval
+        self.fingerprints: Dict[str, Fingerprint] = {}
+        self.requests: queue.Queue[Request] = queue.Queue()
+
+    def changed(self) -> List[str]:
+        """
+        Returns the watch keys whose files changed since the last call
+        The first call only records the current state
+        """
+        changed = []
+        for key in list(self.watch):
+            try:
+                fp = fingerprint(self.watch[key])
+            except Exception as e:
+                logger.warning(f"Could not list files for '{key}', ignoring", exc_info=e)
+                del self.watch[key]
+                continue
+            if key in self.fingerprints and self.fingerprints[key] != fp:
+                changed.append(key)
+            self.fingerprints[key] = fp
+        return changed
+
+    def run(self, allow: List[str]) -> RunResult:
+        """
+        Runs any sources matching allow (or every source, if empty), writing them to a new shard directory
+        """
+        # nanoseconds so that names sort by time and don't collide
+        shard_dir = self.output_dir / str(time.time_ns())
+        counts: Dict[str, int] = {}
+        try:
+            with ShardWriter(shard_dir, replace=True) as writer:
+
+                def _done(result: SourceResult) -> None:
+                    if not result.complete:
+                        logger.warning(
+                            f"{result.name} timed out, leaving it out of {shard_dir}"
+                        )
+                        writer.discard(result.name)
+                        counts.pop(result.name, None)
+
+                for src, item in self.produce(allow, _done):
+                    writer.write(src, item)
+                    counts[src] = counts.get(src, 0) + 1
+        except Exception as e:
+            # a partial shard would delete the items it's missing from the database
+            logger.exception(f"Error running {allow or 'all sources'}", exc_info=e)
+            shutil.rmtree(shard_dir, ignore_errors=True)
+            return RunResult([], 0, None, f"{type(e).__name__}: {e}")
+
+        items = sum(counts.values())
+        assert writer.manifest is not None
+        sources = [s.name for s in writer.manifest.sources]
+        if items == 0:
+            shutil.rmtree(shard_dir)
+            return RunResult(sources, 0, None)
+
+        if self.on_update is not None:
+            cmd = [*shlex.split(self.on_update), str(shard_dir)]
+            logger.info(f"Running {cmd}")
+            proc = subprocess.run(cmd)
+            if proc.returncode != 0:
+                return RunResult(
+                    sources,
+                    items,
+                    shard_dir,
+                    f"--on-update exited with code {proc.returncode}",
+                )
+        return RunResult(sources, items, shard_dir)
+
+    def serve(self, socket_path: Path) -> None:
+        """
+        Runs until interrupted. Sources are only ever run on this thread, one run at a time
+        """
+        _remove_stale_socket(socket_path)
+        server = _Server(socket_path, self.requests)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info(f"Listening on {socket_path}, watching {list(self.watch)}")
+
+        self.changed()
+        next_poll = time.monotonic() + self.interval
+        try:
+            while True:
+                try:
+                    allow, reply = self.requests.get(
+                        timeout=max(0.0, next_poll - time.monotonic())
+                    )
+                except queue.Empty:
+                    next_poll = time.monotonic() + self.interval
+                    if changed := self.changed():
+                        logger.info(f"Files changed for {changed}")
+                        logger.info(self.run(changed).to_json())
+                    continue
+                logger.info(f"Triggered {allow or 'all sources'}")
+                reply.put(self.run(allow))
+        finally:
+            server.shutdown()
+            server.server_close()
+            socket_path.unlink(missing_ok=True)
+
+
+def send_trigger(socket_path: Path, sources: List[str]) -> RunResult:
+    """
+    Asks a running daemon to run sources, waiting for it to finish
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps({"sources": sources}).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise FeedError(f"No response from daemon at {socket_path}")
+    return RunResult.from_json(line)
@@ -0,0 +1,107 @@
+"""
+Keeps track of every ID emitted during a run, across all sources, so
+that the same ID coming from two different sources is noticed here
+instead of being silently dropped by the backend
+
+Instead of keeping the ID strings around, this stores a 64-bit blake2b
+hash of each ID in an open addressing hash table (an array of hashes, and
+an array of which source added it), which is about 10 bytes per slot.
+Two IDs with the same hash are treated as the same ID -- confirming that
+would mean keeping every ID around, which is what this avoids. With 64-bit
+hashes, the chance of two different IDs colliding in a feed with a few
+million items is around one in a million
+"""
+
+from array import array
+from hashlib import blake2b
+from typing import Dict, List, NamedTuple, Optional
+
+# grow once the table is this full
+MAX_LOAD = 0.6
+
+
+def id_hash(id_: str) -> int:
+    h = int.from_bytes(blake2b(id_.encode(), digest_size=8).digest(), "little")
+    # 0 marks an empty slot
+    return h or 1
+
+
+class Collision(NamedTuple):
+    id: str
+    first: str
+    second: str
+
+
+class IdSet:
+    def __init__(self, capacity: int = 1 << 16) -> None:
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self._hashes = array("Q", bytes(8 * size))
+        self._sources = array("H", bytes(2 * size))
+        self._names: List[str] = []
+        self._name_index: Dict[str, int] = {}
+        self._len = 0
+        self.collisions: List[Collision] = []
+
+    def __len__(self) -> int:
+        return self._len
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the hash table, which is everything that grows with the number of IDs
+        """
+        return (
+            self._hashes.itemsize * len(self._hashes)
+            + self._sources.itemsize * len(self._sources)
+        )
+
+    def _source_index(self, source: str) -> int:
+        if (i := self._name_index.get(source)) is None:
+            i = len(self._names)
+            self._names.append(source)
+            self._name_index[source] = i
+        return i
+
+    def _slot(self, h: int) -> int:
+        """
+        Index of the slot this hash is in, or the empty slot it should go in
+        """
+        mask = len(self._hashes) - 1
+        i = h & mask
+        # linear probing, the table is never full
+        while self._hashes[i] != 0 and self._hashes[i] != h:
+            i = (i + 1) & mask
+        return i
+
+    def _grow(self) -> None:
+        hashes, sources = self._hashes, self._sources
+        size = len(hashes) * 2
+        self._hashes = array("Q", bytes(8 * size))
+        self._sources = array("H", bytes(2 * size))
+        for h, s in zip(hashes, sources):
+            if h != 0:
+                i = self._slot(h)
+                self._hashes[i] = h
+                self._sources[i] = s
+
+    def add(self, id_: str, source: str) -> Optional[str]:
+        """
+        Adds the ID, returning the name of the source that already
+        emitted it (if any). Collisions between two different sources
+        are also saved to self.collisions
+        """
+        h = id_hash(id_)
+        i = self._slot(h)
+        if self._hashes[i] == h:
+            first = self._names[self._sources[i]]
+            if first != source:
+                self.collisions.append(Collision(id_, first, source))
+            return first
+        self._hashes[i] = h
+        self._sources[i] = self._source_index(source)
+        self._len += 1
+        if self._len > MAX_LOAD * len(self._hashes):
+            self._grow()
+        return None
@@ -0,0 +1,275 @@
+"""
+Shared HTTP clients for the APIs sources request metadata from
+
+Each API gets one pooled requests.Session (so connections are kept alive
+between requests), a token bucket to stay under its rate limit, and retries
+with exponential backoff on 429/5xx responses (or Retry-After, if the API
+sends one). Every attempt, including retries, waits for the token bucket and
+counts towards the hourly quota. Once the quota is used up, requests raise
+QuotaExceeded instead of being sent, and failed ones aren't retried. Counts,
+latency and bytes received are tracked per API, and printed at the end of
+'my_feed index'
+"""
+
+import json
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .log import logger
+from .sources.common import cache_dir
+
+
+class Limit(NamedTuple):
+    rate: float  # requests per second
+    burst: int  # requests which can be made at once, before waiting
+    # requests allowed in any hour, tracked across runs
+    per_hour: Optional[int] = None
+
+
+LIMITS: Dict[str, Limit] = {
+    # https://developer.themoviedb.org/docs/rate-limiting
+    "tmdb": Limit(rate=10, burst=10),
+    # https://www.giantbomb.com/api/ -- 200 requests per resource per hour,
+    # and has velocity detection, so space requests out
+    "giantbomb": Limit(rate=1 / 5, burst=1, per_hour=200),
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# give up instead of waiting, if an API asks to retry after longer than this
+MAX_RETRY_AFTER = 120.0
+
+
+class QuotaExceeded(requests.RequestException):
+    """
+    Raised instead of making a request once the hourly quota is used up
+    """
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Blocks until a request can be made, returns how long that took
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            # goes negative if other threads are already waiting, which reserves
+            # the next token for this request
+            self._tokens -= 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HourlyQuota:
+    """
+    Remembers when requests were made in the last hour, in a JSON file,
+    so that the quota carries over between runs
+    """
+
+    def __init__(self, path: Path, per_hour: int) -> None:
+        self.path = path
+        self.per_hour = per_hour
+        self._lock = threading.Lock()
+        self._times: List[float] = []
+        if self.path.exists():
+            try:
+                self._times = json.loads(self.path.read_text())
+            except ValueError:
+                logger.warning(f"Could not parse {self.path}, resetting quota")
+
+    def _prune(self) -> None:
+        hour_ago = time.time() - 3600
+        self._times = [t for t in self._times if t > hour_ago]
+
+    def remaining(self) -> int:
+        with self._lock:
+            self._prune()
+            return max(0, self.per_hour - len(self._times))
+
+    def record(self) -> None:
+        with self._lock:
+            self._prune()
+            self._times.append(time.time())
+            self.path.write_text(json.dumps(self._times))
+
+    def take(self) -> bool:
+        """
+        Records a request if there's any quota left, returning whether there was
+        """
+        with self._lock:
+            self._prune()
+            if len(self._times) >= self.per_hour:
+                return False
+            self._times.append(time.time())
+            self.path.write_text(json.dumps(self._times))
+            return True
+
+
+@dataclass
+class Metrics:
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    bytes: int = 0
+    latency: float = 0.0
+    waited: float = 0.0
+    statuses: Dict[int, int] = field(default_factory=dict)
+
+    def summary(self, name: str) -> str:
+        avg = self.latency / self.requests if self.requests else 0.0
+        statuses = ", ".join(f"{k}: {v}" for k, v in sorted(self.statuses.items()))
+        return f"{name}: {self.requests} requests ({statuses}), {self.errors} errors, {self.retries} retries, {self.bytes / 1024:.1f}KB, {avg:.2f}s avg latency, {self.waited:.1f}s rate limited"
+
+
+def retry_after(resp: requests.Response) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After header, which is either a number of seconds or a date
+    """
+    value = resp.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class APIClient:
+    def __init__(
+        self,
+        name: str,
+        *,
+        limit: Limit,
+        retries: int = 3,
+        backoff: float = 1.0,
+        timeout: float = 30,
+        max_retry_after: float = MAX_RETRY_AFTER,
+    ) -> None:
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self.limiter = TokenBucket(limit.rate, limit.burst)
+        self.quota: Optional[HourlyQuota] = None
+        if limit.per_hour is not None:
+            self.quota = HourlyQuota(cache_dir("http") / f"{name}.json", limit.per_hour)
+        self.metrics = Metrics()
+        self._lock = threading.Lock()
+
+        # retries are done in get, so each one goes through the limiter
+        adapter = HTTPAdapter(max_retries=0, pool_maxsize=10)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _attempt(self, url: str, **kwargs: Any) -> requests.Response:
+        waited = self.limiter.acquire()
+        if self.quota is not None and not self.quota.take():
+            raise QuotaExceeded(
+                f"{self.name}: used all {self.quota.per_hour} requests for this hour"
+            )
+        start = time.perf_counter()
+        try:
+            resp = self.session.get(url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.metrics.requests += 1
+                self.metrics.errors += 1
+                self.metrics.waited += waited
+                self.metrics.latency += time.perf_counter() - start
+            raise
+        took = time.perf_counter() - start
+        with self._lock:
+            m = self.metrics
+            m.requests += 1
+            m.bytes += len(resp.content)
+            m.latency += took
+            m.waited += waited
+            m.statuses[resp.status_code] = m.statuses.get(resp.status_code, 0) + 1
+        logger.debug(f"{self.name}: {resp.status_code} {url} ({took:.2f}s)")
+        return resp
+
+    def _quota_used_up(self) -> bool:
+        return self.quota is not None and self.quota.remaining() == 0
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        """
+        Retries connection errors and 429/5xx responses. If every attempt
+        failed (or it stopped retrying, because the hourly quota is used up
+        or the API asked to wait too long), the last response is returned,
+        so callers can decide what to do with it
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            delay = self.backoff * (2**attempt)
+            try:
+                resp = self._attempt(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries or self._quota_used_up():
+                    raise
+            else:
+                if resp.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return resp
+                if (wait := retry_after(resp)) is not None:
+                    if wait > self.max_retry_after:
+                        logger.warning(
+                            f"{self.name}: asked to retry {url} in {wait:.0f}s, giving up"
+                        )
+                        return resp
+                    delay = wait
+                if self._quota_used_up():
+                    logger.warning(
+                        f"{self.name}: hourly quota used up, not retrying {url}"
+                    )
+                    return resp
+            attempt += 1
+            with self._lock:
+                self.metrics.retries += 1
+            logger.debug(f"{self.name}: retrying {url} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+_clients: Dict[str, APIClient] = {}
+_clients_lock = threading.Lock()
+
+
+def client(name: str) -> APIClient:
+    """
+    Returns the shared client for an API in LIMITS
+    """
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = APIClient(name, limit=LIMITS[name])
+        return _clients[name]
+
+
+def summary() -> List[str]:
+    return [
+        c.metrics.summary(name) for name, c in _clients.items() if c.metrics.requests
+    ]
@@ -0,0 +1,206 @@
+"""
+Runs sources, optionally several at once ('my_feed index --concurrency N')
+
+A source can be an async generator function, as well as a regular one:
+
+async def history() -> AsyncIterator[FeedItem]:
+    async with session.get(...) as resp:
+        for entry in await resp.json():
+            yield FeedItem(...)
+
+With --concurrency, every source runs on one event loop in a background
+thread, at most N at a time. Async sources run on the loop itself, and
+regular ones each run in a thread from a pool, so that anything which
+isn't thread safe (e.g. a cachew/sqlite connection) stays in one thread.
+Items are passed back in batches through a bounded queue, so a fast source
+waits for its items to be used instead of piling them up in memory
+
+Without it, sources run one after another in the calling thread, like
+they always have -- an async source gets an event loop of its own
+"""
+
+import queue
+import asyncio
+import inspect
+import threading
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Tuple, Union
+
+from .registry import Producer
+from .sources.model import FeedItem
+
+# loads a source, returning its producer
+Loader = Callable[[], Producer]
+
+BATCH_SIZE = 500
+
+
+class Started(NamedTuple):
+    name: str
+
+
+class Items(NamedTuple):
+    name: str
+    items: Iterable[FeedItem]
+
+
+class Finished(NamedTuple):
+    name: str
+
+
+Event = Union[Started, Items, Finished]
+
+
+def iterate(producer: Producer) -> Iterator[FeedItem]:
+    """
+    The items from a producer, running an async one on its own event loop
+    """
+    items = producer()
+    if not isinstance(items, AsyncIterator):
+        yield from items
+        return
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(items.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        if (aclose := getattr(items, "aclose", None)) is not None:
+            loop.run_until_complete(aclose())
+        loop.close()
+
+
+def sequential(sources: List[Tuple[str, Loader]]) -> Iterator[Event]:
+    for name, load in sources:
+        producer = load()
+        yield Started(name)
+        yield Items(name, iterate(producer))
+        yield Finished(name)
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _End:
+    pass
+
+
+class Merged:
+    """
+    Runs up to 'concurrency' sources at once, yielding the events from all of them
+    """
+
+    def __init__(self, sources: List[Tuple[str, Loader]], concurrency: int) -> None:
+        self.sources = sources
+        self.concurrency = concurrency
+        self._queue: queue.Queue[Union[Event, BaseException, _End]] = queue.Queue(
+            maxsize=max(concurrency * 4, 16)
+        )
+        self._cancelled = threading.Event()
+
+    def _put(self, msg: Union[Event, BaseException, _End]) -> None:
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(msg, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _Cancelled()
+
+    async def _aput(self, msg: Union[Event, BaseException]) -> None:
+        try:
+            self._queue.put_nowait(msg)
+        except queue.Full:
+            # wait for the items to be used, without blocking the other sources
+            await asyncio.to_thread(self._put, msg)
+
+    def _run_sync(self, name: str, producer: Producer) -> None:
+        # all in one thread, producers aren't always safe to move between them
+        self._put(Started(name))
+        batch: List[FeedItem] = []
+        for item in iterate(producer):
+            batch.append(item)
+            if len(batch) >= BATCH_SIZE:
+                self._put(Items(name, batch))
+                batch = []
+        if batch:
+            self._put(Items(name, batch))
+        self._put(Finished(name))
+
+    async def _run_async(self, name: str, producer: Producer) -> None:
+        items = producer()
+        assert isinstance(items, AsyncIterator)
+        await self._aput(Started(name))
+        batch: List[FeedItem] = []
+        async for item in items:
+            batch.append(item)
+            if len(batch) >= BATCH_SIZE:
+                await self._aput(Items(name, batch))
+                batch = []
+        if batch:
+            await self._aput(Items(name, batch))
+        await self._aput(Finished(name))
+
+    async def _source(
+        self,
+        name: str,
+        load: Loader,
+        limit: asyncio.Semaphore,
+        pool: ThreadPoolExecutor,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        async with limit:
+            try:
+                producer = await loop.run_in_executor(pool, load)
+                if inspect.isasyncgenfunction(producer):
+                    await self._run_async(name, producer)
+                else:
+                    await loop.run_in_executor(pool, self._run_sync, name, producer)
+            except _Cancelled:
+                pass
+            except BaseException as e:
+                # raised from the consumer, which stops the other sources
+                try:
+                    self._put(e)
+                except _Cancelled:
+                    pass
+
+    async def _main(self) -> None:
+        limit = asyncio.Semaphore(self.concurrency)
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="my_feed"
+        ) as pool:
+            await asyncio.gather(
+                *(self._source(name, load, limit, pool) for name, load in self.sources)
+            )
+        try:
+            self._put(_End())
+        except _Cancelled:
+            pass
+
+    def __iter__(self) -> Iterator[Event]:
+        thread = threading.Thread(
+            target=asyncio.run, args=(self._main(),), name="my_feed-merge", daemon=True
+        )
+        thread.start()
+        try:
+            while True:
+                msg = self._queue.get()
+                if isinstance(msg, _End):
+                    return
+                if isinstance(msg, BaseException):
+                    raise msg
+                yield msg
+        finally:
+            # if a source failed, or the items stopped being used
+            self._cancelled.set()
+
+
+def events(sources: List[Tuple[str, Loader]], concurrency: int) -> Iterator[Event]:
+    if concurrency <= 1:
+        return sequential(sources)
+    return iter(Merged(sources, concurrency))
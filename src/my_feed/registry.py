@@ -0,0 +1,112 @@
+"""
+Sources can be listed in my.config.feed as dotted paths to the function
+(e.g. 'my_feed.sources.mpv.history') instead of the function itself. Those
+are only imported once the include/exclude filters have been applied, so
+'my_feed index -i mpv' doesn't import every other source's dependencies:
+
+def sources():
+    yield "my_feed.sources.games.steam"
+    yield "my_feed.sources.mpv.history"
+    # functions still work, but are imported by the config
+    from my_feed.sources import trakt
+    yield trakt.history
+"""
+
+import importlib
+from typing import AsyncIterator, Iterator, Callable, Optional, List, Any, Union
+
+import click
+
+from .sources.model import FeedItem
+from .sources.common import FeedError
+
+# a function, or an async generator function, see merge.py
+Producer = Callable[[], Union[Iterator[FeedItem], AsyncIterator[FeedItem]]]
+
+
+# every source in this repo, e.g. for 'yield from SOURCES' in my.config.feed
+SOURCES: List[str] = [
+    "my_feed.sources.games.steam",
+    "my_feed.sources.games.osrs",
+    "my_feed.sources.games.game_center",
+    "my_feed.sources.games.grouvee",
+    "my_feed.sources.games.chess",
+    "my_feed.sources.trakt.history",
+    "my_feed.sources.listens.history",
+    "my_feed.sources.nextalbums.history",
+    "my_feed.sources.mal.history",
+    "my_feed.sources.mal.deleted_history",
+    "my_feed.sources.mpv.history",
+    "my_feed.sources.facebook_spotify_listens.history",
+    "my_feed.sources.offline_listens.history",
+]
+
+
+def source_name(producer: Producer) -> str:
+    return f"{producer.__module__}.{producer.__qualname__}"
+
+
+class Source:
+    def __init__(self, name: str, producer: Optional[Producer] = None) -> None:
+        self.name = name
+        self._producer = producer
+
+    @property
+    def loaded(self) -> bool:
+        return self._producer is not None
+
+    def load(self) -> Producer:
+        """
+        Imports the module this source is defined in, if it hasn't been already
+        """
+        if self._producer is None:
+            module, _, attr = self.name.rpartition(".")
+            try:
+                producer = getattr(importlib.import_module(module), attr)
+            except (ImportError, AttributeError) as e:
+                raise FeedError(f"Could not load source '{self.name}'") from e
+            if not callable(producer):
+                raise FeedError(f"Source '{self.name}' is not callable")
+            self._producer = producer
+        return self._producer
+
+    def matches(self, *, allow: List[str], deny: List[str]) -> bool:
+        if len(allow) > 0 and not any(substr in self.name for substr in allow):
+            return False
+        if len(deny) > 0 and any(substr in self.name for substr in deny):
+            return False
+        return True
+
+    def __repr__(self) -> str:
+        return f"Source({self.name!r}, loaded={self.loaded})"
+
+
+def _to_source(source: Any) -> Optional[Source]:
+    if isinstance(source, str):
+        return Source(source)
+    if callable(source):
+        return Source(source_name(source), source)
+    click.echo(f"{source} is not callable, ignoring source", err=True)
+    return None
+
+
+def configured_sources() -> Iterator[Source]:
+    try:
+        from my.config.feed import sources  # type: ignore[import]
+    except Exception:
+        click.echo(
+            "Could not import sources from my.config.feed, see docs or https://github.com/seanbreckenridge/dotfiles/blob/master/.config/my/my/config/feed.py as an example",
+            err=True,
+        )
+        return
+
+    assert callable(sources), "sources imported from my.config.feed is not a function"
+    for src in iter(sources()):
+        if (source := _to_source(src)) is not None:
+            yield source
+
+
+def select_sources(*, allow: List[str], deny: List[str]) -> Iterator[Source]:
+    for source in configured_sources():
+        if source.matches(allow=allow, deny=deny):
+            yield source
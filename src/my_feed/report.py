@@ -0,0 +1,63 @@
+"""
+A summary of how each source did during 'my_feed index', written with
+--write-report-to:
+
+{
+  "started": 1700000000,
+  "took": 95.1,
+  "complete": false,
+  "sources": [
+    {"name": "my_feed.sources.trakt.history", "status": "timed_out", "items": 15327, "took": 120.0, "timeout": 120.0, "from_snapshot": 40},
+    {"name": "my_feed.sources.mpv.history", "status": "complete", "items": 13807, "took": 13.7, "timeout": null, "from_snapshot": 0}
+  ]
+}
+
+'status' is 'complete', 'timed_out' (see watchdog.py), or 'checkpoint' for
+sources read back from --run-dir
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+
+class SourceResult(NamedTuple):
+    name: str
+    status: str
+    items: int
+    took: float
+    timeout: Optional[float] = None
+    # items filled in from the source's last snapshot, after it timed out
+    from_snapshot: int = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.status != "timed_out"
+
+
+class RunReport:
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.sources: List[SourceResult] = []
+
+    def add(self, result: SourceResult) -> None:
+        self.sources.append(result)
+
+    @property
+    def complete(self) -> bool:
+        return all(s.complete for s in self.sources)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "started": int(self.started),
+                "took": round(time.time() - self.started, 2),
+                "complete": self.complete,
+                "sources": [s._asdict() for s in self.sources],
+            },
+            indent=2,
+        )
+
+    def write(self, path: Path) -> None:
+        path.write_text(self.to_json())
@@ -0,0 +1,127 @@
+"""
+Writes the feed as a directory with one JSON file ('shard') per source, and
+a manifest.json describing each shard:
+
+{
+  "created": 1700000000,
+  "replace": false,
+  "sources": [
+    {"name": "my_feed.sources.mal.history", "file": "my_feed.sources.mal.history.json", "count": 20865, "sha256": "..."}
+  ]
+}
+
+If 'replace' is true, the backend deletes every item it has from each source
+in the manifest before adding the items in its shard, so a single source can be
+re-indexed without touching the rest of the database. Sources which produced no
+items aren't included, so their items are left alone
+"""
+
+from __future__ import annotations
+import re
+import json
+import time
+import hashlib
+from pathlib import Path
+from types import TracebackType
+from typing import NamedTuple, List, Dict, Optional, Type, IO
+
+from .sources.model import FeedItem
+
+MANIFEST = "manifest.json"
+
+
+class Shard(NamedTuple):
+    name: str
+    file: str
+    count: int
+    sha256: str
+
+
+class Manifest(NamedTuple):
+    created: int
+    replace: bool
+    sources: List[Shard]
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "created": self.created,
+                "replace": self.replace,
+                "sources": [s._asdict() for s in self.sources],
+            },
+            indent=2,
+        )
+
+
+def shard_filename(source: str) -> str:
+    return re.sub(r"[^\w.-]", "_", source) + ".json"
+
+
+class _OpenShard:
+    def __init__(self, path: Path) -> None:
+        self.fp: IO[bytes] = path.open("wb")
+        self.hash = hashlib.sha256()
+        self.count = 0
+
+    def write(self, item: FeedItem) -> None:
+        line = item.to_json().encode() + b"\n"
+        self.fp.write(line)
+        self.hash.update(line)
+        self.count += 1
+
+
+class ShardWriter:
+    def __init__(self, directory: Path, *, replace: bool) -> None:
+        self.directory = directory
+        self.replace = replace
+        self._open: Dict[str, _OpenShard] = {}
+        self.manifest: Optional[Manifest] = None
+
+    def __enter__(self) -> ShardWriter:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def write(self, source: str, item: FeedItem) -> None:
+        if source not in self._open:
+            self._open[source] = _OpenShard(self.directory / shard_filename(source))
+        self._open[source].write(item)
+
+    def discard(self, source: str) -> None:
+        """
+        Removes the shard for this source, so it's left out of the manifest
+        """
+        if (sh := self._open.pop(source, None)) is not None:
+            sh.fp.close()
+            (self.directory / shard_filename(source)).unlink()
+
+    def close(self) -> Manifest:
+        shards: List[Shard] = []
+        for source, sh in self._open.items():
+            sh.fp.close()
+            shards.append(
+                Shard(
+                    name=source,
+                    file=shard_filename(source),
+                    count=sh.count,
+                    sha256=sh.hash.hexdigest(),
+                )
+            )
+        self._open.clear()
+        self.manifest = Manifest(
+            created=int(time.time()), replace=self.replace, sources=shards
+        )
+        # written last, so the backend never sees a manifest for incomplete shards
+        (self.directory / MANIFEST).write_text(self.manifest.to_json())
+        return self.manifest
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        if exc_type is not None:
+            for sh in self._open.values():
+                sh.fp.close()
+            return
+        self.close()
@@ -1,5 +1,6 @@
 import os
 
+from pathlib import Path
 from typing import Any
 
 
@@ -21,3 +22,14 @@ def click() -> Any:
     if "MY_FEED_BG" in os.environ:
         raise FeedBackgroundError("Running in the background, can't prompt")
     return click_module
+
+
+def cache_dir(name: str) -> Path:
+    """
+    Directory for a source to keep its own cached data in
+    """
+    default_local = os.path.expanduser("~/.local/share")
+    base = os.environ.get("MY_FEED_CACHE_DIR", os.path.join(default_local, "my_feed"))
+    path = Path(base) / name
+    path.mkdir(parents=True, exist_ok=True)
+    return path
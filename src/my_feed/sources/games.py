@@ -1,15 +1,17 @@
 import os
 import string
 import warnings
-from typing import Iterator, Optional, Dict, Any, cast, Literal
+from typing import Iterator, Iterable, Optional, Dict, Any, cast, Literal
 from datetime import datetime, date
 from functools import cache
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from url_cache.core import URLCache, Summary
 
 from .model import FeedItem
 from ..log import logger
+from ..http import client
 
 
 def game_center() -> Iterator[FeedItem]:
@@ -55,12 +57,22 @@ class GiantBombCache(URLCache):
     def request_data(self, url: str) -> Summary:  # type: ignore[override]
         uurl = self.preprocess_url(url)
         logger.info(f"Caching info for grouvee: {url}")
-        self.sleep()
-        r = requests.get(
+        # rate limited by the client, instead of sleeping before every request
+        r = client("giantbomb").get(
             uurl,
             params={"api_key": os.environ["GIANTBOMB_API_KEY"], "format": "json"},
             headers={"User-Agent": f"{os.environ['USER']}_my_feed"},
         )
+        # cached like any other response, so a game which doesn't exist
+        # isn't requested again every run
+        if r.status_code == 404:
+            logger.warning(f"giantbomb: no game at {url}")
+            return Summary(
+                url=uurl,
+                data={},
+                metadata={"error": "Object Not Found", "results": {}},
+                timestamp=datetime.now(),
+            )
         r.raise_for_status()
         return Summary(url=uurl, data={}, metadata=r.json(), timestamp=datetime.now())
 
@@ -71,11 +83,21 @@ def gb_cache() -> GiantBombCache:
     cache_dir = os.path.join(default_local, "giantbomb_cache")
     if "GIANTBOMB_CACHE_DIR" in os.environ:
         cache_dir = os.environ["GIANTBOMB_CACHE_DIR"]
-    return GiantBombCache(cache_dir=cache_dir, sleep_time=5)
+    return GiantBombCache(cache_dir=cache_dir)
+
+
+# can be pointed at a local server, e.g. tests/fixtures/api_stub.py
+GIANTBOMB_BASE_URL = os.environ.get(
+    "GIANTBOMB_BASE_URL", "http://www.giantbomb.com/api"
+).rstrip("/")
+
+
+def _giantbomb_url(giantbomb_id: int) -> str:
+    return f"{GIANTBOMB_BASE_URL}/game/{giantbomb_id}/"
 
 
 def fetch_giantbomb_data(giantbomb_id: int) -> Optional[Summary]:
-    url = f"http://www.giantbomb.com/api/game/{giantbomb_id}/"
+    url = _giantbomb_url(giantbomb_id)
     try:
         return gb_cache().get(url)
     except requests.RequestException as r:
@@ -83,6 +105,39 @@ def fetch_giantbomb_data(giantbomb_id: int) -> Optional[Summary]:
         return None
 
 
+# max number of games to request per run, so an index doesn't wait on
+# hundreds of requests -- anything left over is requested next time.
+# 0 only limits it to what's left of the hourly quota (e.g. for a reindex)
+GIANTBOMB_PREFETCH_LIMIT = int(os.environ.get("GIANTBOMB_PREFETCH_LIMIT", 12))
+
+
+def prefetch_giantbomb(giantbomb_ids: Iterable[int]) -> None:
+    """
+    Requests any games which aren't cached yet, up to what's left of the
+    hourly quota. The client spaces requests out, the threads just
+    let requests overlap with waiting for the next one
+    """
+    gb = gb_cache()
+    misses = [
+        gid
+        for gid in dict.fromkeys(giantbomb_ids)
+        if not gb.in_cache(_giantbomb_url(gid))
+    ]
+    if len(misses) == 0:
+        return
+    quota = client("giantbomb").quota
+    assert quota is not None
+    limit = quota.remaining()
+    if GIANTBOMB_PREFETCH_LIMIT > 0:
+        limit = min(limit, GIANTBOMB_PREFETCH_LIMIT)
+    fetch = misses[:limit]
+    logger.info(
+        f"giantbomb: {len(misses)} games not cached, requesting {len(fetch)} ({quota.remaining()} left in hourly quota)"
+    )
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(fetch_giantbomb_data, fetch))
+
+
 def _grouvee_img(res: dict[str, Any]) -> Optional[str]:
     """traverse API resp and grab the thumbnail/medium image"""
     if img := res.get("image"):
@@ -96,18 +151,31 @@ def _grouvee_img(res: dict[str, Any]) -> Optional[str]:
 def grouvee() -> Iterator[FeedItem]:
     from my.grouvee.export import played
 
-    for g in played():
+    games = list(played())
+    for g in games:
         assert g.giantbomb_id is not None
-        gb_data: Optional[Summary] = fetch_giantbomb_data(g.giantbomb_id)
-        assert gb_data is not None, f"No summary returned for {g.giantbomb_id}"
-
-        # handle error
-        res: dict[str, Any]
-        if gb_data.metadata["error"] == "OK":
-            res = gb_data.metadata["results"]
-            assert isinstance(res, dict), str(gb_data.metadata)
+    prefetch_giantbomb(g.giantbomb_id for g in games)
+
+    gb = gb_cache()
+    # incremental runs skip ids the server already has, so a game sent
+    # without its giantbomb data would never get its image. those are held
+    # back until a later run has requested them. a reindex (which starts
+    # from an empty database) sends everything, using the grouvee data
+    reindex = bool(os.environ.get("FEED_REINDEX"))
+    waiting = 0
+    for g in games:
+        res: dict[str, Any] = {}
+        # only read from the cache, anything missing was over the quota
+        if gb.in_cache(_giantbomb_url(g.giantbomb_id)):
+            gb_data: Optional[Summary] = fetch_giantbomb_data(g.giantbomb_id)
+            assert gb_data is not None, f"No summary returned for {g.giantbomb_id}"
+            if gb_data.metadata["error"] == "OK":
+                res = gb_data.metadata["results"]
+                assert isinstance(res, dict), str(gb_data.metadata)
         else:
-            res = {}
+            waiting += 1
+            if not reindex:
+                continue
 
         rel: Optional[date] = g.release_date
 
@@ -136,25 +204,41 @@ def grouvee() -> Iterator[FeedItem]:
             when=dt,
             score=score,
         )
+    if waiting > 0:
+        logger.warning(
+            f"grouvee: {waiting} games don't have giantbomb data yet"
+            + ("" if reindex else ", holding them back until a later run")
+        )
 
 
 def osrs() -> Iterator[FeedItem]:
     from my.runelite.screenshots import screenshots, Level
-    from my.time.tz.via_location import localize
+    from ..tz import Localizer
+    from ..thumbnails import ThumbnailIndex, thumbnail_dir
 
     IGNORED_SCREENSHOTS = {
         "Kingdom Rewards",
         "Collection Log",
     }
 
-    for sc in screenshots():
-        if sc.screenshot_type in IGNORED_SCREENSHOTS:
-            continue
+    shots = [
+        sc for sc in screenshots() if sc.screenshot_type not in IGNORED_SCREENSHOTS
+    ]
+    localizer = Localizer("osrs")
+    dts = localizer.localize_all([sc.dt for sc in shots])
+    localizer.log_stats()
+
+    # created by 'my_feed thumbnails', and synced to this prefix
+    thumbnail_prefix = os.getenv("RUNELITE_THUMBNAIL_PREFIX")
+    thumbnails = ThumbnailIndex(thumbnail_dir()) if thumbnail_prefix else None
+
+    for sc, dt in zip(shots, dts):
         id_: str
         desc: str
         img: Optional[str] = None
-        dt = localize(sc.dt)
-        if "HPIDATA" in os.environ:
+        if thumbnails is not None and (thumb := thumbnails.lookup(sc.path)):
+            img = os.path.join(cast(str, thumbnail_prefix), thumb)
+        elif "HPIDATA" in os.environ:
             if prefix := os.getenv("RUNELITE_PHOTOS_PREFIX"):
                 img = os.path.join(prefix, str(sc.path).lstrip(os.environ["HPIDATA"]))
         if isinstance(sc.description, Level):
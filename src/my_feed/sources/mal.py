@@ -5,15 +5,29 @@ https://github.com/seanbreckenridge/malexport
 
 import os
 from datetime import datetime, timezone
-from typing import Iterator, Optional, Union
-
-import my.mal.export as mal
+from typing import TYPE_CHECKING, Iterable, Iterator, NamedTuple, Optional, Union
 
 from .model import FeedItem
 from ..log import logger
 
+if TYPE_CHECKING:
+    import my.mal.export as mal
+
+    Data = Union[mal.AnimeData, mal.MangaData]
+
+
+class _Kind(NamedTuple):
+    name: str  # anime, manga
+    part: str  # episode, chapter
+    total_attr: str  # attribute on the XMLData for the total number of parts
+    done_attr: str  # and for how many parts I've watched/read
+
+
+ANIME = _Kind("anime", "episode", "episodes", "watched_episodes")
+MANGA = _Kind("manga", "chapter", "chapters", "read_chapters")
 
-def _image_url(data: Union[mal.AnimeData, mal.MangaData]) -> Optional[str]:
+
+def _image_url(data: "Data") -> Optional[str]:
     if data.APIList is None:
         # TODO: fetch from dbsentinel?
         # https://dbsentinel.sean.fish/
@@ -28,29 +42,19 @@ def _image_url(data: Union[mal.AnimeData, mal.MangaData]) -> Optional[str]:
     return None
 
 
-def _completed_datetime(
-    data: Union[mal.AnimeData, mal.MangaData]
-) -> Optional[datetime]:
+def _completed_datetime(data: "Data", kind: _Kind) -> Optional[datetime]:
     dt: Optional[datetime] = None
-    total_count: int
-    watched: int
-    if isinstance(data, mal.AnimeData):
-        total_count = data.XMLData.episodes
-        watched = data.XMLData.watched_episodes
-    else:
-        total_count = data.XMLData.chapters
-        watched = data.XMLData.read_chapters
+    total_count: int = getattr(data.XMLData, kind.total_attr)
+    watched: int = getattr(data.XMLData, kind.done_attr)
 
     # if there's only one episode, find the first time I watched this
     if watched > 0 and len(data.history) > 0:
-        # its sorted from newest to oldest, so iterate from the beginning
+        # its sorted from newest to oldest, so iterate from the end
         # this is the datetime when I completed the last epsisode the first
         # time (could be multiple times because of rewatches)
-        completed_last_ep_at = [
-            ep for ep in reversed(data.history) if ep.number == total_count
-        ]
-        if completed_last_ep_at:
-            dt = completed_last_ep_at[0].at
+        dt = next(
+            (ep.at for ep in reversed(data.history) if ep.number == total_count), None
+        )
     if dt is None:
         # use finish date
         if data.XMLData.finish_date is not None:
@@ -64,175 +68,89 @@ def _completed_datetime(
     return dt
 
 
-def _anime() -> Iterator[FeedItem]:
-    for an in mal.anime():
-        if an.username != os.environ["MAL_USERNAME"]:
-            continue
-
-        if an.APIList is None:
-            logger.warning(f"No API info for anime {an.XMLData.id}")
-            continue
-
-        url = f"https://myanimelist.net/anime/{an.id}"
-        score = float(an.XMLData.score) if an.XMLData.score is not None else None
-
-        for hist in an.history:
+def _entry_items(data: "Data", kind: _Kind, *, deleted: bool) -> Iterator[FeedItem]:
+    """
+    Items for one anime/manga -- everything which is the same for each
+    history entry is computed once, before creating the items
+    """
+    url = f"https://myanimelist.net/{kind.name}/{data.id}"
+    image_url = _image_url(data)
+    score = float(data.XMLData.score) if data.XMLData.score is not None else None
+    collection = str(data.id)
+    release_date = data.APIList.start_date if data.APIList is not None else None
+    # deleted entries may not have API info, so use the title from the XML export
+    if deleted:
+        title = data.XMLData.title
+    else:
+        # entries without API info are skipped before this is called
+        assert data.APIList is not None
+        title = data.APIList.title
+    ftype = f"{kind.name}_{kind.part}"
+    id_prefix = f"{ftype}_{data.id}"
+    subtitle_prefix = kind.part.title()
+
+    for hist in data.history:
+        yield FeedItem(
+            id=f"{id_prefix}_{hist.number}_{int(hist.at.timestamp())}",
+            ftype=ftype,
+            when=hist.at,
+            url=url,
+            collection=collection,
+            image_url=image_url,
+            subtitle=f"{subtitle_prefix} {hist.number}",
+            part=hist.number,  # no reliable season/volume data
+            title=title,
+            release_date=release_date,
+        )
+
+    if data.XMLData.status.casefold() == "completed":
+        if dt := _completed_datetime(data, kind):
             yield FeedItem(
-                id=f"anime_episode_{an.id}_{hist.number}_{int(hist.at.timestamp())}",
-                ftype="anime_episode",
-                when=hist.at,
+                id=f"{kind.name}_entry_{data.id}",
+                ftype=kind.name,
+                when=dt,
                 url=url,
-                image_url=_image_url(an),
-                subtitle=f"Episode {hist.number}",
-                collection=str(an.id),
-                part=hist.number,  # no reliable season data for anime data
-                release_date=an.APIList.start_date,
-                title=an.APIList.title,
+                image_url=image_url,
+                title=title,
+                release_date=release_date,
+                score=score,
             )
-        if an.XMLData.status.casefold() == "completed":
-            if dt := _completed_datetime(an):
-                yield FeedItem(
-                    id=f"anime_entry_{an.id}",
-                    ftype="anime",
-                    when=dt,
-                    url=url,
-                    image_url=_image_url(an),
-                    title=an.APIList.title,
-                    release_date=an.APIList.start_date,
-                    score=score,
-                )
 
 
-def _manga() -> Iterator[FeedItem]:
-    for mn in mal.manga():
-        if mn.username != os.environ["MAL_USERNAME"]:
+def _items(
+    entries: Iterable["Data"], kind: _Kind, *, deleted: bool = False
+) -> Iterator[FeedItem]:
+    username = os.environ["MAL_USERNAME"]
+    for data in entries:
+        if data.username != username:
             continue
-
-        if mn.APIList is None:
-            logger.warning(f"No API info for manga {mn.XMLData.id}")
+        if not deleted and data.APIList is None:
+            logger.warning(f"No API info for {kind.name} {data.XMLData.id}")
             continue
+        yield from _entry_items(data, kind, deleted=deleted)
 
-        url = f"https://myanimelist.net/manga/{mn.id}"
-        score = float(mn.XMLData.score) if mn.XMLData.score is not None else None
 
-        for hist in mn.history:
-            yield FeedItem(
-                id=f"manga_chapter_{mn.id}_{hist.number}_{int(hist.at.timestamp())}",
-                ftype="manga_chapter",
-                when=hist.at,
-                url=url,
-                collection=str(mn.id),
-                image_url=_image_url(mn),
-                subtitle=f"Chapter {hist.number}",
-                part=hist.number,  # no reliable volume data for manga data
-                release_date=mn.APIList.start_date,
-                title=mn.APIList.title,
-            )
-        if mn.XMLData.status.casefold() == "completed":
-            if dt := _completed_datetime(mn):
-                yield FeedItem(
-                    id=f"manga_entry_{mn.id}",
-                    ftype="manga",
-                    when=dt,
-                    url=url,
-                    image_url=_image_url(mn),
-                    title=mn.APIList.title,
-                    release_date=mn.APIList.start_date,
-                    score=score,
-                )
-
-
-def history() -> Iterator[FeedItem]:
-    yield from _anime()
-    yield from _manga()
-
-
-def _deleted_anime() -> Iterator[FeedItem]:
-    from my.mal.export import deleted_anime
-
-    for an in deleted_anime():
-        if an.username != os.environ["MAL_USERNAME"]:
-            continue
-
-        url = f"https://myanimelist.net/anime/{an.id}"
-        score = float(an.XMLData.score) if an.XMLData.score is not None else None
+def _anime() -> Iterator[FeedItem]:
+    from my.mal.export import anime
 
-        release_date = None
-        if an.APIList is not None:
-            release_date = an.APIList.start_date
+    yield from _items(anime(), ANIME)
 
-        for hist in an.history:
-            yield FeedItem(
-                id=f"anime_episode_{an.id}_{hist.number}_{int(hist.at.timestamp())}",
-                ftype="anime_episode",
-                when=hist.at,
-                url=url,
-                collection=str(an.id),
-                image_url=_image_url(an),
-                subtitle=f"Episode {hist.number}",
-                part=hist.number,  # no reliable season data for anime data
-                title=an.XMLData.title,
-                release_date=release_date,
-            )
 
-        if an.XMLData.status.casefold() == "completed":
-            if dt := _completed_datetime(an):
-                yield FeedItem(
-                    id=f"anime_entry_{an.id}",
-                    ftype="anime",
-                    when=dt,
-                    url=url,
-                    image_url=_image_url(an),
-                    title=an.XMLData.title,
-                    release_date=release_date,
-                    score=score,
-                )
-
-
-def _deleted_manga() -> Iterator[FeedItem]:
-    from my.mal.export import deleted_manga
-
-    for mn in deleted_manga():
-        if mn.username != os.environ["MAL_USERNAME"]:
-            continue
+def _manga() -> Iterator[FeedItem]:
+    from my.mal.export import manga
 
-        url = f"https://myanimelist.net/manga/{mn.id}"
-        score = float(mn.XMLData.score) if mn.XMLData.score is not None else None
+    yield from _items(manga(), MANGA)
 
-        release_date = None
-        if mn.APIList is not None:
-            release_date = mn.APIList.start_date
 
-        for hist in mn.history:
-            yield FeedItem(
-                id=f"manga_chapter_{mn.id}_{hist.number}_{int(hist.at.timestamp())}",
-                ftype="manga_chapter",
-                when=hist.at,
-                url=url,
-                collection=str(mn.id),
-                image_url=_image_url(mn),
-                subtitle=f"Chapter {hist.number}",
-                part=hist.number,  # no reliable volume data for manga data
-                title=mn.XMLData.title,
-                release_date=release_date,
-            )
-
-        if mn.XMLData.status.casefold() == "completed":
-            if dt := _completed_datetime(mn):
-                yield FeedItem(
-                    id=f"manga_entry_{mn.id}",
-                    ftype="manga",
-                    when=dt,
-                    url=url,
-                    image_url=_image_url(mn),
-                    title=mn.XMLData.title,
-                    release_date=release_date,
-                    score=score,
-                )
+def history() -> Iterator[FeedItem]:
+    yield from _anime()
+    yield from _manga()
 
 
 # items which have been deleted from MAL
 # https://github.com/seanbreckenridge/malexport/#recover_deleted
 def deleted_history() -> Iterator[FeedItem]:
-    yield from _deleted_anime()
-    yield from _deleted_manga()
+    from my.mal.export import deleted_anime, deleted_manga
+
+    yield from _items(deleted_anime(), ANIME, deleted=True)
+    yield from _items(deleted_manga(), MANGA, deleted=True)
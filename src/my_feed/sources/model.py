@@ -1,10 +1,21 @@
 from __future__ import annotations
+import sys
 import json
 from typing import Optional, List, Dict, Any
-from datetime import datetime, date
+from datetime import datetime, date, timezone
 
 from dataclasses import dataclass, field
 
+# fields with only a few distinct values, which repeat across lots of items
+# (e.g. every song by an artist), so each value is only kept once. interned
+# strings live as long as the process (e.g. the daemon), so fields which are
+# mostly unique (titles, urls) aren't interned
+INTERNED_FIELDS = (
+    "ftype",
+    "creator",
+    "collection",
+)
+
 
 @dataclass
 class FeedItem:
@@ -29,6 +40,11 @@ class FeedItem:
     flags: List[str] = field(default_factory=list)
     score: Optional[float] = None  # normalized to out of 10
 
+    def __post_init__(self) -> None:
+        for attr in INTERNED_FIELDS:
+            if type(val := getattr(self, attr)) is str:
+                setattr(self, attr, sys.intern(val))
+
     def check(self) -> None:
         """
         Make sure there are no empty values which should be nulls and do some bounds checking
@@ -46,26 +62,57 @@ class FeedItem:
         if self.image_url is not None:
             self.flags.append("i_blur")
 
-    def to_json(self) -> str:
-        return json.dumps(
-            {
-                "id": self.id,
-                "title": self.title,
-                "ftype": self.ftype,
-                "when": int(self.when.timestamp()),
-                "creator": self.creator,
-                "data": self.data if self.data else {},
-                "release_date": (
-                    str(self.release_date) if self.release_date is not None else None
-                ),
-                "part": self.part,
-                "subpart": self.subpart,
-                "collection": self.collection,
-                "subtitle": self.subtitle,
-                "url": self.url,
-                "image_url": self.image_url,
-                "flags": self.flags if self.flags else [],
-                "score": float(self.score) if self.score else None,
-            },
-            separators=(",", ":"),
+    def to_json(self, source: Optional[str] = None) -> str:
+        """
+        'source' is the name of the source which produced this item, which the
+        server uses to tell which rows a replace shard (see shards.py) owns
+        """
+        d: Dict[str, Any] = {
+            "id": self.id,
+            "title": self.title,
+            "ftype": self.ftype,
+            "when": int(self.when.timestamp()),
+            "creator": self.creator,
+            "data": self.data if self.data else {},
+            "release_date": (
+                str(self.release_date) if self.release_date is not None else None
+            ),
+            "part": self.part,
+            "subpart": self.subpart,
+            "collection": self.collection,
+            "subtitle": self.subtitle,
+            "url": self.url,
+            "image_url": self.image_url,
+            "flags": self.flags if self.flags else [],
+            "score": float(self.score) if self.score else None,
+        }
+        if source is not None:
+            d["source"] = source
+        return json.dumps(d, separators=(",", ":"))
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> FeedItem:
+        """
+        Parses an item serialized with to_json
+        """
+        return cls(
+            id=d["id"],
+            title=d["title"],
+            ftype=d["ftype"],
+            when=datetime.fromtimestamp(d["when"], tz=timezone.utc),
+            creator=d.get("creator"),
+            data=d.get("data") or {},
+            release_date=(
+                date.fromisoformat(d["release_date"][:10])
+                if d.get("release_date") is not None
+                else None
+            ),
+            part=d.get("part"),
+            subpart=d.get("subpart"),
+            collection=d.get("collection"),
+            subtitle=d.get("subtitle"),
+            url=d.get("url"),
+            image_url=d.get("image_url"),
+            flags=list(d.get("flags") or []),
+            score=d.get("score"),
         )
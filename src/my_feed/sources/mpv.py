@@ -5,25 +5,42 @@ Listens from my local mpv history
 
 This tries to use some path matching/ID3/heuristics
 to improve the metadata here
+
+mpv history files don't change once the daemon has finished writing them,
+so the items each file produced are saved (see ProcessedFiles), and only
+new or modified files are parsed again
 """
 
 import os
 import json
+import hashlib
 from datetime import datetime, timedelta
 from pathlib import Path
+from urllib.parse import urlparse
 from functools import cache
 from math import isclose
-from typing import Iterator, Tuple, Optional, Dict, TypeGuard
+from typing import (
+    Iterator,
+    Tuple,
+    Optional,
+    Dict,
+    List,
+    Set,
+    Any,
+    Iterable,
+    NamedTuple,
+    TypeGuard,
+)
 
 from mutagen.mp3 import MP3, MutagenError  # type: ignore[import]
 from mutagen.easyid3 import EasyID3  # type: ignore[import]
-from my.mpv.history_daemon import history as mpv_history, Media
+from my.mpv.history_daemon import history as mpv_history, inputs, Media
 from mpv_history_daemon.utils import music_parse_metadata_from_blob, MediaAllowed
 from my.utils.input_source import InputSource
 
 from .model import FeedItem
 from ..log import logger
-from .common import click, FeedBackgroundError
+from .common import click, cache_dir, FeedBackgroundError
 
 
 def _path_keys(p: Path | str) -> Iterator[Tuple[str, ...]]:
@@ -103,22 +120,53 @@ class JSONCache:
     def load_data(self) -> Dict[str, Metadata]:
         self.datafile = _manual_mpv_datafile()
         self.data: Dict[str, Metadata] = {}
+        self.changed = False
+        self.mtime_ns = self._mtime_ns()
         if self.datafile.exists():
             self.data = json.loads(self.datafile.read_text())
         return self.data
 
+    def _mtime_ns(self) -> Optional[int]:
+        if self.datafile.exists():
+            return self.datafile.stat().st_mtime_ns
+        return None
+
+    def refresh(self) -> None:
+        """
+        Reloads the file if another process (e.g. a my_feed index while the daemon is running) wrote to it
+        """
+        if not self.changed and self._mtime_ns() != self.mtime_ns:
+            self.load_data()
+
     def _save_data(self, daemon_data: Dict[str, str], for_path: str) -> Metadata:
         metadata = _daemon_to_metadata(daemon_data)
         self.data[for_path] = metadata
+        self.changed = True
         return metadata
 
     def _write(self):
+        if not self.changed:
+            return
         logger.debug(f"Writing to {self.datafile}...")
         encoded = json.dumps(self.data, separators=(",", ":"))
         self.datafile.write_text(encoded)
+        self.changed = False
+        self.mtime_ns = self._mtime_ns()
+
+
+@cache
+def _json_data() -> JSONCache:
+    return JSONCache()
+
+
+# number of times _fix_media has prompted (or tried to, in the background)
+_prompts = 0
 
 
-JSONData = JSONCache()
+def _click() -> Any:
+    global _prompts
+    _prompts += 1
+    return click()
 
 
 def _fix_media(
@@ -131,9 +179,10 @@ def _fix_media(
     # this is here to fix legacy data from years ago
 
     # if we've fixed this in the past
-    if m.path in JSONData.data:
-        logger.debug(f"Using cached data for {m.path}: {JSONData.data[m.path]}")
-        return JSONData.data[m.path]
+    fixes = _json_data()
+    if m.path in fixes.data:
+        logger.debug(f"Using cached data for {m.path}: {fixes.data[m.path]}")
+        return fixes.data[m.path]
 
     album, artist, title = None, None, None
     if m.media_duration is None:
@@ -176,9 +225,9 @@ artist: '{daemon_data.get('artist')}' -> '{artist}'
 album: '{daemon_data.get('album')}' -> '{album}'
 """
                         )
-                    if click().confirm("Use metadata?", default=True):
+                    if _click().confirm("Use metadata?", default=True):
                         assert title and artist and album
-                        return JSONData._save_data(
+                        return fixes._save_data(
                             {"title": title, "artist": artist, "album": album}, m.path
                         )
 
@@ -191,13 +240,13 @@ album: '{daemon_data.get('album')}' -> '{album}'
         return _daemon_to_metadata(daemon_data)
 
     # use path as a key
-    click().echo(f"Missing data: {m}", err=True)
-    title = click().prompt("title").strip()
-    subtitle = click().prompt("album name").strip()
-    creator = click().prompt("artist name").strip()
+    _click().echo(f"Missing data: {m}", err=True)
+    title = _click().prompt("title").strip()
+    subtitle = _click().prompt("album name").strip()
+    creator = _click().prompt("artist name").strip()
 
     # write data
-    return JSONData._save_data(
+    return fixes._save_data(
         {"title": title, "artist": creator, "album": subtitle}, for_path=m.path
     )
 
@@ -240,71 +289,253 @@ IGNORE_EXTS = {
 ALLOW_EXT = {".flac", ".mp3", ".ogg", ".m4a", ".opus"}
 
 
-ALLOW_PREFIXES: set[str] = set()
-if "XDG_MUSIC_DIR" in os.environ:
-    ALLOW_PREFIXES.add(os.environ["XDG_MUSIC_DIR"])
-IGNORE_PREFIXES: set[str] = set()
-try:
-    from my.config.feed import ignore_mpv_prefixes, allow_mpv_prefixes  # type: ignore[import]
+@cache
+def _prefixes() -> Tuple[List[str], List[str]]:
+    allow_prefixes: set[str] = set()
+    if "XDG_MUSIC_DIR" in os.environ:
+        allow_prefixes.add(os.environ["XDG_MUSIC_DIR"])
+    ignore_prefixes: set[str] = set()
+    try:
+        from my.config.feed import ignore_mpv_prefixes, allow_mpv_prefixes  # type: ignore[import]
+
+        allow_prefixes.update(allow_mpv_prefixes)
+        ignore_prefixes.update(ignore_mpv_prefixes)
+    except ImportError as e:
+        logger.warning("Could not import feed configuration", exc_info=e)
+    return sorted(allow_prefixes), sorted(ignore_prefixes)
+
 
-    ALLOW_PREFIXES.update(allow_mpv_prefixes)
-    IGNORE_PREFIXES.update(ignore_mpv_prefixes)
-except ImportError as e:
-    logger.warning("Could not import feed configuration", exc_info=e)
+class _TrieNode:
+    __slots__ = ("children", "partial")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, _TrieNode] = {}
+        # the last component of any prefixes which end at this node
+        self.partial: List[str] = []
+
+
+class PrefixTrie:
+    """
+    Checks if a path starts with any of the prefixes, by walking the
+    path's components instead of comparing against every prefix
+
+    The last component of a prefix can be partial, like str.startswith,
+    e.g. '/home/sean/Mus' matches '/home/sean/Music/song.mp3'
+    """
+
+    def __init__(self, prefixes: Iterable[str]) -> None:
+        self.root = _TrieNode()
+        for prefix in prefixes:
+            *parents, last = prefix.split("/")
+            node = self.root
+            for part in parents:
+                node = node.children.setdefault(part, _TrieNode())
+            node.partial.append(last)
+
+    def matches(self, path: str) -> bool:
+        node: Optional[_TrieNode] = self.root
+        for part in path.split("/"):
+            assert node is not None
+            if any(part.startswith(p) for p in node.partial):
+                return True
+            node = node.children.get(part)
+            if node is None:
+                return False
+        return False
+
+
+class PathMatcher:
+    """
+    Makes the same decisions as mpv_history_daemon's MediaAllowed, with the
+    prefixes compiled into tries, and the result for each path memoized
+    (the same files are played over and over)
+
+    benchmarks/bench_mpv_matcher.py compares the two
+    """
+
+    def __init__(
+        self,
+        *,
+        allow_prefixes: List[str],
+        ignore_prefixes: List[str],
+        allow_extensions: List[str],
+        ignore_extensions: List[str],
+        allow_stream: bool = False,
+        strict: bool = True,
+    ) -> None:
+        self.allow = PrefixTrie(allow_prefixes)
+        self.has_allow_prefixes = len(allow_prefixes) > 0
+        self.ignore = PrefixTrie(ignore_prefixes + MediaAllowed.default_ignore())
+        # extension -> whether its allowed, anything missing is only allowed
+        # if there's no list of allowed extensions
+        self.extensions: Dict[str, bool] = {
+            MediaAllowed._fix_extension(ext): True for ext in allow_extensions
+        }
+        self.extensions.update(
+            {MediaAllowed._fix_extension(ext): False for ext in ignore_extensions}
+        )
+        self.has_allow_extensions = len(allow_extensions) > 0
+        self.allow_stream = allow_stream
+        self.strict = strict
+        self._memo: Dict[str, bool] = {}
+
+    def is_allowed(self, media: Media) -> bool:
+        if not self.allow_stream and media.is_stream:
+            return False
+        try:
+            return self._memo[media.path]
+        except KeyError:
+            allowed = self._memo[media.path] = self.is_allowed_path(media.path)
+            return allowed
+
+    def _extension_allowed(self, path: str) -> bool:
+        _, ext = os.path.splitext(path)
+        if not ext:
+            return True
+        ext = ext.lower()
+        if "?" in ext:
+            # e.g. .mp3?query=1
+            ext = urlparse(ext).path
+        if ext in self.extensions:
+            return self.extensions[ext]
+        return not self.has_allow_extensions
+
+    def is_allowed_path(self, path: str) -> bool:
+        if not self._extension_allowed(path):
+            return False
+        if self.allow.matches(path):
+            return True
+        if self.ignore.matches(path):
+            return False
+        return not (self.has_allow_prefixes and self.strict)
+
+
+def _matcher_kwargs() -> Dict[str, Any]:
+    allow_prefixes, ignore_prefixes = _prefixes()
+    return dict(
+        allow_prefixes=allow_prefixes,
+        ignore_prefixes=ignore_prefixes,
+        allow_extensions=list(ALLOW_EXT),
+        ignore_extensions=list(IGNORE_EXTS),
+        strict=True,
+        allow_stream=False,
+    )
 
 
 # helper class to match media files based on path/ext/ etc.
-matcher = MediaAllowed(
-    allow_prefixes=list(ALLOW_PREFIXES),
-    ignore_prefixes=list(IGNORE_PREFIXES),
-    allow_extensions=list(ALLOW_EXT),
-    ignore_extensions=list(IGNORE_EXTS),
-    strict=True,
-    logger=logger,
-    allow_stream=False,
-)
+@cache
+def _matcher() -> PathMatcher:
+    return PathMatcher(**_matcher_kwargs())
 
 
-def history(from_paths: Optional[InputSource] = None) -> Iterator[FeedItem]:
-    allow_before = (datetime.now() - timedelta(minutes=5)).timestamp()
+def _resolve_metadata(media: Media) -> Metadata:
+    """
+    Returns the title, album, and artist for this media, possibly prompting me
+    """
+    # this has all neccsarry id3 data saved in the 'metadata' blob
+    if metadata := _has_metadata(media):
+        # title, album, artist
+        title, subtitle, creator = metadata
+        return _fix_media(
+            media,
+            daemon_data={
+                "title": title,
+                "album": subtitle,
+                "artist": creator,
+            },
+            is_broken=False,
+        )
+    else:
+        # this is missing some data, so we'll prompt the user
+        return _fix_media(media, daemon_data={}, is_broken=True)
+
+
+MemoKey = Tuple[str, Optional[float], int]
+
+
+class MetadataMemo:
+    """
+    The same song is usually played hundreds of times, so the metadata for
+    each (path, duration, metadata blob) is only resolved once per run
+
+    Anything which prompted me isn't saved, so prompts happen exactly as
+    often as they would without this
+    """
 
-    kwargs = {}
-    if from_paths is not None:
-        kwargs["from_paths"] = from_paths
+    def __init__(self) -> None:
+        # None if this couldn't be resolved without prompting, while in the background
+        self.resolved: Dict[MemoKey, Optional[Metadata]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(media: Media) -> MemoKey:
+        duration = None
+        if media.media_duration is not None:
+            # well within the 1% tolerance used to match local files
+            duration = round(media.media_duration, 1)
+        blob = json.dumps(media.metadata, sort_keys=True, default=str)
+        return media.path, duration, hash(blob)
+
+    def resolve(self, media: Media) -> Metadata:
+        key = self.key(media)
+        if key in self.resolved:
+            self.hits += 1
+            metadata = self.resolved[key]
+            if metadata is None:
+                raise FeedBackgroundError("Running in the background, can't prompt")
+            return metadata
+
+        self.misses += 1
+        prompts = _prompts
+        try:
+            metadata = _resolve_metadata(media)
+        except FeedBackgroundError:
+            self.resolved[key] = None
+            raise
+        if _prompts != prompts:
+            # what I entered may have been saved as a fix for this path,
+            # which changes how other plays of it would be resolved
+            self.resolved.clear()
+        else:
+            self.resolved[key] = metadata
+        return metadata
 
-    for media in mpv_history(**kwargs):
+    def log_stats(self) -> None:
+        total = self.hits + self.misses
+        if total == 0:
+            return
+        logger.info(
+            f"mpv: resolved metadata {self.misses} times for {total} listens ({self.hits / total:.1%} memoized)"
+        )
+
+
+class _ParseState:
+    def __init__(self) -> None:
+        # listens which couldn't be used yet, because they were
+        # too recent or needed to prompt while in the background
+        self.skipped = 0
+
+
+def _parse_history(
+    from_paths: InputSource,
+    allow_before: float,
+    memo: MetadataMemo,
+    state: _ParseState,
+) -> Iterator[FeedItem]:
+    matcher = _matcher()
+    for media in mpv_history(from_paths=from_paths):
         if not matcher.is_allowed(media):
             logger.debug(f"Skipping, not allowed: {media}")
             continue
 
-        # placeholder metadata
-        title: Optional[str] = None
-        subtitle: Optional[str] = None  # album
-        creator: Optional[str] = None  # artist
-
         try:
-            # this has all neccsarry id3 data saved in the 'metadata' blob
-            if metadata := _has_metadata(media):
-                # title, album, artist
-                title, subtitle, creator = metadata
-                title, subtitle, creator = _fix_media(
-                    media,
-                    daemon_data={
-                        "title": title,
-                        "album": subtitle,
-                        "artist": creator,
-                    },
-                    is_broken=False,
-                )
-            else:
-                # this is missing some data, so we'll prompt the user
-                title, subtitle, creator = _fix_media(
-                    media, daemon_data={}, is_broken=True
-                )
+            title, subtitle, creator = memo.resolve(media)
         except FeedBackgroundError as e:
             logger.warning(
                 f"Running in the background, cannot prompt for {media}", exc_info=e
             )
+            state.skipped += 1
             continue
 
         dt = media.end_time
@@ -313,6 +544,7 @@ def history(from_paths: Optional[InputSource] = None) -> Iterator[FeedItem]:
         # and the end time might change
         if dt.timestamp() > allow_before:
             logger.debug(f"Skipping, too recent: {media}")
+            state.skipped += 1
             continue
 
         # TODO: attach to album somehow (parent_id/collection)?
@@ -324,4 +556,142 @@ def history(from_paths: Optional[InputSource] = None) -> Iterator[FeedItem]:
             creator=creator,
             when=dt,
         )
-    JSONData._write()
+
+
+# bump this if the items produced from a file change, to re-parse every file
+PROCESSED_VERSION = 1
+
+
+class ProcessedFile(NamedTuple):
+    size: int
+    mtime_ns: int
+    count: int
+    last_id: Optional[str]
+
+
+def _processed_key() -> Dict[str, Any]:
+    """
+    If any of these change, any file could produce different items, so everything is re-parsed
+    """
+    allow_prefixes, ignore_prefixes = _prefixes()
+    datafile = _manual_mpv_datafile()
+    fixes = None
+    if datafile.exists():
+        fixes = hashlib.sha256(datafile.read_bytes()).hexdigest()
+    return {
+        "version": PROCESSED_VERSION,
+        "fixes": fixes,
+        "allow_prefixes": allow_prefixes,
+        "ignore_prefixes": ignore_prefixes,
+    }
+
+
+class ProcessedFiles:
+    """
+    A manifest of the mpv history files which have been parsed (path, size,
+    mtime, and the last id it produced), with the items from each file
+    saved alongside it, one JSON file per history file
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.manifest_file = directory / "manifest.json"
+        self.key = _processed_key()
+        self.files: Dict[str, ProcessedFile] = {}
+        if self.manifest_file.exists():
+            manifest = json.loads(self.manifest_file.read_text())
+            if manifest.get("key") == self.key:
+                self.files = {
+                    path: ProcessedFile(*pf) for path, pf in manifest["files"].items()
+                }
+            else:
+                logger.info("mpv fixes or configuration changed, re-parsing every file")
+
+    def _store(self, path: str) -> Path:
+        return self.directory / f"{hashlib.sha1(path.encode()).hexdigest()}.json"
+
+    def replay(self, path: str, st: os.stat_result) -> Optional[List[FeedItem]]:
+        """
+        Returns the items saved for this file, if it hasn't changed since
+        """
+        pf = self.files.get(path)
+        if pf is None or pf.size != st.st_size or pf.mtime_ns != st.st_mtime_ns:
+            return None
+        store = self._store(path)
+        if not store.exists():
+            return None
+        with store.open() as f:
+            return [FeedItem.from_dict(json.loads(line)) for line in f]
+
+    def save(self, path: str, st: os.stat_result, items: List[FeedItem]) -> None:
+        store = self._store(path)
+        tmp = store.with_suffix(".tmp")
+        with tmp.open("w") as f:
+            for item in items:
+                f.write(item.to_json())
+                f.write("\n")
+        os.replace(tmp, store)
+        self.files[path] = ProcessedFile(
+            size=st.st_size,
+            mtime_ns=st.st_mtime_ns,
+            count=len(items),
+            last_id=items[-1].id if items else None,
+        )
+
+    def write(self, seen: Set[str]) -> None:
+        # files which no longer exist, e.g. after the daemon merges files
+        for path in set(self.files) - seen:
+            self._store(path).unlink(missing_ok=True)
+            del self.files[path]
+        tmp = self.manifest_file.with_suffix(".tmp")
+        # if the fixes file was changed during this run, this key no longer
+        # matches it, so the next run re-parses everything once
+        tmp.write_text(json.dumps({"key": self.key, "files": self.files}))
+        os.replace(tmp, self.manifest_file)
+
+
+def _incremental_history(allow_before: float) -> Iterator[FeedItem]:
+    _json_data().refresh()
+    memo = MetadataMemo()
+    processed = ProcessedFiles(cache_dir("mpv"))
+    seen: Set[str] = set()
+    emitted: Set[str] = set()
+    replayed = 0
+    for path in inputs():
+        key = str(path)
+        seen.add(key)
+        st = os.stat(path)
+        items = processed.replay(key, st)
+        if items is not None:
+            replayed += 1
+        else:
+            state = _ParseState()
+            items = list(_parse_history(lambda p=path: [p], allow_before, memo, state))
+            # files the daemon may still be writing to, or which had listens
+            # that couldn't be used yet are parsed again next time
+            if st.st_mtime < allow_before and state.skipped == 0:
+                processed.save(key, st, items)
+        for item in items:
+            # merged files include listens from other files
+            if item.id not in emitted:
+                emitted.add(item.id)
+                yield item
+
+    memo.log_stats()
+    _json_data()._write()
+    processed.write(seen)
+    logger.info(f"mpv: replayed {replayed} of {len(seen)} history files")
+
+
+def history(from_paths: Optional[InputSource] = None) -> Iterator[FeedItem]:
+    allow_before = (datetime.now() - timedelta(minutes=5)).timestamp()
+
+    if from_paths is None:
+        yield from _incremental_history(allow_before)
+        return
+
+    # e.g. only the most recent files, from feed_check
+    memo = MetadataMemo()
+    yield from _parse_history(from_paths, allow_before, memo, _ParseState())
+    memo.log_stats()
+    _json_data()._write()
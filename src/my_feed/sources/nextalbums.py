@@ -5,14 +5,14 @@ https://sean.fish/s/albums
 
 import warnings
 from datetime import datetime, time
-from typing import Iterator
+from typing import Iterator, List, Tuple
 
 from my.nextalbums import history as album_history
 from nextalbums.export import Album
 from nextalbums.discogs_update import slugify_data
-from my.time.tz.via_location import localize
 
 from .model import FeedItem
+from ..tz import Localizer
 
 
 def _album_id(album: Album) -> str:
@@ -24,6 +24,7 @@ def _album_id(album: Album) -> str:
 
 def history() -> Iterator[FeedItem]:
     hashes: set[str] = set()
+    albums: List[Tuple[str, Album]] = []
     for al in album_history():
         # make sure no duplicate hashes
         album_hash = _album_id(al)
@@ -38,13 +39,18 @@ def history() -> Iterator[FeedItem]:
         if al.listened_on is None:
             warnings.warn(f"listened_on is None: {al}")
             continue
+        albums.append((album_hash, al))
 
-        # combine datetime with ~noon, as some sort of
-        # average time I listen to an album.
-        # Use HPI locations module to determine timezone
-        dt_naive = datetime.combine(al.listened_on, time(hour=12))
-        dt = localize(dt_naive)
+    # combine datetime with ~noon, as some sort of
+    # average time I listen to an album.
+    # Use HPI locations module to determine timezone
+    localizer = Localizer("nextalbums")
+    dts = localizer.localize_all(
+        [datetime.combine(al.listened_on, time(hour=12)) for _, al in albums]
+    )
+    localizer.log_stats()
 
+    for (album_hash, al), dt in zip(albums, dts):
         image_url = al.album_artwork_url
         assert image_url.strip(), f"No image url: {al}"
 
@@ -17,7 +17,7 @@ from url_cache.core import (
 )
 
 from ...log import logger
-
+from ...http import client
 
 MOVIE_REGEX = re.compile(r"/movie/(\d+)")
 EPISODE_REGEX = re.compile(r"/tv/(\d+)/season/(\d+)/episode/(\d+)")
@@ -39,7 +39,8 @@ def _matches_trakt(url: str) -> bool:
     )
 
 
-BASE_URL = "https://api.themoviedb.org/3"
+# can be pointed at a local server, e.g. tests/fixtures/api_stub.py
+BASE_URL = os.environ.get("TMDB_BASE_URL", "https://api.themoviedb.org/3").rstrip("/")
 
 
 class TMDBCache(URLCache):
@@ -56,7 +57,7 @@ class TMDBCache(URLCache):
         if not _matches_trakt(uurl):
             raise ValueError(f"{url} doesn't match a tmdb URL")
         logger.info(f"Requesting {uurl}")
-        r = requests.get(uurl, params={"api_key": os.environ["TMDB_API_KEY"]})
+        r = client("tmdb").get(uurl, params={"api_key": os.environ["TMDB_API_KEY"]})
         # 404 means data couldn't be found -- could periodically invalidate anything
         # which has errors as cached information and retry in case new data has been
         # pushed to TMDB
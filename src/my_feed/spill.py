@@ -0,0 +1,194 @@
+"""
+A compact, append-only file format for (source, FeedItem) pairs, used by
+'my_feed index' to move items out of memory once a run gets large
+
+Each line is a JSON array. Strings which repeat across items (the
+source name and the fields in INTERNED_FIELDS) are written once, as a
+definition line, and items refer to them by index:
+
+["s","my_feed.sources.trakt.history"]
+["s","episode"]
+[0,"trakt_episode_...","Pilot",1,...]
+
+Reading the file back gives every item the same string object for a
+repeated value, so the items read back stay small as well. Every other
+string (titles, urls) is mostly unique, so it's written inline, instead of
+keeping a table entry around for it until the file is closed
+"""
+
+from __future__ import annotations
+import os
+import json
+import tempfile
+from pathlib import Path
+from types import TracebackType
+from datetime import date, datetime, timezone
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Type, Union, cast
+
+from .sources.model import FeedItem, INTERNED_FIELDS
+
+
+class SpillWriter:
+    def __init__(self, f: IO[str]) -> None:
+        self.f = f
+        self._strings: Dict[str, int] = {}
+
+    def _ref(self, s: Optional[str]) -> Optional[int]:
+        if s is None:
+            return None
+        if (i := self._strings.get(s)) is None:
+            i = len(self._strings)
+            self._strings[s] = i
+            self.f.write(json.dumps(["s", s]))
+            self.f.write("\n")
+        return i
+
+    def _field(self, item: FeedItem, attr: str) -> Union[int, str, None]:
+        val: Optional[str] = getattr(item, attr)
+        return self._ref(val) if attr in INTERNED_FIELDS else val
+
+    def write(self, source: str, item: FeedItem) -> None:
+        row = [
+            self._ref(source),
+            item.id,
+            self._field(item, "title"),
+            self._field(item, "ftype"),
+            item.when.timestamp(),
+            self._field(item, "creator"),
+            item.data or None,
+            str(item.release_date) if item.release_date is not None else None,
+            item.part,
+            item.subpart,
+            self._field(item, "collection"),
+            self._field(item, "subtitle"),
+            self._field(item, "url"),
+            self._field(item, "image_url"),
+            item.flags or None,
+            item.score,
+        ]
+        self.f.write(json.dumps(row, separators=(",", ":")))
+        self.f.write("\n")
+
+
+def read_spill(f: IO[str]) -> Iterator[Tuple[str, FeedItem]]:
+    strings: List[str] = []
+
+    # a field is either an index into strings, or the string itself
+    def deref(val: Union[int, str, None]) -> Optional[str]:
+        return strings[val] if isinstance(val, int) else val
+
+    for line in f:
+        row: List[Any] = json.loads(line)
+        if row[0] == "s":
+            strings.append(row[1])
+            continue
+        (
+            source,
+            id_,
+            title,
+            ftype,
+            when,
+            creator,
+            data,
+            release_date,
+            part,
+            subpart,
+            collection,
+            subtitle,
+            url,
+            image_url,
+            flags,
+            score,
+        ) = row
+        yield strings[source], FeedItem(
+            id=id_,
+            title=cast(str, deref(title)),
+            ftype=cast(str, deref(ftype)),
+            when=datetime.fromtimestamp(when, tz=timezone.utc),
+            creator=deref(creator),
+            data=data or {},
+            release_date=(
+                date.fromisoformat(release_date[:10])
+                if release_date is not None
+                else None
+            ),
+            part=part,
+            subpart=subpart,
+            collection=deref(collection),
+            subtitle=deref(subtitle),
+            url=deref(url),
+            image_url=deref(image_url),
+            flags=flags or [],
+            score=score,
+        )
+
+
+class ItemBuffer:
+    """
+    Keeps items in a list, until there are more than 'threshold' of them,
+    at which point they're all written to a spill file in a temporary
+    directory, and read back from there when iterating
+    """
+
+    def __init__(self, threshold: Optional[int] = None) -> None:
+        self.threshold = threshold
+        self._items: List[Tuple[str, FeedItem]] = []
+        self._len = 0
+        self._dir: Optional[tempfile.TemporaryDirectory[str]] = None
+        self._file: Optional[IO[str]] = None
+        self._writer: Optional[SpillWriter] = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._writer is not None
+
+    @property
+    def path(self) -> Optional[Path]:
+        if self._file is None:
+            return None
+        return Path(self._file.name)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _spill(self) -> None:
+        self._dir = tempfile.TemporaryDirectory(prefix="my_feed-")
+        self._file = open(os.path.join(self._dir.name, "items.spill"), "w+")
+        self._writer = SpillWriter(self._file)
+        for src, item in self._items:
+            self._writer.write(src, item)
+        self._items = []
+
+    def append(self, source: str, item: FeedItem) -> None:
+        self._len += 1
+        if self._writer is not None:
+            self._writer.write(source, item)
+            return
+        self._items.append((source, item))
+        if self.threshold is not None and self._len > self.threshold:
+            self._spill()
+
+    def __iter__(self) -> Iterator[Tuple[str, FeedItem]]:
+        if self._file is None:
+            yield from self._items
+            return
+        self._file.flush()
+        with open(self._file.name) as f:
+            yield from read_spill(f)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        if self._dir is not None:
+            self._dir.cleanup()
+
+    def __enter__(self) -> ItemBuffer:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
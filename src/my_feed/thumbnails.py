@@ -0,0 +1,164 @@
+"""
+Generates small thumbnails for images (the OSRS screenshots), so the
+page and the sync to the server don't have to move full size PNGs
+
+Thumbnails are named by the hash of the image's contents and the
+size/quality they were created with, and index.json in the thumbnail
+directory maps each image path to its thumbnail, so only new or modified
+images (or ones last created with different options) are read and encoded
+
+Requires Pillow: pip install 'my_feed[thumbnails]'
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .log import logger
+from .sources.common import cache_dir
+
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+INDEX = "index.json"
+
+
+def thumbnail_dir() -> Path:
+    if "MY_FEED_THUMBNAIL_DIR" in os.environ:
+        path = Path(os.environ["MY_FEED_THUMBNAIL_DIR"])
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+    return cache_dir("thumbnails")
+
+
+class Options(NamedTuple):
+    size: int
+    fmt: str
+    quality: int
+
+
+class Entry(NamedTuple):
+    size: int
+    mtime_ns: int
+    name: str
+    options: Options
+
+
+class ThumbnailIndex:
+    def __init__(self, directory: Path) -> None:
+        self.path = directory / INDEX
+        self.entries: Dict[str, Entry] = {}
+        if self.path.exists():
+            with self.path.open() as f:
+                for k, v in json.load(f).items():
+                    # entries from before the options were saved are regenerated
+                    if len(v) == len(Entry._fields):
+                        self.entries[k] = Entry(*v[:3], Options(*v[3]))
+
+    def lookup(self, image: Path, options: Optional[Options] = None) -> Optional[str]:
+        """
+        Name of the thumbnail for this image, if it's been generated (with
+        these options, if given) and the image hasn't changed since
+        """
+        if (entry := self.entries.get(str(image))) is None:
+            return None
+        if options is not None and entry.options != options:
+            return None
+        try:
+            st = image.stat()
+        except OSError:
+            return None
+        if (st.st_size, st.st_mtime_ns) != (entry.size, entry.mtime_ns):
+            return None
+        return entry.name
+
+    def save(self) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("w") as f:
+            json.dump({k: list(v) for k, v in self.entries.items()}, f)
+        tmp.replace(self.path)
+
+
+def _make_thumbnail(
+    image: str, out_dir: str, size: int, fmt: str, quality: int
+) -> Tuple[str, bool]:
+    """
+    Runs in a worker process, returns the thumbnail name and whether it had to be created
+    """
+    from PIL import Image
+
+    with open(image, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:32]
+    name = f"{digest}_{size}_q{quality}.{fmt}"
+    dest = os.path.join(out_dir, name)
+    if os.path.exists(dest):
+        return name, False
+    with Image.open(image) as img:
+        img.thumbnail((size, size))
+        if img.mode not in ("RGB", "RGBA") or fmt == "jpeg":
+            img = img.convert("RGB")
+        tmp = f"{dest}.{os.getpid()}.tmp"
+        img.save(tmp, format=FORMATS[fmt], quality=quality)
+    os.replace(tmp, dest)
+    return name, True
+
+
+class Stats(NamedTuple):
+    created: int
+    existing: int
+    unchanged: int
+    failed: int
+
+
+def generate(
+    images: Iterable[Path],
+    *,
+    out_dir: Path,
+    size: int = 480,
+    fmt: str = "webp",
+    quality: int = 80,
+    workers: Optional[int] = None,
+) -> Stats:
+    """
+    Creates thumbnails for any images which are new or have changed
+    since the last run (or were created with other options), in a process pool
+    """
+    assert fmt in FORMATS, f"Unknown format {fmt}"
+    options = Options(size=size, fmt=fmt, quality=quality)
+    index = ThumbnailIndex(out_dir)
+    todo: List[Path] = []
+    unchanged = 0
+    for image in images:
+        if index.lookup(image, options) is not None:
+            unchanged += 1
+        else:
+            todo.append(image)
+
+    created = existing = failed = 0
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(
+                    _make_thumbnail, str(image), str(out_dir), size, fmt, quality
+                ): image
+                for image in todo
+            }
+            for fut in as_completed(futures):
+                image = futures[fut]
+                try:
+                    name, was_created = fut.result()
+                except Exception as e:
+                    logger.warning(f"Could not create thumbnail for {image}: {e}")
+                    failed += 1
+                    continue
+                st = image.stat()
+                index.entries[str(image)] = Entry(
+                    st.st_size, st.st_mtime_ns, name, options
+                )
+                if was_created:
+                    created += 1
+                else:
+                    existing += 1
+        index.save()
+    return Stats(created=created, existing=existing, unchanged=unchanged, failed=failed)
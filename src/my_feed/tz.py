@@ -0,0 +1,59 @@
+"""
+Localizes naive datetimes using my.time.tz.via_location, looking the
+timezone up once per day instead of once per item
+"""
+
+from datetime import datetime, date, time, tzinfo
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .log import logger
+
+TzLookup = Callable[[datetime], Optional[tzinfo]]
+
+
+def _via_location(dt: datetime) -> Optional[tzinfo]:
+    from my.time.tz.via_location import get_tz
+
+    return get_tz(dt)
+
+
+class Localizer:
+    def __init__(self, name: str, get_tz: Optional[TzLookup] = None) -> None:
+        self.name = name
+        self._get_tz = get_tz or _via_location
+        self._zones: Dict[date, Optional[tzinfo]] = {}
+        self.calls = 0
+        self.lookups = 0
+
+    def _zone(self, d: date) -> Optional[tzinfo]:
+        if d not in self._zones:
+            self.lookups += 1
+            # via_location looks the timezone up by date anyway, noon only matters
+            # for its fallback, which estimates the home location at that time
+            self._zones[d] = self._get_tz(datetime.combine(d, time(hour=12)))
+        return self._zones[d]
+
+    def localize(self, dt: datetime) -> datetime:
+        self.calls += 1
+        if dt.tzinfo is not None:
+            return dt
+        tz = self._zone(dt.date())
+        if tz is None:
+            return dt
+        # pytz timezones have to be attached with localize to get the right offset
+        if hasattr(tz, "localize"):
+            return tz.localize(dt)  # type: ignore[no-any-return]
+        return dt.replace(tzinfo=tz)
+
+    def localize_all(self, dts: Sequence[datetime]) -> List[datetime]:
+        """
+        Resolves each day in one sorted sweep, then localizes every datetime
+        """
+        for d in sorted({dt.date() for dt in dts if dt.tzinfo is None}):
+            self._zone(d)
+        return [self.localize(dt) for dt in dts]
+
+    def log_stats(self) -> None:
+        logger.info(
+            f"{self.name}: localized {self.calls} datetimes with {self.lookups} timezone lookups ({self.calls - self.lookups} saved)"
+        )
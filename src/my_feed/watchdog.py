@@ -0,0 +1,160 @@
+"""
+Per-source time limits, so one slow or stuck source (e.g. a stalled
+request, or a prompt while running in the background) doesn't hold up
+the rest of an index
+
+Configured with a 'source_timeouts' dict in my.config.feed, mapping
+substrings of source names to seconds:
+
+source_timeouts = {
+    "trakt": 120,
+    "games.grouvee": 60,
+}
+
+A source with a timeout runs in a daemon thread. If it takes longer than
+that, it's abandoned -- told to stop at its next item -- and the items it
+already produced are kept. Every time it completes, its items are saved as
+a snapshot, so anything from the last complete run which it didn't get to
+is filled in from that
+"""
+
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Set, Union
+
+from .log import logger
+from .spill import SpillWriter, read_spill
+from .checkpoint import checkpoint_filename
+from .sources.model import FeedItem
+from .sources.common import cache_dir
+from .registry import Producer
+from .merge import iterate
+
+
+def source_timeouts() -> Dict[str, float]:
+    try:
+        from my.config.feed import source_timeouts as configured  # type: ignore[import]
+    except ImportError:
+        return {}
+    return {k: float(v) for k, v in configured.items()}
+
+
+def timeout_for(name: str, timeouts: Dict[str, float]) -> Optional[float]:
+    """
+    The shortest timeout of any substring which matches this source
+    """
+    matches = [t for substr, t in timeouts.items() if substr in name]
+    return min(matches) if matches else None
+
+
+class _Done:
+    pass
+
+
+Message = Union[FeedItem, BaseException, _Done]
+
+
+class Watchdog:
+    """
+    Iterates over a source in a thread, stopping once 'timeout' seconds have passed
+    """
+
+    def __init__(
+        self,
+        name: str,
+        producer: Producer,
+        timeout: float,
+        *,
+        snapshot_dir: Optional[Path] = None,
+    ) -> None:
+        self.name = name
+        self.producer = producer
+        self.timeout = timeout
+        self.timed_out = False
+        # items filled in from the snapshot
+        self.from_snapshot = 0
+        self.snapshot = (snapshot_dir or cache_dir("snapshots")) / checkpoint_filename(
+            name
+        )
+        # bounded, so an abandoned source stops soon after
+        self._queue: queue.Queue[Message] = queue.Queue(maxsize=1000)
+        self._cancelled = threading.Event()
+
+    def _put(self, msg: Message) -> bool:
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(msg, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self) -> None:
+        try:
+            for item in iterate(self.producer):
+                if not self._put(item):
+                    logger.warning(f"{self.name}: stopped after timing out")
+                    return
+        except BaseException as e:
+            self._put(e)
+            return
+        self._put(_Done())
+
+    def _live(self) -> Iterator[FeedItem]:
+        thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        end = time.monotonic() + self.timeout
+        thread.start()
+        try:
+            while True:
+                try:
+                    msg = self._queue.get(timeout=max(0.0, end - time.monotonic()))
+                except queue.Empty:
+                    self.timed_out = True
+                    return
+                if isinstance(msg, _Done):
+                    return
+                if isinstance(msg, BaseException):
+                    raise msg
+                yield msg
+        finally:
+            # if this timed out, or the items stopped being used
+            self._cancelled.set()
+
+    def _replay(self, seen: Set[str]) -> Iterator[FeedItem]:
+        if not self.snapshot.exists():
+            logger.warning(f"{self.name}: timed out, and has no snapshot")
+            return
+        with self.snapshot.open() as f:
+            for _, item in read_spill(f):
+                if item.id not in seen:
+                    self.from_snapshot += 1
+                    yield item
+
+    @property
+    def status(self) -> str:
+        return "timed_out" if self.timed_out else "complete"
+
+    def __iter__(self) -> Iterator[FeedItem]:
+        seen: Set[str] = set()
+        partial = self.snapshot.with_suffix(".partial")
+        try:
+            with partial.open("w") as f:
+                writer = SpillWriter(f)
+                for item in self._live():
+                    seen.add(item.id)
+                    writer.write(self.name, item)
+                    yield item
+        except BaseException:
+            partial.unlink()
+            raise
+        if not self.timed_out:
+            os.replace(partial, self.snapshot)
+            return
+        partial.unlink()
+        logger.warning(
+            f"{self.name}: timed out after {self.timeout}s with {len(seen)} items"
+        )
+        yield from self._replay(seen)
@@ -0,0 +1,239 @@
+"""
+A local stand-in for the TMDB and GiantBomb APIs, which serves canned
+movie/tv/season/episode and game payloads, with configurable latency and
+404/429 rates
+
+Point the sources at it with TMDB_BASE_URL=http://127.0.0.1:8000/3 and
+GIANTBOMB_BASE_URL=http://127.0.0.1:8000/api
+
+python3 tests/fixtures/api_stub.py --port 8000 --latency 0.05 --not-found 0.05 --rate-limited 0.02
+
+Which IDs 404 only depends on the path, like items missing from the real
+APIs. 429s are random, so retries of the same request can succeed
+"""
+
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from types import TracebackType
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+import click
+
+GENRES = ["Drama", "Comedy", "Animation", "Documentary", "Science Fiction", "Crime"]
+
+
+def _seed(path: str) -> int:
+    return int.from_bytes(hashlib.sha1(path.encode()).digest()[:8], "big")
+
+
+def _date(r: random.Random) -> str:
+    return f"{r.randint(1960, 2023)}-{r.randint(1, 12):02d}-{r.randint(1, 28):02d}"
+
+
+def _image(r: random.Random, key: str, present: float = 0.9) -> Optional[str]:
+    return f"/{key}{r.getrandbits(48):x}.jpg" if r.random() < present else None
+
+
+def _movie(r: random.Random, m: Tuple[str, ...]) -> Dict[str, Any]:
+    return {
+        "id": int(m[0]),
+        "title": f"Movie {m[0]}",
+        "poster_path": _image(r, "p"),
+        "release_date": _date(r),
+        "genres": [{"name": g} for g in r.sample(GENRES, 2)],
+    }
+
+
+def _show(r: random.Random, m: Tuple[str, ...]) -> Dict[str, Any]:
+    return {
+        "id": int(m[0]),
+        "name": f"Show {m[0]}",
+        "poster_path": _image(r, "p"),
+        "first_air_date": _date(r),
+        "genres": [{"name": g} for g in r.sample(GENRES, 2)],
+    }
+
+
+def _season(r: random.Random, m: Tuple[str, ...]) -> Dict[str, Any]:
+    return {
+        "season_number": int(m[1]),
+        "poster_path": _image(r, "p", 0.7),
+        "air_date": _date(r),
+    }
+
+
+def _episode(r: random.Random, m: Tuple[str, ...]) -> Dict[str, Any]:
+    return {
+        "season_number": int(m[1]),
+        "episode_number": int(m[2]),
+        "still_path": _image(r, "s", 0.8),
+        "air_date": _date(r),
+    }
+
+
+def _game(r: random.Random, m: Tuple[str, ...]) -> Dict[str, Any]:
+    image = f"https://www.giantbomb.com/a/uploads/{r.getrandbits(32):x}"
+    return {
+        "error": "OK",
+        "status_code": 1,
+        "results": {
+            "id": int(m[0]),
+            "name": f"Game {m[0]}",
+            "original_release_date": _date(r),
+            "image": {
+                "medium_url": f"{image}/medium.jpg",
+                "thumb_url": f"{image}/thumb.jpg",
+            },
+        },
+    }
+
+
+Payload = Callable[[random.Random, Tuple[str, ...]], Dict[str, Any]]
+
+ROUTES: List[Tuple[re.Pattern[str], Payload]] = [
+    (re.compile(r"/3/movie/(\d+)"), _movie),
+    (re.compile(r"/3/tv/(\d+)/season/(\d+)/episode/(\d+)"), _episode),
+    (re.compile(r"/3/tv/(\d+)/season/(\d+)"), _season),
+    (re.compile(r"/3/tv/(\d+)"), _show),
+    (re.compile(r"/api/game/(\d+)/?"), _game),
+]
+
+TMDB_NOT_FOUND = {
+    "success": False,
+    "status_code": 34,
+    "status_message": "The resource you requested could not be found.",
+}
+GIANTBOMB_NOT_FOUND = {"error": "Object Not Found", "status_code": 101, "results": []}
+
+
+class StubServer:
+    def __init__(
+        self,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        not_found: float = 0.0,
+        rate_limited: float = 0.0,
+        retry_after: int = 1,
+    ) -> None:
+        self.latency = latency
+        self.not_found = not_found
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+        # response status -> count
+        self.statuses: Counter[int] = Counter()
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def respond(self, path: str) -> Tuple[int, Dict[str, str], Dict[str, Any]]:
+        """
+        Returns the status, headers and body for a request to this path
+        """
+        path = path.split("?")[0]
+        with self._lock:
+            limited = self._random.random() < self.rate_limited
+        if limited:
+            return 429, {"Retry-After": str(self.retry_after)}, {"status_code": 25}
+        for regex, payload in ROUTES:
+            if m := regex.fullmatch(path):
+                r = random.Random(_seed(path))
+                if r.random() < self.not_found:
+                    body = (
+                        GIANTBOMB_NOT_FOUND
+                        if path.startswith("/api")
+                        else TMDB_NOT_FOUND
+                    )
+                    return 404, {}, body
+                return 200, {}, payload(r, m.groups())
+        return 404, {}, TMDB_NOT_FOUND
+
+    def _handler(self) -> Type[BaseHTTPRequestHandler]:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if stub.latency > 0:
+                    time.sleep(stub.latency)
+                status, headers, body = stub.respond(self.path)
+                with stub._lock:
+                    stub.statuses[status] += 1
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> "StubServer":
+        """
+        Serves from a background thread
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.stop()
+
+
+@click.command()
+@click.option("--port", type=int, default=8000, show_default=True)
+@click.option("--latency", type=float, default=0.0, show_default=True, help="Seconds")
+@click.option(
+    "--not-found", type=float, default=0.0, show_default=True, help="Rate of 404s"
+)
+@click.option(
+    "--rate-limited", type=float, default=0.0, show_default=True, help="Rate of 429s"
+)
+def main(port: int, latency: float, not_found: float, rate_limited: float) -> None:
+    stub = StubServer(
+        port=port, latency=latency, not_found=not_found, rate_limited=rate_limited
+    )
+    click.echo(f"TMDB_BASE_URL={stub.url}/3 GIANTBOMB_BASE_URL={stub.url}/api")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        click.echo(f"responses: {dict(stub.statuses)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""
+Stand-ins for the HPI modules the sources import, which generate synthetic
+data instead of reading personal exports, so the sources can be run and
+profiled anywhere:
+
+PYTHONPATH=tests/fixtures/hpi MY_FEED_FIXTURE_SCALE=10 my_feed index -i mpv out.json
+
+This is a regular package, so it shadows any installed HPI completely.
+See benchmarks/bench_sources.py, which sets up the environment and times
+each source
+"""
@@ -0,0 +1,101 @@
+"""
+Helpers shared by the synthetic modules
+
+MY_FEED_FIXTURE_SCALE multiplies the number of items each module
+generates (default 1, which is a few thousand items per source), and
+MY_FEED_FIXTURE_DIR is where files (e.g. mpv history) are written to
+
+The data is generated once per process and is deterministic, so runs
+with the same scale can be compared
+"""
+
+import os
+import random
+import tempfile
+import importlib
+from pathlib import Path
+from functools import cache
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, List, TypeVar
+
+T = TypeVar("T")
+
+START = datetime(2015, 1, 1, tzinfo=timezone.utc)
+END = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+# every synthetic module, so all the data can be generated before timing anything
+MODULES = [
+    "my.mpv.history_daemon",
+    "my.trakt.export",
+    "my.grouvee.export",
+    "my.mal.export",
+    "my.listenbrainz.export",
+    "my.offline.listens",
+    "my.steam.scraper",
+    "my.runelite.screenshots",
+    "my.apple.privacy_export",
+]
+
+WORDS = (
+    "the night light river blue last world song heart city fire dream "
+    "stone house road time winter summer golden black silver ghost ocean "
+    "garden shadow moon star glass rain paper empire wolf"
+).split()
+
+
+def scale() -> float:
+    return float(os.environ.get("MY_FEED_FIXTURE_SCALE", 1))
+
+
+def count(base: int) -> int:
+    return max(1, round(base * scale()))
+
+
+def rng(name: str) -> random.Random:
+    # a separate stream for each module, so changing one doesn't change the others
+    return random.Random(f"my_feed_fixtures_{name}")
+
+
+def title(r: random.Random, words: int = 2) -> str:
+    return " ".join(r.choice(WORDS) for _ in range(words)).title()
+
+
+def timeline(r: random.Random, n: int) -> List[datetime]:
+    """
+    n increasing datetimes between START and END, at least a second apart
+    """
+    step = (END - START) / n
+    assert step > timedelta(seconds=2), f"too many items ({n}) for the timeline"
+    return [
+        (START + step * i + r.random() * (step / 2)).replace(microsecond=0)
+        for i in range(n)
+    ]
+
+
+@cache
+def fixture_dir() -> Path:
+    if "MY_FEED_FIXTURE_DIR" in os.environ:
+        path = Path(os.environ["MY_FEED_FIXTURE_DIR"])
+    else:
+        path = Path(tempfile.mkdtemp(prefix="my_feed_fixtures_"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+_datasets: List[Callable[[], Any]] = []
+
+
+def dataset(func: Callable[[], T]) -> Callable[[], T]:
+    """
+    Generates the data for a module the first time its requested
+    """
+    cached = cache(func)
+    _datasets.append(cached)
+    return cached
+
+
+def generate_all() -> None:
+    for module in MODULES:
+        importlib.import_module(module)
+    for func in _datasets:
+        func()
@@ -0,0 +1,56 @@
+"""
+Synthetic events from the apple privacy export, mostly game center achievements
+"""
+
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Union
+
+from .._synthetic import count, dataset, rng, timeline, title
+
+
+class GameAchievement(NamedTuple):
+    dt: datetime
+    percentage: int
+    game_name: str
+    title: str
+
+
+class Location(NamedTuple):
+    lng: float
+    lat: float
+    dt: datetime
+    name: str
+
+
+Event = Union[GameAchievement, Location]
+
+
+@dataset
+def _data() -> List[Event]:
+    r = rng("apple")
+    games = [title(r, 2) for _ in range(count(10))]
+    events: List[Event] = []
+    for when in timeline(r, count(300)):
+        if r.random() < 0.2:
+            events.append(
+                Location(
+                    lng=r.uniform(-180, 180),
+                    lat=r.uniform(-90, 90),
+                    dt=when,
+                    name=title(r),
+                )
+            )
+        else:
+            events.append(
+                GameAchievement(
+                    dt=when,
+                    percentage=r.choice([25, 50, 75, 100]),
+                    game_name=r.choice(games),
+                    title=title(r, 3),
+                )
+            )
+    return events
+
+
+def events() -> Iterator[Event]:
+    yield from _data()
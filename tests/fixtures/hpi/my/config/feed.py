@@ -0,0 +1,34 @@
+"""
+Feed configuration for the synthetic modules
+"""
+
+from typing import Dict, Iterator, List
+
+# every source which can run on synthetic data; chess, nextalbums and
+# facebook_spotify_listens need parsers which aren't stubbed. trakt and
+# grouvee make requests, see tests/fixtures/api_stub.py
+SOURCES: List[str] = [
+    "my_feed.sources.games.steam",
+    "my_feed.sources.games.osrs",
+    "my_feed.sources.games.game_center",
+    "my_feed.sources.games.grouvee",
+    "my_feed.sources.trakt.history",
+    "my_feed.sources.listens.history",
+    "my_feed.sources.mal.history",
+    "my_feed.sources.mal.deleted_history",
+    "my_feed.sources.mpv.history",
+    "my_feed.sources.offline_listens.history",
+]
+
+# XDG_MUSIC_DIR is allowed by the mpv source
+allow_mpv_prefixes: List[str] = []
+ignore_mpv_prefixes: List[str] = ["/home/user/Videos/Recordings"]
+
+broken_tags: List[str] = []
+
+# none by default, the benchmarks should time the whole source
+source_timeouts: Dict[str, float] = {}
+
+
+def sources() -> Iterator[str]:
+    yield from SOURCES
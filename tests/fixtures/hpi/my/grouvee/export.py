@@ -0,0 +1,56 @@
+"""
+Synthetic grouvee games. The source requests each game from GiantBomb,
+so GIANTBOMB_BASE_URL should point at tests/fixtures/api_stub.py
+"""
+
+from datetime import date, datetime
+from typing import Iterator, List, NamedTuple, Optional
+
+from .._synthetic import count, dataset, rng, timeline, title
+
+
+class Shelf(NamedTuple):
+    name: str
+    added: datetime
+    url: str
+
+
+class Game(NamedTuple):
+    grouvee_id: int
+    name: str
+    url: str
+    giantbomb_id: int
+    release_date: Optional[date]
+    rating: Optional[int]
+    shelves: List[Shelf]
+
+
+@dataset
+def _data() -> List[Game]:
+    r = rng("grouvee")
+    games = []
+    for i, added in enumerate(timeline(r, count(150))):
+        name = title(r, r.randint(1, 3))
+        slug = f"{i}-{name.lower().replace(' ', '-')}"
+        games.append(
+            Game(
+                grouvee_id=i,
+                name=name,
+                url=f"https://www.grouvee.com/games/{slug}/",
+                giantbomb_id=30_000 + i,
+                release_date=date(r.randint(1985, 2023), 1, 1),
+                rating=r.randint(1, 5) if r.random() < 0.7 else None,
+                shelves=[
+                    Shelf(
+                        name="Played",
+                        added=added,
+                        url="https://www.grouvee.com/user/shelves/played/",
+                    )
+                ],
+            )
+        )
+    return games
+
+
+def played() -> Iterator[Game]:
+    yield from _data()
@@ -0,0 +1,53 @@
+"""
+Synthetic listenbrainz scrobbles
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+from .._synthetic import count, dataset, rng, timeline, title
+
+
+class Listen(NamedTuple):
+    track_name: str
+    artist_name: str
+    listened_at: Optional[datetime]
+    musicbrainz_id: Optional[str]
+    release_name: Optional[str]
+    inserted_at: Optional[datetime]
+    username: str
+    metadata: Dict[str, Any]
+
+
+@dataset
+def _data() -> List[Listen]:
+    r = rng("listenbrainz")
+    albums = []
+    for a in range(count(80)):
+        artist = f"{title(r)} {a}"
+        for _ in range(r.randint(1, 3)):
+            album = title(r, 3)
+            albums.append(
+                (artist, album, [title(r, r.randint(1, 4)) for _ in range(10)])
+            )
+    listens = []
+    for listened_at in timeline(r, count(6000)):
+        artist, album, tracks = r.choice(albums)
+        listens.append(
+            Listen(
+                track_name=r.choice(tracks),
+                artist_name=artist,
+                # playing currently, or submitted without a timestamp
+                listened_at=listened_at if r.random() < 0.995 else None,
+                musicbrainz_id=None,
+                release_name=album if r.random() < 0.97 else None,
+                inserted_at=listened_at,
+                username="user",
+                metadata={},
+            )
+        )
+    return listens
+
+
+def history() -> Iterator[Listen]:
+    yield from _data()
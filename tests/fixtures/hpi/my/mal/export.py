@@ -0,0 +1,135 @@
+"""
+Synthetic MAL lists, with the attributes of malexport's AnimeData/MangaData
+the source uses
+
+Entries belong to MAL_USERNAME, and deleted entries have no API data
+"""
+
+import os
+from datetime import date, datetime, timedelta
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .._synthetic import count, dataset, rng, timeline, title
+
+
+@dataclass
+class Episode:
+    at: datetime
+    number: int
+
+
+Chapter = Episode
+
+
+@dataclass
+class APIEntry:
+    title: str
+    start_date: Optional[date]
+    main_picture: Dict[str, str]
+
+
+@dataclass
+class XMLEntry:
+    id: int
+    title: str
+    score: Optional[int]
+    status: str
+    finish_date: Optional[date]
+    episodes: int = 0
+    watched_episodes: int = 0
+    chapters: int = 0
+    read_chapters: int = 0
+
+
+@dataclass
+class AnimeData:
+    id: int
+    username: str
+    XMLData: XMLEntry
+    APIList: Optional[APIEntry]
+    history: List[Episode]
+
+
+MangaData = AnimeData
+
+
+def _entries(kind: str, n: int, parts: int, deleted: int) -> List[AnimeData]:
+    r = rng(f"mal_{kind}")
+    username = os.environ.get("MAL_USERNAME", "user")
+    lengths = [r.randint(1, parts) for _ in range(n)]
+    # everything is watched in one sweep through the timeline
+    when = iter(timeline(r, sum(lengths)))
+    entries = []
+    for i, length in enumerate(lengths):
+        name = title(r, r.randint(1, 4))
+        completed = r.random() < 0.8
+        done = length if completed else r.randint(0, length)
+        history = [Episode(at=next(when), number=p) for p in range(1, done + 1)]
+        # a rewatch of the last episode
+        if completed and r.random() < 0.05:
+            history.append(
+                Episode(at=history[-1].at + timedelta(seconds=1), number=length)
+            )
+        for _ in range(length - done):
+            next(when)
+        # newest first
+        history.reverse()
+        total, watched = (
+            ("episodes", "watched_episodes")
+            if kind == "anime"
+            else ("chapters", "read_chapters")
+        )
+        xml: Dict[str, Any] = {total: length, watched: done}
+        entries.append(
+            AnimeData(
+                id=i + 1,
+                username=username,
+                XMLData=XMLEntry(
+                    id=i + 1,
+                    title=name,
+                    score=r.randint(1, 10) if completed else None,
+                    status="Completed" if completed else "Watching",
+                    finish_date=None,
+                    **xml,
+                ),
+                APIList=(
+                    None
+                    if i >= n - deleted
+                    else APIEntry(
+                        title=name,
+                        start_date=date(r.randint(1980, 2023), 1, 1),
+                        main_picture={
+                            "medium": f"https://cdn.myanimelist.net/images/{kind}/{i}/{i}.jpg",
+                            "large": f"https://cdn.myanimelist.net/images/{kind}/{i}/{i}l.jpg",
+                        },
+                    )
+                ),
+                history=history,
+            )
+        )
+    return entries
+
+
+@dataset
+def _data() -> Tuple[List[AnimeData], List[MangaData]]:
+    return (
+        _entries("anime", count(400), 26, count(10)),
+        _entries("manga", count(120), 80, count(5)),
+    )
+
+
+def anime() -> Iterator[AnimeData]:
+    yield from (a for a in _data()[0] if a.APIList is not None)
+
+
+def manga() -> Iterator[MangaData]:
+    yield from (m for m in _data()[1] if m.APIList is not None)
+
+
+def deleted_anime() -> Iterator[AnimeData]:
+    yield from (a for a in _data()[0] if a.APIList is None)
+
+
+def deleted_manga() -> Iterator[MangaData]:
+    yield from (m for m in _data()[1] if m.APIList is None)
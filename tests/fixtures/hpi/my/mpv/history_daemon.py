@@ -0,0 +1,96 @@
+"""
+Synthetic mpv history, written as JSON files like the daemon does (one file
+per mpv instance), so the source's incremental parsing works on them
+
+Most listens are songs from a library under XDG_MUSIC_DIR with complete
+metadata, the rest are videos, streams and ignored recordings
+"""
+
+import os
+import json
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterator, List, Optional
+
+from mpv_history_daemon.events import Media
+
+from my.utils.input_source import InputSource
+from .._synthetic import count, dataset, fixture_dir, rng, timeline, title
+
+LISTENS_PER_FILE = 200
+
+
+def _music_dir() -> str:
+    music_dir = os.environ.get("XDG_MUSIC_DIR", str(fixture_dir() / "Music"))
+    os.makedirs(music_dir, exist_ok=True)
+    return music_dir
+
+
+@dataset
+def inputs() -> List[Path]:
+    r = rng("mpv")
+    music_dir = _music_dir()
+    library = []
+    for a in range(count(60)):
+        artist = f"{title(r)} {a}"
+        for b in range(r.randint(1, 4)):
+            album = title(r, 3)
+            for n in range(1, r.randint(6, 14)):
+                song = title(r, r.randint(1, 4))
+                library.append(
+                    (
+                        f"{music_dir}/{artist}/{album}/{n:02d} - {song}.mp3",
+                        {"title": song, "album": album, "artist": artist},
+                        float(r.randint(120, 420)),
+                    )
+                )
+
+    rows: List[List[Any]] = []
+    for end in timeline(r, count(6000)):
+        kind = r.random()
+        if kind < 0.9:
+            path, metadata, duration = r.choice(library)
+            rows.append([path, False, duration, metadata, end.timestamp()])
+        elif kind < 0.95:
+            path = f"/home/user/Videos/{title(r, 3)}.mkv"
+            rows.append([path, False, 1500.0, {}, end.timestamp()])
+        elif kind < 0.98:
+            path = f"https://www.youtube.com/watch?v={r.getrandbits(40):x}"
+            rows.append([path, True, None, {}, end.timestamp()])
+        else:
+            path = f"/home/user/Videos/Recordings/{end.date()}.mp3"
+            rows.append([path, False, 60.0, {}, end.timestamp()])
+
+    out = fixture_dir() / "mpv"
+    out.mkdir(exist_ok=True)
+    paths = []
+    for i in range(0, len(rows), LISTENS_PER_FILE):
+        chunk = rows[i : i + LISTENS_PER_FILE]
+        path = out / f"{int(chunk[0][-1])}.json"
+        path.write_text(json.dumps(chunk))
+        # finished files are older than the last thing played in them
+        os.utime(path, (chunk[-1][-1], chunk[-1][-1]))
+        paths.append(path)
+    return paths
+
+
+def _media(row: List[Any]) -> Media:
+    path, is_stream, duration, metadata, end_ts = row
+    end = datetime.fromtimestamp(end_ts, tz=timezone.utc)
+    return Media(
+        path=path,
+        is_stream=is_stream,
+        start_time=end - timedelta(seconds=duration or 60),
+        end_time=end,
+        pause_duration=0.0,
+        media_duration=duration,
+        media_title=metadata.get("title"),
+        actions=[],
+        metadata=metadata,
+    )
+
+
+def history(from_paths: Optional[InputSource] = None) -> Iterator[Media]:
+    for path in (from_paths or inputs)():
+        for row in json.loads(Path(path).read_text()):
+            yield _media(row)
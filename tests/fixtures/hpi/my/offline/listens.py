@@ -0,0 +1,28 @@
+"""
+Synthetic listens, from when I wasn't scrobbling
+"""
+
+from datetime import datetime
+from typing import Iterator, List, NamedTuple
+
+from .._synthetic import count, dataset, rng, timeline, title
+
+
+class Listen(NamedTuple):
+    when: datetime
+    track: str
+    artist: str
+    album: str
+
+
+@dataset
+def _data() -> List[Listen]:
+    r = rng("offline_listens")
+    return [
+        Listen(when=when, track=title(r, 2), artist=title(r, 2), album=title(r, 3))
+        for when in timeline(r, count(500))
+    ]
+
+
+def history() -> Iterator[Listen]:
+    yield from _data()
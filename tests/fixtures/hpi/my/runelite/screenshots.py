@@ -0,0 +1,55 @@
+"""
+Synthetic runelite screenshots, with naive datetimes like the screenshot
+filenames. The images themselves aren't created
+"""
+
+from pathlib import Path
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Union
+
+from .._synthetic import count, dataset, fixture_dir, rng, timeline, title
+
+
+class Level(NamedTuple):
+    skill: str
+    level: int
+
+
+Description = Union[Level, str]
+
+
+class Screenshot(NamedTuple):
+    dt: datetime
+    path: Path
+    screenshot_type: str
+    description: Description
+
+
+SKILLS = ["Attack", "Strength", "Defence", "Magic", "Fishing", "Woodcutting"]
+TYPES = ["Levels", "Boss Kills", "Clue Scroll Rewards", "Pets", "Collection Log"]
+
+
+@dataset
+def _data() -> List[Screenshot]:
+    r = rng("runelite")
+    levels = {skill: 1 for skill in SKILLS}
+    shots = []
+    for when in timeline(r, count(600)):
+        stype = r.choice(TYPES)
+        description: Description
+        if stype == "Levels":
+            skill = r.choice(SKILLS)
+            levels[skill] = min(levels[skill] + 1, 99)
+            description = Level(skill=skill, level=levels[skill])
+        else:
+            description = f"{title(r)}({r.randint(1, 500)})"
+        dt = when.replace(tzinfo=None)
+        path = fixture_dir() / "runelite" / stype / f"{description} {dt}.png"
+        shots.append(
+            Screenshot(dt=dt, path=path, screenshot_type=stype, description=description)
+        )
+    return shots
+
+
+def screenshots() -> Iterator[Screenshot]:
+    yield from _data()
@@ -0,0 +1,53 @@
+"""
+Synthetic steam achievements
+"""
+
+from datetime import date, datetime
+from typing import Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+from .._synthetic import count, dataset, rng, timeline, title
+
+
+class Achievement(NamedTuple):
+    title: str
+    description: str
+    game_name: str
+    achieved: bool
+    achieved_on: Optional[datetime]
+    icon: Optional[str]
+
+
+Results = Iterator[Union[Achievement, Exception]]
+
+
+@dataset
+def _data() -> List[Union[Achievement, Exception]]:
+    r = rng("steam")
+    games = [f"{title(r, r.randint(1, 3))} {i}" for i in range(count(40))]
+    results: List[Union[Achievement, Exception]] = []
+    # ids use the date and the title, so those have to be unique
+    seen: Set[Tuple[date, str]] = set()
+    for i, when in enumerate(timeline(r, count(800))):
+        if r.random() < 0.01:
+            results.append(RuntimeError(f"Could not parse achievement {i}"))
+            continue
+        name = title(r, 3)
+        while (when.date(), name) in seen:
+            name = title(r, 3)
+        seen.add((when.date(), name))
+        results.append(
+            Achievement(
+                title=name,
+                description=title(r, 6),
+                game_name=r.choice(games),
+                achieved=True,
+                # achievements from before steam saved the unlock time
+                achieved_on=when if r.random() < 0.98 else None,
+                icon=f"https://steamcdn-a.akamaihd.net/steamcommunity/public/images/apps/{i}.jpg",
+            )
+        )
+    return results
+
+
+def achievements() -> Results:
+    yield from _data()
@@ -0,0 +1,14 @@
+"""
+Timezones for synthetic data: a few months abroad each year, home otherwise
+"""
+
+from datetime import datetime, tzinfo
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+HOME = ZoneInfo("America/Los_Angeles")
+ABROAD = ZoneInfo("Europe/London")
+
+
+def get_tz(dt: datetime) -> Optional[tzinfo]:
+    return ABROAD if dt.month in (6, 7) else HOME
@@ -0,0 +1,118 @@
+"""
+Synthetic trakt history and ratings, using the traktexport models
+
+Most movies and shows have a TMDB id, which the source requests images
+and release dates for, so TMDB_BASE_URL should point at
+tests/fixtures/api_stub.py
+"""
+
+from typing import Iterator, List, Optional, Tuple, Union
+
+import traktexport.dal as D
+
+from .._synthetic import count, dataset, rng, timeline, title
+
+
+def _ids(trakt_id: int, slug: Optional[str], tmdb_id: Optional[int]) -> D.SiteIds:
+    return D.SiteIds(
+        trakt_id=trakt_id,
+        trakt_slug=slug,
+        imdb_id=None,
+        tmdb_id=tmdb_id,
+        tvdb_id=None,
+        tvrage_id=None,
+    )
+
+
+@dataset
+def _data() -> Tuple[List[D.HistoryEntry], List[D.Rating]]:
+    r = rng("trakt")
+    trakt_id = 0
+
+    movies: List[D.Movie] = []
+    for i in range(count(400)):
+        trakt_id += 1
+        name = title(r, r.randint(1, 4))
+        year = r.randint(1960, 2023)
+        slug = f"{name.lower().replace(' ', '-')}-{year}-{i}"
+        tmdb_id = 10_000 + i if r.random() < 0.95 else None
+        movies.append(D.Movie(title=name, year=year, ids=_ids(trakt_id, slug, tmdb_id)))
+
+    episodes: List[D.Episode] = []
+    shows: List[D.Show] = []
+    for i in range(count(50)):
+        trakt_id += 1
+        name = title(r, r.randint(1, 3))
+        year = r.randint(1990, 2023)
+        show = D.Show(
+            title=name,
+            year=year,
+            ids=_ids(
+                trakt_id,
+                f"{name.lower().replace(' ', '-')}-{i}",
+                50_000 + i if r.random() < 0.95 else None,
+            ),
+        )
+        shows.append(show)
+        for season in range(1, r.randint(2, 6)):
+            for episode in range(1, r.randint(8, 14)):
+                trakt_id += 1
+                episodes.append(
+                    D.Episode(
+                        title=title(r, 3),
+                        season=season,
+                        episode=episode,
+                        ids=_ids(trakt_id, None, None),
+                        show=show,
+                    )
+                )
+
+    # watch episodes in order, with movies in between
+    r.shuffle(movies)
+    media: List[Union[D.Movie, D.Episode]] = []
+    ep = iter(episodes)
+    for m in movies:
+        media.extend(e for _, e in zip(range(r.randint(0, 12)), ep))
+        media.append(m)
+    media.extend(ep)
+    # rewatches
+    media.extend(r.choice(movies) for _ in range(len(movies) // 10))
+
+    history: List[D.HistoryEntry] = []
+    for i, (m, watched_at) in enumerate(zip(media, timeline(r, len(media)))):
+        action = "watch" if r.random() < 0.9 else r.choice(["scrobble", "checkin"])
+        history.append(
+            D.HistoryEntry(
+                history_id=1_000_000 + i,
+                watched_at=watched_at,
+                action=action,
+                media_type="movie" if isinstance(m, D.Movie) else "episode",
+                media_data=m,
+            )
+        )
+    # newest first, like the export
+    history.reverse()
+
+    rated: List[Union[D.Movie, D.Show, D.Episode]] = []
+    rated.extend(r.sample(movies, len(movies) // 2))
+    rated.extend(r.sample(shows, len(shows) // 2))
+    # episode ratings aren't used by the source, but are in the export
+    rated.extend(r.sample(episodes, len(episodes) // 20))
+    ratings = [
+        D.Rating(
+            rated_at=rated_at,
+            rating=r.randint(1, 10),
+            media_type=type(m).__name__.lower(),
+            media_data=m,
+        )
+        for m, rated_at in zip(rated, timeline(r, len(rated)))
+    ]
+    return history, ratings
+
+
+def history() -> Iterator[D.HistoryEntry]:
+    yield from _data()[0]
+
+
+def ratings() -> Iterator[D.Rating]:
+    yield from _data()[1]
@@ -0,0 +1,4 @@
+from pathlib import Path
+from typing import Callable, Iterable
+
+InputSource = Callable[[], Iterable[Path]]
@@ -37,3 +37,989 @@ image_url_regex: .*up_2009_.*
             Blur(Attr.IMAGE_REGEX, r".*up_2009_.*"),
         }
     )
+
+
+def test_shard_writer(tmp_path) -> None:
+    import json
+    import hashlib
+    from datetime import datetime, timezone
+
+    from my_feed.sources.model import FeedItem
+    from my_feed.shards import ShardWriter, MANIFEST
+
+    when = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    with ShardWriter(tmp_path, replace=True) as writer:
+        writer.write(
+            "my_feed.sources.mal.history",
+            FeedItem(id="anime_entry_1", title="a", ftype="anime", when=when),
+        )
+        writer.write(
+            "my_feed.sources.games.osrs",
+            FeedItem(id="osrs_1", title="b", ftype="osrs_achievement", when=when),
+        )
+        writer.write(
+            "my_feed.sources.mal.history",
+            FeedItem(id="anime_entry_2", title="c", ftype="anime", when=when),
+        )
+
+    manifest = json.loads((tmp_path / MANIFEST).read_text())
+    assert manifest["replace"] is True
+    counts = {s["name"]: s["count"] for s in manifest["sources"]}
+    assert counts == {
+        "my_feed.sources.mal.history": 2,
+        "my_feed.sources.games.osrs": 1,
+    }
+    for shard in manifest["sources"]:
+        contents = (tmp_path / shard["file"]).read_bytes()
+        assert hashlib.sha256(contents).hexdigest() == shard["sha256"]
+        assert len(contents.splitlines()) == shard["count"]
+
+
+def test_daemon(tmp_path) -> None:
+    import os
+    import threading
+    from datetime import datetime, timezone
+
+    from my_feed.sources.model import FeedItem
+    from my_feed.daemon import Daemon, send_trigger
+
+    watched = tmp_path / "mpv.json"
+    watched.write_text("[]")
+    ran = []
+
+    def produce(allow, on_done):
+        ran.append(allow)
+        when = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        yield "my_feed.sources.mpv.history", FeedItem(
+            id="mpv_1", title="a", ftype="listen", when=when
+        )
+
+    daemon = Daemon(
+        produce, output_dir=tmp_path / "out", watch={"mpv": [str(watched)]}
+    )
+    assert daemon.changed() == []
+    assert daemon.changed() == []
+    os.utime(watched, ns=(0, 0))
+    assert daemon.changed() == ["mpv"]
+
+    result = daemon.run(["mpv"])
+    assert result.error is None and result.items == 1
+    assert result.sources == ["my_feed.sources.mpv.history"]
+    assert result.output is not None and (result.output / "manifest.json").exists()
+
+    sock = tmp_path / "feed.sock"
+    threading.Thread(target=daemon.serve, args=(sock,), daemon=True).start()
+    for _ in range(100):
+        if sock.exists():
+            break
+        threading.Event().wait(0.05)
+    result = send_trigger(sock, [])
+    assert result.items == 1
+    assert ran == [["mpv"], []]
+
+
+from datetime import datetime, timezone
+
+from my_feed.sources.model import FeedItem
+
+
+def make_item(i: int) -> FeedItem:
+    """
+    A listen with an ID and timestamp from i, for tests which need lots of items
+    """
+    return FeedItem(
+        id=f"item_{i}",
+        title=f"Item {i}",
+        ftype="listen",
+        when=datetime.fromtimestamp(1_600_000_000 + i, tz=timezone.utc),
+    )
+
+
+def test_daemon_timed_out_source(tmp_path) -> None:
+    import json
+    import time
+
+    from my_feed.daemon import Daemon
+    from my_feed.report import SourceResult
+    from my_feed.watchdog import Watchdog
+
+    def stuck():
+        yield make_item(1)
+        time.sleep(10)
+        yield make_item(2)
+
+    def produce(allow, on_done):
+        yield "complete", make_item(0)
+        on_done(SourceResult(name="complete", status="complete", items=1, took=0.0))
+        w = Watchdog("stuck", stuck, 0.2, snapshot_dir=tmp_path)
+        for i in w:
+            yield "stuck", i
+        on_done(SourceResult(name="stuck", status=w.status, items=1, took=0.2))
+
+    daemon = Daemon(produce, output_dir=tmp_path / "out", watch={})
+    result = daemon.run([])
+    assert result.error is None and result.items == 1
+    assert result.output is not None
+    # replacing 'stuck' with what it got to would delete the rest of its items
+    manifest = json.loads((result.output / "manifest.json").read_text())
+    assert manifest["replace"] is True
+    assert [s["name"] for s in manifest["sources"]] == ["complete"]
+    assert sorted(p.name for p in result.output.iterdir()) == [
+        "complete.json",
+        "manifest.json",
+    ]
+
+
+# modules which should only be imported once a source that needs them is run
+HEAVY_MODULES = [
+    "mutagen",
+    "mpv_history_daemon",
+    "traktexport",
+    "requests",
+    "url_cache",
+    "my_feed.sources.mpv",
+    "my_feed.sources.trakt",
+    "my_feed.sources.games",
+]
+
+
+def test_cli_import_budget() -> None:
+    import os
+    import sys
+    import json
+    import subprocess
+
+    code = """
+import sys, time, json
+start = time.perf_counter()
+import my_feed.__main__
+from my_feed.registry import Source, SOURCES
+names = [Source(s).name for s in SOURCES]
+print(json.dumps({"took": time.perf_counter() - start, "modules": sorted(sys.modules)}))
+"""
+    proc = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    result = json.loads(proc.stdout)
+    imported = [
+        m
+        for m in result["modules"]
+        if any(m == h or m.startswith(h + ".") for h in HEAVY_MODULES)
+    ]
+    assert imported == []
+    budget = float(os.environ.get("MY_FEED_IMPORT_BUDGET", 1.0))
+    assert result["took"] < budget, f"importing the CLI took {result['took']:.3f}s"
+
+
+def test_source_load() -> None:
+    import pytest
+
+    from my_feed.registry import Source
+    from my_feed.sources.common import FeedError
+    from my_feed.shards import shard_filename
+
+    src = Source("my_feed.shards.shard_filename")
+    assert not src.loaded
+    assert src.matches(allow=["shards"], deny=[])
+    assert not src.matches(allow=[], deny=["shards"])
+    assert src.load() is shard_filename
+
+    with pytest.raises(FeedError):
+        Source("my_feed.shards.missing").load()
+
+
+def test_feed_item_from_dict() -> None:
+    import json
+    from datetime import datetime, date, timezone
+
+    from my_feed.sources.model import FeedItem
+
+    item = FeedItem(
+        id="mpv_1672531200.5",
+        title="Song",
+        ftype="listen",
+        when=datetime(2023, 1, 1, tzinfo=timezone.utc),
+        creator="Artist",
+        subtitle="Album",
+        release_date=date(2022, 5, 6),
+        flags=["i_blur"],
+        score=7.5,
+    )
+    parsed = FeedItem.from_dict(json.loads(item.to_json()))
+    assert parsed == item
+    assert parsed.to_json() == item.to_json()
+
+
+def test_mpv_processed_files(tmp_path, monkeypatch) -> None:
+    import os
+    from datetime import datetime, timezone
+
+    from my_feed.sources import mpv
+    from my_feed.sources.model import FeedItem
+
+    monkeypatch.setenv("MY_FEED_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("HPIDATA", str(tmp_path))
+    history = tmp_path / "history"
+    history.mkdir()
+    parsed = []
+
+    class _NoFixes:
+        def refresh(self) -> None:
+            pass
+
+        def _write(self) -> None:
+            pass
+
+    def parse_history(from_paths, allow_before, memo, state):
+        # each line in a history file is a listen
+        for path in from_paths():
+            parsed.append(path.name)
+            for line in path.read_text().split():
+                yield FeedItem(
+                    id=f"mpv_{line}",
+                    title=line,
+                    ftype="listen",
+                    when=datetime.fromtimestamp(int(line), tz=timezone.utc),
+                )
+
+    monkeypatch.setattr(mpv, "inputs", lambda: sorted(history.iterdir()))
+    monkeypatch.setattr(mpv, "_parse_history", parse_history)
+    monkeypatch.setattr(mpv, "_json_data", _NoFixes)
+
+    def run():
+        parsed.clear()
+        # every file is old enough to be saved
+        return [i.id for i in mpv._incremental_history(allow_before=2**40)]
+
+    (history / "a.json").write_text("1 2")
+    (history / "b.json").write_text("3")
+    (history / "c.json").write_text("4")
+    assert run() == ["mpv_1", "mpv_2", "mpv_3", "mpv_4"]
+    assert parsed == ["a.json", "b.json", "c.json"]
+
+    # nothing changed, so everything is replayed from the cache
+    assert run() == ["mpv_1", "mpv_2", "mpv_3", "mpv_4"]
+    assert parsed == []
+
+    # b is resized, c is touched, a is deleted
+    (history / "b.json").write_text("3 5")
+    st = (history / "c.json").stat()
+    os.utime(history / "c.json", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    (history / "a.json").unlink()
+    assert run() == ["mpv_3", "mpv_5", "mpv_4"]
+    assert parsed == ["b.json", "c.json"]
+
+    processed = mpv.ProcessedFiles(tmp_path / "cache" / "mpv")
+    assert sorted(os.path.basename(p) for p in processed.files) == ["b.json", "c.json"]
+    # the manifest, and the items saved for b and c
+    assert len(list((tmp_path / "cache" / "mpv").iterdir())) == 3
+
+
+def test_mpv_metadata_memo(monkeypatch) -> None:
+    import pytest
+    from types import SimpleNamespace
+    from datetime import datetime, timezone
+
+    from my_feed.sources import mpv
+    from my_feed.sources.common import FeedBackgroundError
+
+    calls = []
+    # path -> metadata, anything else prompts
+    answers = {"/a.mp3": ("A", "Album", "Artist")}
+    background = {"on": False}
+
+    def resolve_metadata(media):
+        calls.append(media.path)
+        if media.path in answers:
+            return answers[media.path]
+        if background["on"]:
+            raise FeedBackgroundError("Running in the background, can't prompt")
+        # what was entered is saved as a fix for this path
+        mpv._prompts += 1
+        answers[media.path] = ("Fixed", "Album", "Artist")
+        return answers[media.path]
+
+    def media(path, duration=180.0, metadata=None, when=1_600_000_000):
+        return SimpleNamespace(
+            path=path,
+            media_duration=duration,
+            metadata=metadata or {},
+            end_time=datetime.fromtimestamp(when, tz=timezone.utc),
+            is_stream=False,
+        )
+
+    monkeypatch.setattr(mpv, "_resolve_metadata", resolve_metadata)
+    monkeypatch.setattr(mpv, "_prompts", 0)
+    memo = mpv.MetadataMemo()
+
+    for _ in range(3):
+        assert memo.resolve(media("/a.mp3")) == ("A", "Album", "Artist")
+    # rounded to the same duration
+    memo.resolve(media("/a.mp3", duration=180.04))
+    assert (calls, memo.hits, memo.misses) == (["/a.mp3"], 3, 1)
+    # a different duration or metadata blob is resolved again
+    memo.resolve(media("/a.mp3", duration=181.0))
+    memo.resolve(media("/a.mp3", metadata={"title": "A"}))
+    assert (memo.hits, memo.misses) == (3, 3)
+
+    # prompting may have saved a fix, so everything is resolved again
+    calls.clear()
+    assert memo.resolve(media("/b.mp3")) == ("Fixed", "Album", "Artist")
+    assert memo.resolved == {}
+    memo.resolve(media("/a.mp3"))
+    memo.resolve(media("/b.mp3"))
+    assert calls == ["/b.mp3", "/a.mp3", "/b.mp3"]
+
+    # in the background, a song which needs a prompt is only tried once
+    background["on"] = True
+    calls.clear()
+    for _ in range(2):
+        with pytest.raises(FeedBackgroundError):
+            memo.resolve(media("/c.mp3"))
+    assert calls == ["/c.mp3"]
+
+    plays = [
+        media("/a.mp3", when=1_600_000_000),
+        media("/c.mp3", when=1_600_000_100),
+        media("/a.mp3", when=1_600_000_200),
+        # still playing
+        media("/a.mp3", when=1_700_000_000),
+    ]
+    monkeypatch.setattr(mpv, "mpv_history", lambda from_paths: plays)
+    monkeypatch.setattr(
+        mpv, "_matcher", lambda: SimpleNamespace(is_allowed=lambda media: True)
+    )
+    state = mpv._ParseState()
+    items = list(mpv._parse_history(None, 1_650_000_000, memo, state))
+    assert [i.id for i in items] == ["mpv_1600000000.0", "mpv_1600000200.0"]
+    assert state.skipped == 2
+
+
+def test_prefix_trie() -> None:
+    from my_feed.sources.mpv import PrefixTrie
+
+    prefixes = ["/home/sean/Music", "/home/sean/Vid", "/mnt/", "relative/dir", ""]
+    paths = [
+        "/home/sean/Music/a.mp3",
+        "/home/sean/Music2/a.mp3",
+        "/home/sean/Videos/a.mkv",
+        "/home/sean/Mus",
+        "/home/sean",
+        "/mnt",
+        "/mnt/",
+        "/mnt/drive/a.mp3",
+        "relative/directory/a.mp3",
+        "relative",
+        "",
+    ]
+    for without_empty in (prefixes[:-1], prefixes):
+        trie = PrefixTrie(without_empty)
+        for path in paths:
+            expected = any(path.startswith(p) for p in without_empty)
+            assert trie.matches(path) == expected, path
+
+
+def test_http_client(tmp_path, monkeypatch) -> None:
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import pytest
+
+    from my_feed.http import APIClient, Limit, QuotaExceeded
+
+    monkeypatch.setenv("MY_FEED_CACHE_DIR", str(tmp_path))
+    body = b'{"ok":true}'
+    # the first two requests fail, and should be retried
+    statuses = [429, 503]
+    retry_after = ["0"]
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            status = statuses.pop(0) if statuses else 200
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", retry_after[0])
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: object) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        api = APIClient(
+            "stub", limit=Limit(rate=20, burst=3, per_hour=10), backoff=0.01
+        )
+        url = f"http://127.0.0.1:{server.server_port}/"
+        resp = api.get(url)
+        assert resp.status_code == 200 and resp.json() == {"ok": True}
+        assert api.metrics.retries == 2
+        # each attempt used a token and counted towards the quota
+        assert api.metrics.requests == 3
+        assert api.quota is not None and api.quota.remaining() == 7
+        assert api.metrics.waited == 0
+
+        # no tokens left, so this waits for the bucket to refill
+        api.get(url)
+        assert api.metrics.requests == 4
+        assert api.metrics.waited > 0.01
+        assert api.metrics.bytes == 4 * len(body)
+        assert api.metrics.statuses == {200: 2, 429: 1, 503: 1}
+
+        # gives up, and returns the last response
+        statuses.extend([503] * 4)
+        api.retries = 1
+        assert api.get(url).status_code == 503
+        assert statuses == [503, 503]
+
+        # doesn't wait a day to retry
+        statuses[:] = [429, 200]
+        retry_after[0] = "86400"
+        assert api.get(url).status_code == 429
+        assert statuses == [200]
+
+        # retries stop once the hourly quota is used up, and nothing more is sent
+        statuses[:] = [503] * 4
+        api = APIClient(
+            "quota", limit=Limit(rate=20, burst=3, per_hour=2), backoff=0.01
+        )
+        assert api.get(url).status_code == 503
+        assert api.metrics.requests == 2 and len(statuses) == 2
+        with pytest.raises(QuotaExceeded):
+            api.get(url)
+        assert len(statuses) == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_hourly_quota(tmp_path) -> None:
+    import json
+    import time
+
+    from my_feed.http import HourlyQuota
+
+    path = tmp_path / "quota.json"
+    # one request from over an hour ago, which shouldn't count
+    path.write_text(json.dumps([time.time() - 4000, time.time() - 10]))
+    quota = HourlyQuota(path, per_hour=3)
+    assert quota.remaining() == 2
+    quota.record()
+    assert quota.remaining() == 1
+
+    # persisted, so a new run sees the same quota
+    assert HourlyQuota(path, per_hour=3).remaining() == 1
+    quota.record()
+    quota.record()
+    assert HourlyQuota(path, per_hour=3).remaining() == 0
+
+
+def test_grouvee_missing_giantbomb_data(tmp_path, monkeypatch) -> None:
+    import sys
+    from pathlib import Path
+    from types import ModuleType, SimpleNamespace
+    from datetime import date, datetime, timezone
+
+    from my_feed import http
+    from my_feed.sources import games
+
+    sys.path.insert(0, str(Path(__file__).parent / "fixtures"))
+    from api_stub import StubServer  # type: ignore[import]
+
+    played = [
+        SimpleNamespace(
+            grouvee_id=i,
+            name=f"Game {i}",
+            url=f"https://www.grouvee.com/games/{i}/",
+            giantbomb_id=100 + i,
+            release_date=date(2000 + i, 1, 1),
+            rating=None,
+            shelves=[SimpleNamespace(added=datetime(2023, 1, i, tzinfo=timezone.utc))],
+        )
+        for i in range(1, 4)
+    ]
+    export = ModuleType("my.grouvee.export")
+    export.played = lambda: iter(played)  # type: ignore[attr-defined]
+    monkeypatch.setitem(sys.modules, "my.grouvee", ModuleType("my.grouvee"))
+    monkeypatch.setitem(sys.modules, "my.grouvee.export", export)
+
+    monkeypatch.setenv("MY_FEED_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("GIANTBOMB_CACHE_DIR", str(tmp_path / "giantbomb"))
+    monkeypatch.setenv("GIANTBOMB_API_KEY", "key")
+    monkeypatch.setenv("USER", "user")
+    monkeypatch.setitem(
+        http.LIMITS, "giantbomb", http.Limit(rate=100, burst=10, per_hour=200)
+    )
+    monkeypatch.setattr(http, "_clients", {})
+    monkeypatch.setattr(games, "GIANTBOMB_PREFETCH_LIMIT", 2)
+    games.gb_cache.cache_clear()
+
+    with StubServer(not_found=1.0) as stub:
+        monkeypatch.setattr(games, "GIANTBOMB_BASE_URL", f"{stub.url}/api")
+        try:
+            # games giantbomb doesn't have use the grouvee data, and the
+            # one which wasn't requested yet is held back
+            items = list(games.grouvee())
+            assert [(i.id, i.release_date, i.image_url) for i in items] == [
+                (f"grouvee_{i}", date(2000 + i, 1, 1), None) for i in range(1, 3)
+            ]
+            assert stub.statuses == {404: 2}
+            # the 404s are cached, so only the last game is requested
+            items = list(games.grouvee())
+            assert stub.statuses == {404: 3}
+            assert [i.id for i in items] == [f"grouvee_{i}" for i in range(1, 4)]
+
+            # a new game, which giantbomb has
+            stub.not_found = 0.0
+            played.append(
+                SimpleNamespace(
+                    **{**vars(played[0]), "grouvee_id": 4, "giantbomb_id": 104}
+                )
+            )
+            items = list(games.grouvee())
+            assert stub.statuses == {404: 3, 200: 1}
+            assert items[-1].image_url is not None
+            assert items[-1].release_date != date(2001, 1, 1)
+
+            # a reindex sends games over the quota without giantbomb data
+            monkeypatch.setenv("FEED_REINDEX", "1")
+            monkeypatch.setattr(games, "GIANTBOMB_PREFETCH_LIMIT", 1)
+            for gid in (5, 6):
+                played.append(
+                    SimpleNamespace(
+                        **{
+                            **vars(played[0]),
+                            "grouvee_id": gid,
+                            "giantbomb_id": 100 + gid,
+                        }
+                    )
+                )
+            items = list(games.grouvee())
+            assert stub.statuses == {404: 3, 200: 2}
+            assert [i.id for i in items][-2:] == ["grouvee_5", "grouvee_6"]
+            assert items[-2].image_url is not None and items[-1].image_url is None
+        finally:
+            games.gb_cache.cache_clear()
+
+
+def test_localizer() -> None:
+    from datetime import datetime, timezone, timedelta
+
+    from my_feed.tz import Localizer
+
+    looked_up = []
+    tz = timezone(timedelta(hours=-8))
+
+    def get_tz(dt: datetime) -> timezone:
+        looked_up.append(dt.date())
+        return tz
+
+    localizer = Localizer("test", get_tz=get_tz)
+    dts = [
+        datetime(2023, 1, 2, 20),
+        datetime(2023, 1, 1, 9),
+        datetime(2023, 1, 2, 8),
+        datetime(2023, 1, 1, 12, tzinfo=timezone.utc),
+    ]
+    localized = localizer.localize_all(dts)
+    assert [d.tzinfo for d in localized] == [tz, tz, tz, timezone.utc]
+    assert [d.replace(tzinfo=None) for d in localized[:3]] == dts[:3]
+    # one lookup per day, in sorted order
+    assert looked_up == [datetime(2023, 1, 1).date(), datetime(2023, 1, 2).date()]
+    assert localizer.calls == 4 and localizer.lookups == 2
+
+
+def test_thumbnails(tmp_path) -> None:
+    import os
+    import pytest
+
+    Image = pytest.importorskip("PIL.Image")
+
+    from my_feed.thumbnails import generate, ThumbnailIndex
+
+    images = []
+    for i, color in enumerate(["red", "blue", "red"]):
+        path = tmp_path / f"screenshot_{i}.png"
+        Image.new("RGBA", (1200, 800), color).save(path)
+        images.append(path)
+    out_dir = tmp_path / "thumbs"
+    out_dir.mkdir()
+
+    # the two red screenshots have the same contents, so share a thumbnail
+    stats = generate(images, out_dir=out_dir, size=300, workers=2)
+    # both red ones may be encoded at once, so either could count as created
+    assert stats.created + stats.existing == 3 and stats.failed == 0
+    index = ThumbnailIndex(out_dir)
+    names = [index.lookup(p) for p in images]
+    assert names[0] == names[2] and len(set(names)) == 2
+    with Image.open(out_dir / names[0]) as thumb:
+        assert thumb.format == "WEBP" and max(thumb.size) == 300
+
+    # unchanged images aren't read again
+    assert generate(images, out_dir=out_dir, size=300).unchanged == 3
+    # but they're recreated at a different size
+    stats = generate(images, out_dir=out_dir, size=200, workers=1)
+    assert stats.created == 2 and stats.existing == 1 and stats.unchanged == 0
+    index = ThumbnailIndex(out_dir)
+    assert index.lookup(images[0]) not in names
+    with Image.open(out_dir / index.lookup(images[0])) as thumb:
+        assert max(thumb.size) == 200
+
+    assert generate(images, out_dir=out_dir, size=200).unchanged == 3
+    Image.new("RGB", (100, 100), "green").save(images[1])
+    os.utime(images[1], ns=(0, 0))
+    assert index.lookup(images[1]) is None
+    stats = generate(images, out_dir=out_dir, size=200)
+    assert stats.created == 1 and stats.unchanged == 2
+
+
+def test_id_set() -> None:
+    from my_feed.dedupe import IdSet
+
+    ids = IdSet(capacity=4)
+    for i in range(1000):
+        assert ids.add(f"listen_{i}", "listens") is None
+    assert len(ids) == 1000
+    # grew while adding, without losing anything
+    assert ids.nbytes <= 10 * 4096
+    assert ids.add("listen_5", "listens") == "listens"
+    assert ids.collisions == []
+
+    assert ids.add("listen_5", "offline_listens") == "listens"
+    assert ids.add("offline_listen_5", "offline_listens") is None
+    assert [tuple(c) for c in ids.collisions] == [
+        ("listen_5", "listens", "offline_listens")
+    ]
+
+
+def test_id_set_footprint() -> None:
+    import tracemalloc
+
+    from my_feed.dedupe import IdSet
+
+    # created before tracing starts, so only what the set keeps is counted
+    id_list = [f"listen_{i}" for i in range(100_000)]
+    tracemalloc.start()
+    try:
+        ids = IdSet()
+        for id_ in id_list:
+            ids.add(id_, "listens")
+        used, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(ids) == len(id_list)
+    # nothing but the hash table is kept, a set of the strings is ~90 bytes per id
+    assert used <= ids.nbytes * 1.1
+    assert used / len(ids) < 32
+
+
+def test_spill_roundtrip(tmp_path) -> None:
+    from datetime import datetime, date, timezone
+
+    from my_feed.sources.model import FeedItem
+    from my_feed.spill import ItemBuffer
+
+    items = [
+        (
+            "my_feed.sources.trakt.history",
+            FeedItem(
+                id=f"trakt_episode_{i}",
+                title=f"Episode {i}",
+                ftype="episode",
+                when=datetime(2023, 1, 1, i, 30, 15, 500000, tzinfo=timezone.utc),
+                subtitle="Show",
+                # built at runtime, so they'd be separate objects without interning
+                collection="".join(["Sh", "ow"]),
+                url="https://trakt.tv/shows/show",
+                release_date=date(2020, 1, 2),
+                part=1,
+                subpart=i,
+                data={"rewatched": i % 2 == 0},
+                flags=["i_blur"] if i == 3 else [],
+                score=8.0,
+            ),
+        )
+        for i in range(5)
+    ]
+    # repeated values share one string
+    assert items[0][1].collection is items[1][1].collection
+
+    with ItemBuffer(threshold=2) as buf:
+        for src, item in items:
+            buf.append(src, item)
+        assert buf.spilled and buf.path is not None and len(buf) == 5
+        read = list(buf)
+    assert read == items
+    assert read[0][1].collection is read[4][1].collection
+
+    with ItemBuffer(threshold=None) as buf:
+        for src, item in items:
+            buf.append(src, item)
+        assert not buf.spilled and list(buf) == items
+
+
+def test_parquet_writer(tmp_path) -> None:
+    import json
+    import pytest
+    from datetime import datetime, date, timezone
+
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    from my_feed.sources.model import FeedItem
+    from my_feed.parquet import ParquetWriter
+
+    path = tmp_path / "feed.parquet"
+    with ParquetWriter(path, row_group_size=2) as writer:
+        for i in range(5):
+            writer.write(
+                "my_feed.sources.nextalbums.history",
+                FeedItem(
+                    id=f"album_{i}",
+                    title=f"Album {i}",
+                    ftype="album",
+                    when=datetime(2023, 1, i + 1, tzinfo=timezone.utc),
+                    creator="Artist" if i < 4 else None,
+                    release_date=date(2000 + i, 1, 1),
+                    data={"i": i} if i == 0 else {},
+                    score=float(i),
+                ),
+            )
+
+    f = pq.ParquetFile(path)
+    assert f.metadata.num_rows == 5 and f.metadata.num_row_groups == 3
+    table = f.read()
+    assert (
+        str(table.schema.field("ftype").type)
+        == "dictionary<values=string, indices=int32, ordered=0>"
+    )
+    rows = table.to_pylist()
+    assert rows[0]["when"] == datetime(2023, 1, 1, tzinfo=timezone.utc)
+    assert rows[1]["release_date"] == date(2001, 1, 1)
+    assert json.loads(rows[0]["data"]) == {"i": 0} and rows[1]["data"] is None
+    assert [r["creator"] for r in rows] == ["Artist"] * 4 + [None]
+    assert rows[4]["score"] == 4.0 and rows[4]["source"].endswith("nextalbums.history")
+
+
+def test_mal_items(monkeypatch) -> None:
+    from types import SimpleNamespace
+    from datetime import datetime, timezone
+
+    from my_feed.sources.mal import ANIME, _items
+
+    monkeypatch.setenv("MAL_USERNAME", "user")
+
+    def at(day: int) -> datetime:
+        return datetime(2023, 1, day, tzinfo=timezone.utc)
+
+    entry = SimpleNamespace(
+        id=1,
+        username="user",
+        # newest first, rewatched the last episode
+        history=[
+            SimpleNamespace(number=2, at=at(9)),
+            SimpleNamespace(number=2, at=at(5)),
+            SimpleNamespace(number=1, at=at(3)),
+        ],
+        APIList=None,
+        XMLData=SimpleNamespace(
+            id=1,
+            title="Deleted Anime",
+            score=8,
+            status="Completed",
+            episodes=2,
+            watched_episodes=2,
+            finish_date=None,
+        ),
+    )
+    # without API info, only deleted entries are used
+    assert list(_items([entry], ANIME)) == []
+    items = list(_items([entry], ANIME, deleted=True))
+    assert [i.id for i in items] == [
+        "anime_episode_1_2_1673222400",
+        "anime_episode_1_2_1672876800",
+        "anime_episode_1_1_1672704000",
+        "anime_entry_1",
+    ]
+    assert items[0].subtitle == "Episode 2" and items[0].title == "Deleted Anime"
+    # first time the last episode was watched
+    assert items[-1].when == at(5) and items[-1].score == 8.0
+
+
+def test_fixture_sources() -> None:
+    import sys
+    import subprocess
+    from pathlib import Path
+
+    # every source which can run on the synthetic HPI modules in tests/fixtures/hpi
+    script = Path(__file__).parent.parent / "benchmarks" / "bench_sources.py"
+    proc = subprocess.run(
+        [
+            sys.executable,
+            str(script),
+            "--scale",
+            "0.05",
+            "--latency",
+            "0",
+            "--no-rate-limit",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    counts = {}
+    for line in proc.stdout.splitlines():
+        if " (run 1): " in line:
+            name, _, rest = line.partition(" (run 1): ")
+            counts[name] = int(rest.split()[0])
+    assert set(counts) == {
+        "my_feed.sources.games.steam",
+        "my_feed.sources.games.osrs",
+        "my_feed.sources.games.game_center",
+        "my_feed.sources.games.grouvee",
+        "my_feed.sources.trakt.history",
+        "my_feed.sources.listens.history",
+        "my_feed.sources.mal.history",
+        "my_feed.sources.mal.deleted_history",
+        "my_feed.sources.mpv.history",
+        "my_feed.sources.offline_listens.history",
+    }
+    assert all(n > 0 for n in counts.values()), counts
+    # requested from tests/fixtures/api_stub.py
+    assert "API stub responses" in proc.stdout
+
+
+def test_api_stub() -> None:
+    import sys
+    from pathlib import Path
+
+    import requests
+
+    sys.path.insert(0, str(Path(__file__).parent / "fixtures"))
+    from api_stub import StubServer  # type: ignore[import]
+
+    with StubServer() as stub:
+        movie = requests.get(f"{stub.url}/3/movie/5").json()
+        assert movie["id"] == 5 and "release_date" in movie
+        # payloads only depend on the path
+        assert requests.get(f"{stub.url}/3/movie/5").json() == movie
+        game = requests.get(f"{stub.url}/api/game/3/?format=json").json()
+        assert game["error"] == "OK" and game["results"]["id"] == 3
+        assert requests.get(f"{stub.url}/3/unknown").status_code == 404
+
+    with StubServer(not_found=1.0) as stub:
+        resp = requests.get(f"{stub.url}/3/tv/1/season/2/episode/3")
+        assert resp.status_code == 404 and resp.json()["status_code"] == 34
+
+    with StubServer(rate_limited=1.0, retry_after=7) as stub:
+        resp = requests.get(f"{stub.url}/3/tv/1")
+        assert resp.status_code == 429 and resp.headers["Retry-After"] == "7"
+        assert stub.statuses == {429: 1}
+
+
+def test_run_dir_resume(tmp_path) -> None:
+    import pytest
+
+    from my_feed.checkpoint import RunDir
+    from my_feed.dedupe import IdSet
+    from my_feed.sources.common import FeedError
+
+    key = {"include_sources": ["a", "b"]}
+    run = RunDir(tmp_path, key=key, resume=False)
+    recorded = run.record([("a", make_item(1)), ("a", make_item(2))])
+    assert [i.id for _, i in recorded] == ["item_1", "item_2"]
+    run.complete("a", 2)
+    run.complete("empty", 0)
+    # 'b' fails partway through
+    list(run.record([("b", make_item(3))]))
+
+    with pytest.raises(FeedError, match="different options"):
+        RunDir(tmp_path, key={"include_sources": []}, resume=True)
+
+    resumed = RunDir(tmp_path, key=key, resume=True)
+    assert list(resumed.completed) == ["a", "empty"]
+    emitted = IdSet()
+    assert [(s, i.id) for s, i in resumed.replay(emitted)] == [
+        ("a", "item_1"),
+        ("a", "item_2"),
+    ]
+    assert emitted.add("item_1", "b") == "a"
+    list(resumed.record([("b", make_item(3)), ("b", make_item(4))]))
+    resumed.complete("b", 2)
+    replayed = [i for _, i in RunDir(tmp_path, key=key, resume=True).replay(IdSet())]
+    assert replayed == [make_item(1), make_item(2), make_item(3), make_item(4)]
+
+    # starting a new run discards the checkpoints
+    assert RunDir(tmp_path, key=key, resume=False).completed == {}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["run.json"]
+
+
+def test_watchdog(tmp_path) -> None:
+    import time
+
+    from my_feed.watchdog import Watchdog, timeout_for
+
+    assert timeout_for("my_feed.sources.trakt.history", {"trakt": 10, "sources": 5}) == 5
+    assert timeout_for("my_feed.sources.mpv.history", {"trakt": 10}) is None
+
+    def fast():
+        yield from map(make_item, range(3))
+
+    w = Watchdog("src", fast, 5, snapshot_dir=tmp_path)
+    assert [i.id for i in w] == ["item_0", "item_1", "item_2"]
+    assert w.status == "complete"
+    assert (tmp_path / "src.spill").exists()
+
+    def stuck():
+        yield make_item(0)
+        yield make_item(5)
+        time.sleep(10)
+        yield make_item(6)
+
+    # keeps what it got before the timeout, and fills in the rest from the snapshot
+    w = Watchdog("src", stuck, 0.5, snapshot_dir=tmp_path)
+    assert [i.id for i in w] == ["item_0", "item_5", "item_1", "item_2"]
+    assert w.status == "timed_out"
+    assert w.from_snapshot == 2
+    # the snapshot from the complete run is kept
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["src.spill"]
+
+
+def test_merge_events() -> None:
+    import asyncio
+    import pytest
+
+    from my_feed.merge import Started, Items, Finished, events, iterate
+
+    def sync_source():
+        yield from map(make_item, range(1200))
+
+    async def async_source():
+        for i in range(1200, 1300):
+            await asyncio.sleep(0)
+            yield make_item(i)
+
+    def failing():
+        yield make_item(5000)
+        raise ValueError("broken source")
+
+    assert [i.id for i in iterate(async_source)][:2] == ["item_1200", "item_1201"]
+
+    sources = [("sync", lambda: sync_source), ("async", lambda: async_source)]
+    for concurrency in (1, 2):
+        got: dict = {}
+        for event in events(sources, concurrency):
+            if isinstance(event, Started):
+                got[event.name] = []
+            elif isinstance(event, Items):
+                got[event.name].extend(i.id for i in event.items)
+            else:
+                assert isinstance(event, Finished)
+                assert event.name in got
+        assert got["sync"] == [f"item_{i}" for i in range(1200)]
+        assert got["async"] == [f"item_{i}" for i in range(1200, 1300)]
+
+    with pytest.raises(ValueError, match="broken source"):
+        for _ in events(sources + [("failing", lambda: failing)], 2):
+            pass